@@ -1,13 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import quant_engine
 
 from app.routers import auth, posts, model, analytics, dashboard, trade
 from app.services.scheduler import start_scheduler, stop_scheduler
+from app.settings import settings
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("App Starting...")
+    quant_engine.set_num_threads(settings.ENGINE_THREADS)
 
     start_scheduler()
     yield
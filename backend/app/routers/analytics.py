@@ -1,3 +1,4 @@
+import numpy as np
 import quant_engine
 from ..schemas.analytics import VolatilityRequest, VolatilityResponse
 from fastapi import APIRouter, HTTPException, Depends
@@ -14,8 +15,9 @@ async def calculate_volatility(request: VolatilityRequest):
     if request.window < 2:
         raise HTTPException(status_code=400, detail="Volatility requires at least 2 data points.")
     try:
-        result = quant_engine.calculate_volatility(request.prices, request.window)
-        return {"values": result}
+        prices = np.fromiter(request.prices, dtype=np.float64, count=len(request.prices))
+        result = quant_engine.calculate_volatility(prices, request.window)
+        return {"values": result.tolist()}
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
\ No newline at end of file
@@ -6,8 +6,8 @@ from app.schemas.dashboard import DashboardResponse
 import polars as pl
 import numpy as np
 import os
-import xgboost as xgb
 from pipeline.sentiment import get_news, get_sentiment
+from pipeline.feature_schema import FEATURE_COLS
 
 router = APIRouter(
     prefix="/dashboard",
@@ -38,30 +38,13 @@ async def get_dashboard_data(ticker: str):
 
         last_row = df_features.tail(1)
         
-        lags = [1, 2, 3, 5, 10]
-        feature_cols = ["volatility", "rsi", "frac_diff_04"]
-        for lag in lags:
-            col_name = f"return_lag_{lag}"
-            if col_name in df_features.columns:
-                 feature_cols.append(col_name)
-        
-        features_array = last_row.select(feature_cols).to_numpy()
-
-        models = global_model_loader.get_model(ticker)
-        primary_model = models["model"]
-        meta_model = models["meta_model"]
-
-        dinput = xgb.DMatrix(features_array)
+        features_array = last_row.select(FEATURE_COLS).to_numpy()
 
-        primary_prob_val = primary_model.predict(dinput)[0]
+        primary_probs, meta_probs = global_model_loader.score([ticker], features_array)
+        primary_prob_val = primary_probs[0]
+        meta_prob_val = meta_probs[0]
 
         primary_pred = 1 if primary_prob_val > 0.5 else 0
-
-        primary_conf = np.array([[primary_prob_val]])
-        meta_features = np.hstack([features_array, primary_conf])
-
-        dmeta = xgb.DMatrix(meta_features)
-        meta_prob_val = meta_model.predict(dmeta)[0]
         meta_pred = 1 if meta_prob_val > 0.5 else 0
 
         final_signal_code = 1 if (primary_pred == 1 and meta_pred == 1) else 0
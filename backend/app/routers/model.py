@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
+from typing import List
 import numpy as np
-import xgboost as xgb
-from app.schemas.prediction import PredictionRequest, PredictionResponse
+from app.schemas.prediction import PredictionRequest, PredictionResponse, PredictionBatchRequest
 from app.services.model_loader import global_model_loader
 from app.dependencies import get_current_user
 
@@ -11,41 +11,49 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
+def to_response(ticker, primary_prob, meta_prob):
+    primary_pred = 1 if primary_prob > 0.5 else 0
+    meta_pred = 1 if meta_prob > 0.5 else 0
+
+    final_signal_code = 1 if (primary_pred == 1 and meta_pred == 1) else 0
+
+    signal_map = {0: "IGNORE", 1: "BUY"}
+
+    return PredictionResponse(
+        ticker=ticker,
+        signal=signal_map[final_signal_code],
+        meta_signal=f"Primary: {signal_map[primary_pred]} | Meta: {'CONFIRMED' if meta_pred==1 else 'REJECTED'}",
+        confidence=float(meta_prob)
+    )
+
 @router.post("/", response_model=PredictionResponse)
 async def predict_alpha(request: PredictionRequest):
     """
     Predicts alpha for a given ticker.
     """
     try:
-        models = global_model_loader.get_model(request.ticker)
-        primary_model = models["model"]
-        meta_model = models["meta_model"]
         features_array = np.array(request.features).reshape(1, -1)
-        dinput = xgb.DMatrix(features_array)
-
-        primary_prob = primary_model.predict(dinput)[0]
-        primary_pred = 1 if primary_prob > 0.5 else 0
-
-        primary_conf = np.array([[primary_prob]])
-        meta_features = np.hstack([features_array, primary_conf])
-
-        dmeta = xgb.DMatrix(meta_features)
-        meta_prob = meta_model.predict(dmeta)[0]
-        meta_pred = 1 if meta_prob > 0.5 else 0
-
-        final_signal_code = 1 if (primary_pred == 1 and meta_pred == 1) else 0
-
-        signal_map = {0: "IGNORE", 1: "BUY"}
-        primary_map = {0: "SELL/IGNORE", 1: "BUY"}
-        
-        return PredictionResponse(
-            ticker=request.ticker,
-            signal=signal_map[final_signal_code],
-            meta_signal=f"Primary: {signal_map[primary_pred]} | Meta: {'CONFIRMED' if meta_pred==1 else 'REJECTED'}",
-            confidence=float(meta_prob)
-        )
+        primary_probs, meta_probs = global_model_loader.score([request.ticker], features_array)
+        return to_response(request.ticker, primary_probs[0], meta_probs[0])
     
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Model for ticker {request.ticker} not trained yet.")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+@router.post("/batch", response_model=List[PredictionResponse])
+async def predict_alpha_batch(request: PredictionBatchRequest):
+    """
+    Predicts alpha for many tickers at once; with the pooled model the whole
+    batch is one predict call.
+    """
+    tickers = [item.ticker for item in request.items]
+    try:
+        features_array = np.array([item.features for item in request.items], dtype=float).reshape(len(tickers), -1)
+        primary_probs, meta_probs = global_model_loader.score(tickers, features_array)
+        return [to_response(t, p, m) for t, p, m in zip(tickers, primary_probs, meta_probs)]
+
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=f"Model not trained yet: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
@@ -9,4 +9,7 @@ class PredictionResponse(BaseModel):
     ticker: str
     signal: str
     meta_signal: str
-    confidence: float
\ No newline at end of file
+    confidence: float
+
+class PredictionBatchRequest(BaseModel):
+    items: List[PredictionRequest]
@@ -1,11 +1,15 @@
+import numpy as np
 import xgboost as xgb
 import os
 from app.settings import settings
+from pipeline.pooled_model import PooledModel, ARTIFACT_NAME
 
 class ModelLoader:
-    def __init__(self, model_dir=settings.MODEL_DIR):
+    def __init__(self, model_dir=settings.MODEL_DIR, pooled=settings.USE_POOLED_MODEL):
         self.model_dir = model_dir
+        self.pooled = pooled
         self._cache = {}
+        self._pooled_model = None
         print(f"DEBUG: ModelLoader initialized with dir: {self.model_dir}")
 
     def get_model(self, ticker):
@@ -33,5 +37,35 @@ class ModelLoader:
         model_bundle = {"model": model, "meta_model": meta_model}
         self._cache[ticker] = model_bundle
         return model_bundle
+
+    def get_pooled_model(self):
+        if self._pooled_model is None:
+            path = os.path.join(self.model_dir, ARTIFACT_NAME)
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Pooled model not found at {path}")
+            print("Loading pooled model...")
+            self._pooled_model = PooledModel.load(path)
+        return self._pooled_model
+
+    def score(self, tickers, features):
+        """
+        Primary and meta probabilities for one row of features per ticker.
+        The pooled model scores the whole batch with one predict call per
+        booster; per-ticker models are called once per distinct ticker.
+        """
+        tickers = list(tickers)
+        features = np.asarray(features, dtype=float).reshape(len(tickers), -1)
+        if self.pooled:
+            return self.get_pooled_model().predict(tickers, features)
+
+        primary_probs = np.empty(len(tickers))
+        meta_probs = np.empty(len(tickers))
+        for ticker in dict.fromkeys(tickers):
+            rows = [i for i, t in enumerate(tickers) if t == ticker]
+            models = self.get_model(ticker)
+            X = features[rows]
+            primary_probs[rows] = models["model"].predict(xgb.DMatrix(X))
+            meta_probs[rows] = models["meta_model"].predict(xgb.DMatrix(np.hstack([X, primary_probs[rows].reshape(-1, 1)])))
+        return primary_probs, meta_probs
     
-global_model_loader = ModelLoader()
\ No newline at end of file
+global_model_loader = ModelLoader()
@@ -2,17 +2,29 @@ import subprocess
 import logging
 import sys
 import os
+import time
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
+# Seconds between default (full fingerprint) runs. The runs in between use
+# --changed-only, which rebuilds only tickers that received new bars, so
+# parameter changes and earlier failures wait for the next full run.
+FULL_RUN_INTERVAL = 24 * 3600
+last_full_run = None
+
 def trigger_pipeline():
     """
-    Triggers the external run_pipeline.py script.
+    Triggers the external run_pipeline.py script. The first run after
+    startup and then one run a day are full runs, which rebuild every
+    ticker whose inputs or parameters changed; the others only rebuild the
+    tickers that received new bars.
     """
-    logger.info("SCHEDULER: Triggering ML Pipeline...")
+    global last_full_run
+    full = last_full_run is None or time.time() - last_full_run >= FULL_RUN_INTERVAL
+    logger.info(f"SCHEDULER: Triggering ML Pipeline ({'full' if full else 'changed tickers only'})...")
     
     current_dir = os.path.dirname(os.path.abspath(__file__))
     root_dir = os.path.abspath(os.path.join(current_dir, "../../../"))
@@ -24,11 +36,14 @@ def trigger_pipeline():
         return
 
     try:
+        started = time.time()
         subprocess.run(
-            [sys.executable, "run_pipeline.py"], 
+            [sys.executable, "run_pipeline.py"] + ([] if full else ["--changed-only"]), 
             cwd=pipeline_dir, 
             check=True
         )
+        if full:
+            last_full_run = started
         logger.info("SCHEDULER: Pipeline execution successful.")
     except subprocess.CalledProcessError as e:
         logger.error(f"SCHEDULER: Pipeline failed with exit code {e.returncode}")
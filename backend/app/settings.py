@@ -11,6 +11,14 @@ class Settings(BaseSettings):
     USE_MOCK_SENTIMENT: bool = False
 
     MODEL_DIR: str
+    # Serve the single pooled model (pipeline/train.py --pooled) instead of
+    # a primary and meta booster per ticker.
+    USE_POOLED_MODEL: bool = False
+
+    # quant_engine threads per server process. The API runs several workers
+    # on small inputs, so each one gets a single thread unless overridden
+    # (0 leaves the engine default of one thread per core).
+    ENGINE_THREADS: int = 1
 
     ALPACA_API_KEY: str = ""
     ALPACA_SECRET_KEY: str = ""
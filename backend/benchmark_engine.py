@@ -1,24 +1,333 @@
-import quant_engine
-import numpy as np
+import argparse
+import json
+import os
+import platform
+import sys
 import time
 
-def run_benchmark(size):
-    print(f"\n--- Benchmarking Size: {size:,} elements ---")
-    
-    data = np.random.rand(size).astype(np.float64)
-    window = 100
-    
-    quant_engine.calculate_volatility(data[:1000], window)
-
-    start = time.perf_counter()
-    result = quant_engine.calculate_volatility(data, window) 
-    end = time.perf_counter()
-    
-    duration_ms = (end - start) * 1000
-    print(f"Calculation took: {duration_ms:.4f} ms")
-    print(f"   Output size: {len(result)}")
+import numpy as np
+import polars as pl
+import quant_engine
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "pipeline")))
+
+import math_tools
+
+SIZES = [10_000, 100_000, 1_000_000]
+WINDOWS = [10, 100, 1000]
+THREADS = sorted({1, quant_engine.get_num_threads()})
+REPEAT = 3
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+# A case regresses when it gets this much slower than the baseline, or when
+# its error grows past both its tolerance and 10x the baseline error.
+SPEED_TOLERANCE = 0.25
+# Timings below this are dominated by call overhead and timer noise.
+MIN_COMPARABLE_MS = 1.0
+
+# math_tools.frac_diff_ffd is a Python loop; it is only run up to this size.
+SLOW_REFERENCE_MAX_SIZE = 100_000
+
+D = 0.4
+
+def make_data(size, seed=42):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.001, size=size)))
+    spread = np.abs(rng.normal(scale=0.0005, size=size)) * close
+    return {
+        "close": close,
+        "open": np.roll(close, 1),
+        "high": close + spread,
+        "low": close - spread,
+        "volume": rng.integers(100, 10_000, size=size).astype(np.float64),
+        "timestamp": np.arange(size, dtype=np.int64) * 60_000_000,
+        "returns": np.append(close[1:] / close[:-1] - 1.0, np.nan),
+        "score": rng.random(size),
+    }
+
+def split(values, n_series=8):
+    offsets = np.linspace(0, len(values), n_series + 1).astype(np.int64)
+    return [values[offsets[i]:offsets[i + 1]] for i in range(n_series)], offsets
+
+# --- References ---
+
+def polars_rolling(name, window, **kwargs):
+    def reference(data):
+        series = pl.Series(data["close"])
+        return getattr(series, name)(window_size=window, **kwargs).to_numpy()
+    return reference
+
+def polars_zscore(window):
+    def reference(data):
+        series = pl.Series(data["close"])
+        mean = series.rolling_mean(window_size=window)
+        std = series.rolling_std(window_size=window, ddof=0)
+        return ((series - mean) / std).to_numpy()
+    return reference
+
+def polars_features(data):
+    close = pl.col("close")
+    delta = close.diff()
+    roll_up = delta.clip(lower_bound=0).ewm_mean(span=14, adjust=False)
+    roll_down = delta.clip(upper_bound=0).abs().ewm_mean(span=14, adjust=False)
+    log_return = (close / close.shift(1)).log()
+    frame = pl.DataFrame({"close": data["close"]}).select(
+        close.pct_change().ewm_std(span=20).fill_null(0.01).alias("volatility"),
+        (100.0 - 100.0 / (1.0 + roll_up / roll_down)).alias("rsi"),
+        pl.lit(quant_engine.fractional_diff(data["close"], D, 1e-3)).alias("frac_diff"),
+        *[log_return.shift(lag).alias(f"lag_{lag}") for lag in [1, 2, 3, 5, 10]],
+    )
+    return frame.to_numpy()
+
+def numpy_backtest(returns, signals, cost):
+    valid = ~np.isnan(returns)
+    returns, signals = returns[valid], signals[valid]
+    trades = np.abs(np.diff(signals, axis=0, prepend=0.0))
+    pnl = signals * returns[:, None] - cost * trades
+    equity = np.cumprod(1 + pnl, axis=0)
+    return equity[-1] - 1
+
+def threshold_signals(data, thresholds):
+    return (data["score"][:, None] > thresholds[None, :]).astype(np.float64)
+
+# --- Cases ---
+# Each case: (name, params, engine(data), reference(data) or None, skip, tolerance).
+# `skip` leading rows are excluded from the comparison (padding conventions
+# differ); tolerance is on the error scaled by the reference magnitude.
+
+def cases(size):
+    small = size <= SLOW_REFERENCE_MAX_SIZE
+
+    for window in WINDOWS:
+        if window >= size:
+            continue
+        skip = window - 1
+        yield ("calculate_volatility", {"window": window},
+               lambda d, w=window: quant_engine.calculate_volatility(d["close"], w),
+               polars_rolling("rolling_std", window, ddof=0), skip, 1e-8)
+        yield ("rolling_mean", {"window": window},
+               lambda d, w=window: quant_engine.rolling_mean(d["close"], w),
+               polars_rolling("rolling_mean", window), skip, 1e-10)
+        yield ("rolling_var", {"window": window},
+               lambda d, w=window: quant_engine.rolling_var(d["close"], w, ddof=1),
+               polars_rolling("rolling_var", window, ddof=1), skip, 1e-6)
+        yield ("rolling_std", {"window": window},
+               lambda d, w=window: quant_engine.rolling_std(d["close"], w),
+               polars_rolling("rolling_std", window, ddof=0), skip, 1e-8)
+        yield ("rolling_zscore", {"window": window},
+               lambda d, w=window: quant_engine.rolling_zscore(d["close"], w),
+               polars_zscore(window), skip, 1e-6)
+        yield ("rolling_skew", {"window": window},
+               lambda d, w=window: quant_engine.rolling_skew(d["close"], w),
+               polars_rolling("rolling_skew", window), skip, 1e-6)
+        yield ("rolling_min", {"window": window},
+               lambda d, w=window: quant_engine.rolling_min(d["close"], w),
+               polars_rolling("rolling_min", window), skip, 0.0)
+        yield ("rolling_max", {"window": window},
+               lambda d, w=window: quant_engine.rolling_max(d["close"], w),
+               polars_rolling("rolling_max", window), skip, 0.0)
+
+    for thres in [1e-3, 1e-5]:
+        width = len(quant_engine.get_weights_ffd(D, thres))
+        reference = (lambda d, t=thres: math_tools.frac_diff_ffd(d["close"], D, t)) if small else None
+        yield ("get_weights_ffd", {"thres": thres},
+               lambda d, t=thres: quant_engine.get_weights_ffd(D, t),
+               lambda d, t=thres: math_tools.get_weights_ffd(D, t).ravel(), 0, 1e-12)
+        for method in ["direct", "fft"]:
+            yield ("fractional_diff", {"thres": thres, "method": method},
+                   lambda d, t=thres, m=method: quant_engine.fractional_diff(d["close"], D, t, m),
+                   reference, width - 1, 1e-9)
+
+    yield ("batch_volatility", {"window": 100},
+           lambda d: np.concatenate(quant_engine.batch_volatility(split(d["close"])[0], 100)),
+           lambda d: np.concatenate([quant_engine.calculate_volatility(s, 100) for s in split(d["close"])[0]]),
+           0, 1e-8)
+    yield ("batch_volatility_offsets", {"window": 100},
+           lambda d: quant_engine.batch_volatility_offsets(d["close"], split(d["close"])[1], 100),
+           None, 0, None)
+    yield ("batch_fractional_diff", {"thres": 1e-5},
+           lambda d: np.concatenate(quant_engine.batch_fractional_diff(split(d["close"])[0], D, 1e-5)),
+           lambda d: np.concatenate([quant_engine.fractional_diff(s, D, 1e-5) for s in split(d["close"])[0]]),
+           0, 1e-9)
+    yield ("batch_fractional_diff_offsets", {"thres": 1e-5},
+           lambda d: quant_engine.batch_fractional_diff_offsets(d["close"], split(d["close"])[1], D, 1e-5),
+           None, 0, None)
+
+    bar_columns = lambda d: (d["timestamp"], d["open"], d["high"], d["low"], d["close"], d["volume"])
+    for kind, threshold in [("dollar", 5e7), ("tick_imbalance", 50.0)]:
+        yield ("build_bars", {"kind": kind},
+               lambda d, k=kind, t=threshold: quant_engine.build_bars(*bar_columns(d), t, kind=k)["close"],
+               None, 0, None)
+    yield ("batch_build_bars", {"kind": "dollar"},
+           lambda d: quant_engine.batch_build_bars(*bar_columns(d), split(d["close"])[1], 5e7)["close"],
+           None, 0, None)
+
+    yield ("triple_barrier", {"horizon": 50},
+           lambda d: quant_engine.triple_barrier(d["close"], np.full(size, 0.002), 1.0, 1.0, 50)[2],
+           None, 0, None)
+
+    yield ("compute_features", {},
+           lambda d: quant_engine.compute_features(d["close"]),
+           polars_features, 0, 1e-9)
+    yield ("batch_compute_features", {},
+           lambda d: np.concatenate(quant_engine.batch_compute_features(split(d["close"])[0])[0]),
+           None, 0, None)
+
+    yield ("FracDiffState.update", {"thres": 1e-3},
+           lambda d: quant_engine.FracDiffState(D, 1e-3).update(d["close"]),
+           lambda d: quant_engine.fractional_diff(d["close"], D, 1e-3), 0, 1e-9)
+    yield ("RollingVolState.update", {"window": 100},
+           lambda d: quant_engine.RollingVolState(100).update(d["close"]),
+           lambda d: quant_engine.calculate_volatility(d["close"], 100), 0, 1e-8)
+    yield ("EwmRsiState.update", {"period": 14},
+           lambda d: quant_engine.EwmRsiState(14).update(d["close"]),
+           lambda d: polars_features(d)[:, 1], 1, 1e-9)
+
+    thresholds = np.linspace(0.0, 1.0, 64)
+    yield ("backtest_signals", {"columns": 64},
+           lambda d: quant_engine.backtest_signals(d["returns"], threshold_signals(d, thresholds), cost=1e-4)["cum_return"],
+           lambda d: numpy_backtest(d["returns"], threshold_signals(d, thresholds), 1e-4), 0, 1e-8)
+    yield ("backtest_thresholds", {"columns": 64},
+           lambda d: quant_engine.backtest_thresholds(d["returns"], d["score"], thresholds, cost=1e-4)["cum_return"],
+           lambda d: numpy_backtest(d["returns"], threshold_signals(d, thresholds), 1e-4), 0, 1e-8)
+
+    yield ("min_ffd_d", {"grid": 11},
+           lambda d: quant_engine.min_ffd_d(split(d["close"])[0], np.linspace(0.0, 1.0, 11))["adf"].ravel(),
+           None, 0, None)
+
+# --- Runner ---
+
+def best_of(func, data, repeat):
+    result, best = None, float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+def scaled_error(result, expected, skip):
+    result = np.asarray(result, dtype=np.float64)[skip:]
+    expected = np.asarray(expected, dtype=np.float64)[skip:]
+    if result.shape != expected.shape:
+        return float("inf")
+    if not np.array_equal(np.isnan(result), np.isnan(expected)):
+        return float("inf")
+    finite = ~np.isnan(expected)
+    if not finite.any():
+        return 0.0
+    diff = np.abs(result[finite] - expected[finite])
+    scale = max(1.0, float(np.max(np.abs(expected[finite]))))
+    return float(np.max(diff)) / scale
+
+def run_suite(sizes, repeat, threads):
+    results = []
+    for size in sizes:
+        data = make_data(size)
+        quant_engine.calculate_volatility(data["close"][:1000], 10)
+
+        for name, params, engine, reference, skip, tolerance in cases(size):
+            with quant_engine.thread_limit(threads):
+                engine_ms, result = best_of(engine, data, repeat)
+            entry = {
+                "name": name, "size": size, "params": params, "threads": threads,
+                "engine_ms": engine_ms, "reference_ms": None, "speedup": None,
+                "error": None, "tolerance": tolerance, "ok": True,
+            }
+            if reference is not None:
+                reference_ms, expected = best_of(reference, data, 1)
+                entry["reference_ms"] = reference_ms
+                entry["speedup"] = reference_ms / engine_ms if engine_ms > 0 else None
+                entry["error"] = scaled_error(result, expected, skip)
+                entry["ok"] = entry["error"] <= tolerance
+            results.append(entry)
+    return results
+
+def run_threads(sizes, repeat, threads):
+    results = []
+    for n in threads:
+        results.extend(run_suite(sizes, repeat, n))
+    return results
+
+def case_key(entry):
+    return (entry["name"], entry["size"], json.dumps(entry["params"], sort_keys=True), entry["threads"])
+
+def find_regressions(results, baseline, tolerance=SPEED_TOLERANCE):
+    """
+    Compares a run with a stored one case by case. Returns human-readable
+    descriptions of every slowdown beyond `tolerance` and every numerical
+    check that got worse.
+    """
+    previous = {case_key(e): e for e in baseline["results"]}
+    regressions = []
+    for entry in results:
+        old = previous.get(case_key(entry))
+        label = f"{entry['name']} {entry['params']} size={entry['size']:,} threads={entry['threads']}"
+        if not entry["ok"]:
+            regressions.append(f"{label}: error {entry['error']:.2e} exceeds tolerance {entry['tolerance']:.0e}")
+        if old is None:
+            continue
+        slower = entry["engine_ms"] > old["engine_ms"] * (1 + tolerance)
+        if slower and entry["engine_ms"] >= MIN_COMPARABLE_MS:
+            regressions.append(f"{label}: {old['engine_ms']:.2f} ms -> {entry['engine_ms']:.2f} ms")
+        if entry["error"] is not None and old["error"] is not None:
+            if entry["error"] > max(entry["tolerance"], 10 * old["error"]):
+                regressions.append(f"{label}: error {old['error']:.2e} -> {entry['error']:.2e}")
+    return regressions
+
+def print_results(results):
+    for entry in results:
+        params = ",".join(f"{k}={v}" for k, v in entry["params"].items())
+        line = f"{entry['name']:<30} {params:<28} n={entry['size']:>9,} t={entry['threads']:<2} {entry['engine_ms']:10.2f} ms"
+        if entry["reference_ms"] is not None:
+            status = "ok" if entry["ok"] else "MISMATCH"
+            line += f" | ref {entry['reference_ms']:10.2f} ms | {entry['speedup']:8.1f}x | err {entry['error']:.1e} {status}"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="quant_engine speed and numerical regression suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--threads", type=int, nargs="+", default=THREADS)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="JSON run to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=SPEED_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_threads(args.sizes, args.repeat, args.threads)
+    print_results(results)
+
+    run = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.tolerance)
+        print(f"\n{len(regressions)} regression(s) against {args.baseline}")
+        for line in regressions:
+            print(f"   {line}")
+        status = 1 if regressions else 0
+    elif any(not entry["ok"] for entry in results):
+        status = 1
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    return status
 
 if __name__ == "__main__":
-    run_benchmark(100_000)
-    run_benchmark(10_000_000)
-    run_benchmark(50_000_000)
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+#include <omp.h>
+
+#include "threads.hpp"
+
+// Vectorised parameter-sweep backtester. Every column of a sweep is an
+// independent strategy evaluated over the same return series: position[t]
+// earns returns[t] (the close-to-next-close return, as in backtest.py) and
+// every change of position pays cost * |change|. Rows are walked once and all
+// columns of a block are advanced together, so a sweep of thousands of
+// variants costs one pass over the data per block of columns.
+
+namespace backtest {
+
+// Columns advanced together by one task; keeps the per-column accounts in L1.
+constexpr long long COLUMN_BLOCK = 64;
+
+struct Metrics {
+    double cum_return;
+    double sharpe;
+    double max_drawdown;  // largest peak-to-trough loss, as a positive fraction
+    double turnover;      // mean |position change| per period
+};
+
+struct Account {
+    double position = 0.0;
+    double equity = 1.0;
+    double peak = 1.0;
+    double drawdown = 0.0;
+    double traded = 0.0;
+    long long count = 0;
+    double mean = 0.0;
+    double m2 = 0.0;
+
+    inline void step(double target, double ret, double cost, double risk_free) {
+        double trade = std::abs(target - position);
+        position = target;
+        traded += trade;
+
+        double pnl = position * ret - cost * trade;
+        equity *= 1.0 + pnl;
+        peak = std::max(peak, equity);
+        drawdown = std::max(drawdown, 1.0 - equity / peak);
+
+        // Welford update of the excess-return moments.
+        double excess = pnl - risk_free;
+        ++count;
+        double delta = excess - mean;
+        mean += delta / static_cast<double>(count);
+        m2 += delta * (excess - mean);
+    }
+
+    // Sharpe uses the sample (ddof = 1) deviation, like the Polars std in
+    // run_backtest; it is NaN for fewer than two periods or a flat series.
+    inline Metrics finish(double periods_per_year) const {
+        Metrics m;
+        m.cum_return = equity - 1.0;
+        m.max_drawdown = drawdown;
+        m.turnover = count > 0 ? traded / static_cast<double>(count) : 0.0;
+        double var = count > 1 ? m2 / static_cast<double>(count - 1) : 0.0;
+        m.sharpe = var > 0.0 ? mean / std::sqrt(var) * std::sqrt(periods_per_year) : std::nan("");
+        return m;
+    }
+};
+
+struct Config {
+    double risk_free;         // per period
+    double periods_per_year;
+};
+
+// Explicit positions: signals is row-major (size, n_cols). Rows with a NaN
+// return are skipped.
+inline void signals(const double* returns, const double* signals, long long size, long long n_cols,
+                    const double* cost, const Config& config, Metrics* out) {
+    long long n_blocks = (n_cols + COLUMN_BLOCK - 1) / COLUMN_BLOCK;
+    int team = threads::team_size(size * n_cols);
+
+    #pragma omp parallel for schedule(dynamic, 1) num_threads(team) if(team > 1)
+    for (long long b = 0; b < n_blocks; ++b) {
+        long long lo = b * COLUMN_BLOCK;
+        long long hi = std::min(n_cols, lo + COLUMN_BLOCK);
+        std::vector<Account> accounts(static_cast<size_t>(hi - lo));
+
+        for (long long t = 0; t < size; ++t) {
+            double ret = returns[t];
+            if (std::isnan(ret)) continue;
+            const double* row = signals + t * n_cols;
+            for (long long c = lo; c < hi; ++c) {
+                accounts[c - lo].step(row[c], ret, cost[c], config.risk_free);
+            }
+        }
+
+        for (long long c = lo; c < hi; ++c) out[c] = accounts[c - lo].finish(config.periods_per_year);
+    }
+}
+
+// Threshold rules on a score series: a row with score > threshold[c] opens (or
+// extends) a long position held for holding[c] rows, including the signal row.
+// Series are delimited by offsets (n_series + 1 entries); out is row-major
+// (n_series, n_cols). Rows with a NaN return are skipped.
+inline void thresholds(const double* returns, const double* score, const long long* offsets, long long n_series,
+                       const double* threshold, const long long* holding, const double* cost, long long n_cols,
+                       const Config& config, Metrics* out) {
+    long long n_blocks = (n_cols + COLUMN_BLOCK - 1) / COLUMN_BLOCK;
+    long long n_tasks = n_series * n_blocks;
+    int team = threads::team_size(offsets[n_series] * n_cols);
+
+    #pragma omp parallel for schedule(dynamic, 1) num_threads(team) if(team > 1)
+    for (long long task = 0; task < n_tasks; ++task) {
+        long long s = task / n_blocks;
+        long long lo = (task % n_blocks) * COLUMN_BLOCK;
+        long long hi = std::min(n_cols, lo + COLUMN_BLOCK);
+        std::vector<Account> accounts(static_cast<size_t>(hi - lo));
+        std::vector<long long> remaining(static_cast<size_t>(hi - lo), 0);
+
+        for (long long t = offsets[s]; t < offsets[s + 1]; ++t) {
+            double ret = returns[t];
+            if (std::isnan(ret)) continue;
+            double value = score[t];
+            for (long long c = lo; c < hi; ++c) {
+                long long& left = remaining[c - lo];
+                if (value > threshold[c]) left = holding[c];
+                double target = left > 0 ? 1.0 : 0.0;
+                if (left > 0) --left;
+                accounts[c - lo].step(target, ret, cost[c], config.risk_free);
+            }
+        }
+
+        Metrics* row = out + s * n_cols;
+        for (long long c = lo; c < hi; ++c) row[c] = accounts[c - lo].finish(config.periods_per_year);
+    }
+}
+
+}  // namespace backtest
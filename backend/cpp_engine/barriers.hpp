@@ -0,0 +1,54 @@
+#pragma once
+
+#include <cmath>
+#include <omp.h>
+
+#include "threads.hpp"
+
+// Path-dependent triple-barrier labeling (Lopez de Prado ch. 3). For every
+// event i the path close[i + 1 .. i + horizon] is walked until the return
+// first crosses the profit-take (+pt * vol[i]) or stop-loss (-sl * vol[i])
+// barrier. Each scan stops at the first touch, so the cost is
+// O(n * horizon) in the worst case and far less in volatile regimes.
+
+namespace barriers {
+
+struct Outcome {
+    int label;          // 1 profit take, -1 stop loss, 0 vertical barrier
+    long long touch;    // index of the first touch, -1 if the window runs past the data
+    double ret;         // close[touch] / close[i] - 1, NaN when unresolved
+};
+
+inline Outcome first_touch(const double* close, const double* vol, long long size, long long i,
+                           double pt, double sl, long long horizon) {
+    double base = close[i];
+    double upper = pt * vol[i];
+    double lower = -sl * vol[i];
+    long long last = i + horizon;
+    long long stop = last < size ? last : size - 1;
+
+    for (long long j = i + 1; j <= stop; ++j) {
+        double ret = close[j] / base - 1.0;
+        if (ret > upper) return Outcome{1, j, ret};
+        if (ret < lower) return Outcome{-1, j, ret};
+    }
+
+    if (last < size) return Outcome{0, last, close[last] / base - 1.0};
+    return Outcome{0, -1, std::nan("")};
+}
+
+inline void label(const double* close, const double* vol, long long size, double pt, double sl, long long horizon,
+                  int* labels, long long* touch, double* ret) {
+    // Early exit makes the real cost data dependent; horizon bounds it.
+    int team = threads::team_size(size * horizon);
+
+    #pragma omp parallel for schedule(dynamic, 4096) num_threads(team) if(team > 1)
+    for (long long i = 0; i < size; ++i) {
+        Outcome outcome = first_touch(close, vol, size, i, pt, sl, horizon);
+        labels[i] = outcome.label;
+        touch[i] = outcome.touch;
+        ret[i] = outcome.ret;
+    }
+}
+
+}  // namespace barriers
@@ -0,0 +1,136 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+#include <limits>
+
+// Information-driven bar sampling (dollar, volume, tick and tick-imbalance
+// bars, Lopez de Prado ch. 2). One pass over the rows: each row is folded
+// into the open bar, and the bar is closed on the row where its accumulator
+// reaches the threshold, so a row is never split across bars. The open bar and
+// the imbalance estimators live in `State`, which the caller can carry into
+// the next call to resume exactly where the previous one stopped.
+
+namespace bars {
+
+enum class Kind { Dollar, Volume, Tick, TickImbalance };
+
+struct Bar {
+    long long timestamp = 0;
+    double open = 0.0;
+    double high = 0.0;
+    double low = 0.0;
+    double close = 0.0;
+    double volume = 0.0;
+    double dollar_volume = 0.0;
+    long long ticks = 0;
+};
+
+struct State {
+    // Partially filled bar and its progress towards the threshold (dollar
+    // value, volume, tick count or signed tick imbalance).
+    bool has_open_bar = false;
+    Bar bar;
+    double accumulator = 0.0;
+
+    // Tick rule (tracked for every kind) and the EWMA estimators used by
+    // tick-imbalance bars.
+    double last_price = std::numeric_limits<double>::quiet_NaN();
+    double last_sign = 0.0;
+    double expected_ticks = 0.0;
+    double expected_imbalance = 1.0;
+};
+
+struct Rows {
+    const long long* timestamp;
+    const double* open;
+    const double* high;
+    const double* low;
+    const double* close;
+    const double* volume;
+    long long size;
+};
+
+struct Config {
+    Kind kind;
+    double threshold;
+    // EWMA weight of the latest bar in the tick-imbalance expectations.
+    double alpha;
+};
+
+inline double tick_sign(State& state, double price) {
+    double sign = state.last_sign;
+    if (!std::isnan(state.last_price)) {
+        if (price > state.last_price) sign = 1.0;
+        else if (price < state.last_price) sign = -1.0;
+    }
+    state.last_price = price;
+    state.last_sign = sign;
+    return sign;
+}
+
+inline bool should_close(const State& state, const Config& config) {
+    if (config.kind == Kind::TickImbalance) {
+        double expected = std::max(1.0, state.expected_ticks * state.expected_imbalance);
+        return std::abs(state.accumulator) >= expected;
+    }
+    return state.accumulator >= config.threshold;
+}
+
+inline void close_bar(State& state, const Config& config, std::vector<Bar>& out) {
+    out.push_back(state.bar);
+
+    if (config.kind == Kind::TickImbalance) {
+        double ticks = static_cast<double>(state.bar.ticks);
+        double imbalance = std::abs(state.accumulator) / ticks;
+        state.expected_ticks += config.alpha * (ticks - state.expected_ticks);
+        state.expected_imbalance += config.alpha * (imbalance - state.expected_imbalance);
+    }
+
+    state.has_open_bar = false;
+    state.accumulator = 0.0;
+}
+
+// Appends every bar closed by rows to `out`; the trailing partial bar stays in
+// `state`.
+inline void sample(const Rows& rows, const Config& config, State& state, std::vector<Bar>& out) {
+    if (config.kind == Kind::TickImbalance && state.expected_ticks <= 0.0) {
+        state.expected_ticks = config.threshold;
+    }
+
+    for (long long i = 0; i < rows.size; ++i) {
+        double price = rows.close[i];
+        double volume = rows.volume[i];
+        double dollar = price * volume;
+        double sign = tick_sign(state, price);
+
+        Bar& bar = state.bar;
+        if (!state.has_open_bar) {
+            bar = Bar{};
+            bar.timestamp = rows.timestamp[i];
+            bar.open = rows.open[i];
+            bar.high = rows.high[i];
+            bar.low = rows.low[i];
+            state.has_open_bar = true;
+        } else {
+            bar.high = std::max(bar.high, rows.high[i]);
+            bar.low = std::min(bar.low, rows.low[i]);
+        }
+        bar.close = price;
+        bar.volume += volume;
+        bar.dollar_volume += dollar;
+        bar.ticks += 1;
+
+        switch (config.kind) {
+            case Kind::Dollar: state.accumulator += dollar; break;
+            case Kind::Volume: state.accumulator += volume; break;
+            case Kind::Tick: state.accumulator += 1.0; break;
+            case Kind::TickImbalance: state.accumulator += sign; break;
+        }
+
+        if (should_close(state, config)) close_bar(state, config, out);
+    }
+}
+
+}  // namespace bars
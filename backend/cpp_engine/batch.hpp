@@ -0,0 +1,135 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+#include <omp.h>
+
+#include "rolling.hpp"
+#include "fracdiff.hpp"
+
+// Multi-series drivers. Every series is cut into tasks of roughly `GRAIN`
+// outputs and all tasks of the universe go through one OpenMP team with a
+// dynamic schedule, so parallelism spans series (many short tickers) as well
+// as the inside of a single long series.
+
+namespace batch {
+
+constexpr long long GRAIN = 16384;
+
+struct Series {
+    const double* input;
+    double* output;
+    long long size;
+};
+
+struct Task {
+    size_t series;
+    long long begin;
+    long long end;
+};
+
+// Appends tasks covering [begin, end) of one series in chunks of `grain`.
+inline void split(std::vector<Task>& tasks, size_t series, long long begin, long long end, long long grain) {
+    for (long long lo = begin; lo < end; lo += grain) {
+        tasks.push_back(Task{series, lo, std::min(end, lo + grain)});
+    }
+}
+
+// Output rows covered by a task list.
+inline long long work(const std::vector<Task>& tasks) {
+    long long rows = 0;
+    for (const Task& task : tasks) rows += task.end - task.begin;
+    return rows;
+}
+
+// Fills out[begin, end) with `value`; used for padding and too-short series.
+inline void fill(double* out, long long begin, long long end, double value) {
+    for (long long i = begin; i < end; ++i) out[i] = value;
+}
+
+// calculate_volatility for every series: 0.0 padding for the first
+// window - 1 rows and NaN for series shorter than the window.
+inline void volatility(const std::vector<Series>& series, long long window) {
+    std::vector<Task> tasks;
+    long long grain = std::max(GRAIN, 8 * window);
+
+    for (size_t s = 0; s < series.size(); ++s) {
+        const Series& item = series[s];
+        if (item.size < window) {
+            fill(item.output, 0, item.size, std::nan(""));
+            continue;
+        }
+        fill(item.output, 0, window - 1, 0.0);
+        split(tasks, s, window - 1, item.size, grain);
+    }
+
+    long long n_tasks = static_cast<long long>(tasks.size());
+    int team = threads::team_size(work(tasks));
+
+    #pragma omp parallel for schedule(dynamic, 1) num_threads(team) if(team > 1)
+    for (long long t = 0; t < n_tasks; ++t) {
+        const Task& task = tasks[t];
+        const Series& item = series[task.series];
+        rolling::stddev(item.input, item.output, window, 0, task.begin, task.end);
+    }
+}
+
+// fractional_diff for every series with a shared kernel. FFT series are
+// split by block pairs, direct series by output rows; both kinds of task run
+// in the same team, each thread keeping one FFT scratch buffer.
+inline void fractional_diff(const std::vector<Series>& series, const fracdiff::Kernel& kernel, fracdiff::Method method) {
+    std::vector<Task> direct_tasks;
+    std::vector<Task> fft_tasks;
+    long long width = kernel.width();
+
+    for (size_t s = 0; s < series.size(); ++s) {
+        const Series& item = series[s];
+        if (item.size < width) {
+            fill(item.output, 0, item.size, std::nan(""));
+            continue;
+        }
+        fill(item.output, 0, width - 1, std::nan(""));
+
+        if (fracdiff::use_fft(method, kernel, item.size)) {
+            fracdiff::OverlapSaveLayout layout = fracdiff::overlap_save_layout(kernel, item.size);
+            long long pairs_per_task = std::max(1LL, GRAIN / (2 * layout.block));
+            split(fft_tasks, s, 0, layout.n_pairs, pairs_per_task);
+        } else {
+            long long grain = std::max(1LL, GRAIN * 64 / width);
+            split(direct_tasks, s, width - 1, item.size, grain);
+        }
+    }
+
+    long long n_direct = static_cast<long long>(direct_tasks.size());
+    long long n_fft = static_cast<long long>(fft_tasks.size());
+
+    if (n_fft > 0) {
+        // Build the plan and spectrum before the team forks.
+        kernel.plan();
+    }
+
+    long long fft_work = 2 * static_cast<long long>(kernel.fft_size()) * 32;
+    int team = threads::team_size(work(direct_tasks) * width + work(fft_tasks) * fft_work);
+
+    #pragma omp parallel num_threads(team) if(team > 1)
+    {
+        std::vector<fracdiff::cplx> buffer(n_fft > 0 ? kernel.fft_size() : 0);
+
+        #pragma omp for schedule(dynamic, 1) nowait
+        for (long long t = 0; t < n_fft; ++t) {
+            const Task& task = fft_tasks[t];
+            const Series& item = series[task.series];
+            fracdiff::overlap_save_pairs(item.input, item.output, item.size, kernel, task.begin, task.end, buffer.data());
+        }
+
+        #pragma omp for schedule(dynamic, 1)
+        for (long long t = 0; t < n_direct; ++t) {
+            const Task& task = direct_tasks[t];
+            const Series& item = series[task.series];
+            fracdiff::direct(item.input, item.output, kernel.weights, task.begin, task.end);
+        }
+    }
+}
+
+}  // namespace batch
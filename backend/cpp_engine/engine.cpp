@@ -4,111 +4,1077 @@
 #include <cmath>
 #include <vector>
 #include <algorithm>
+#include <functional>
+#include <stdexcept>
+#include <string>
+#include <cstdlib>
 #include <omp.h>
 
+#include "rolling.hpp"
+#include "fracdiff.hpp"
+#include "batch.hpp"
+#include "bars.hpp"
+#include "barriers.hpp"
+#include "streaming.hpp"
+#include "features.hpp"
+#include "view.hpp"
+#include "backtest.hpp"
+#include "stationarity.hpp"
+#include "threads.hpp"
+
 namespace py = pybind11;
 
-py::array_t<double> calculate_volatility(py::array_t<double> input_array, int window) {
-    auto input = input_array.unchecked<1>();
-    
-    long long size = input.shape(0);
+using InputArray = py::array_t<double, py::array::c_style | py::array::forcecast>;
+using OffsetArray = py::array_t<long long, py::array::c_style | py::array::forcecast>;
+using TimestampArray = py::array_t<long long, py::array::c_style | py::array::forcecast>;
+
+void check_window(int window) {
+    if (window < 1) throw std::invalid_argument("window must be >= 1");
+}
+
+void check_1d(const InputArray& input_array) {
+    if (input_array.ndim() != 1) throw std::invalid_argument("input must be a 1-D array");
+}
+
+// Single-series input. Anything exporting a 1-D float64 or float32 buffer
+// (NumPy arrays and strided views of them, memoryviews, array.array) is read in
+// place, as is a null-free pyarrow float/double array or single-chunk
+// ChunkedArray. Everything else (lists, integer arrays, Arrow arrays with
+// nulls) is converted once through NumPy, which is also zero-copy for a
+// null-free Polars Series. Internal to this module, so it may hold pybind11
+// types with hidden visibility.
+namespace {
+
+class Input {
+public:
+    explicit Input(const py::object& obj) {
+        if (from_arrow(obj)) return;
+        py::object source = obj;
+        if (!PyObject_CheckBuffer(source.ptr())) source = py::array::ensure(obj);
+        if (!source) throw py::type_error("input must be a 1-D numeric array");
+        if (from_buffer(source)) return;
+        InputArray converted = InputArray::ensure(source);
+        if (!converted) throw py::type_error("input must be a 1-D numeric array");
+        from_buffer(converted);
+    }
+
+    long long size() const { return size_; }
+
+    // Calls fn with the cheapest accessor for the underlying memory.
+    template <typename Fn>
+    void visit(Fn fn) const {
+        if (itemsize_ == sizeof(double) && stride_ == static_cast<py::ssize_t>(sizeof(double))) {
+            fn(reinterpret_cast<const double*>(data_));
+        } else if (itemsize_ == sizeof(double)) {
+            fn(view::Strided<double>{data_, stride_});
+        } else {
+            fn(view::Strided<float>{data_, stride_});
+        }
+    }
+
+private:
+    bool from_buffer(const py::object& source) {
+        py::buffer_info info = source.cast<py::buffer>().request();
+        if (info.ndim != 1) throw std::invalid_argument("input must be a 1-D array");
+        if (!accepts(info.format, info.itemsize)) return false;
+        data_ = static_cast<const char*>(info.ptr);
+        stride_ = info.strides[0];
+        itemsize_ = info.itemsize;
+        size_ = info.shape[0];
+        info_ = std::move(info);
+        return true;
+    }
+
+    bool from_arrow(const py::object& obj) {
+        py::object array = obj;
+        if (py::hasattr(array, "num_chunks") && py::hasattr(array, "chunk")) {
+            if (array.attr("num_chunks").cast<long long>() != 1) return false;
+            array = array.attr("chunk")(0);
+        }
+        if (!py::hasattr(array, "buffers") || !py::hasattr(array, "null_count") || !py::hasattr(array, "offset")) {
+            return false;
+        }
+        if (array.attr("null_count").cast<long long>() != 0) return false;
+
+        std::string type = py::str(array.attr("type"));
+        py::ssize_t itemsize = type == "double" ? sizeof(double) : type == "float" ? sizeof(float) : 0;
+        if (itemsize == 0) return false;
+
+        py::object values = array.attr("buffers")()[py::int_(1)];
+        if (values.is_none()) return false;
+
+        py::buffer_info info = values.cast<py::buffer>().request();
+        data_ = static_cast<const char*>(info.ptr) + array.attr("offset").cast<py::ssize_t>() * itemsize;
+        stride_ = itemsize;
+        itemsize_ = itemsize;
+        size_ = py::len(array);
+        info_ = std::move(info);
+        return true;
+    }
+
+    static bool accepts(const std::string& format, py::ssize_t itemsize) {
+        if (format.empty() || format[0] == '>' || format[0] == '!') return false;
+        char code = format.back();
+        return (code == 'd' && itemsize == sizeof(double)) || (code == 'f' && itemsize == sizeof(float));
+    }
+
+    py::buffer_info info_;  // holds the exporter alive while data_ is in use
+    const char* data_ = nullptr;
+    py::ssize_t stride_ = 0;
+    py::ssize_t itemsize_ = 0;
+    long long size_ = 0;
+};
+
+}  // namespace
+
+// Returns `out` if the caller supplied a C-contiguous, writeable float64 array
+// of the expected shape, otherwise allocates one.
+py::array_t<double> output_buffer(const py::object& out, const std::vector<py::ssize_t>& shape) {
+    if (out.is_none()) return py::array_t<double>(shape);
+
+    if (!py::isinstance<py::array_t<double>>(out)) throw std::invalid_argument("out must be a float64 array");
+    auto buffer = out.cast<py::array_t<double>>();
+    if (!(buffer.flags() & py::array::c_style) || !buffer.writeable()) {
+        throw std::invalid_argument("out must be C-contiguous and writeable");
+    }
+    if (buffer.ndim() != static_cast<py::ssize_t>(shape.size())) throw std::invalid_argument("out has the wrong shape");
+    for (size_t k = 0; k < shape.size(); ++k) {
+        if (buffer.shape(k) != shape[k]) throw std::invalid_argument("out has the wrong shape");
+    }
+    return buffer;
+}
+
+// Shared driver for the rolling kernels: output has the input's length, the
+// first window - 1 entries are NaN, and the rest are filled by `kernel` on
+// one contiguous chunk per thread with the GIL released.
+template <typename Kernel>
+py::array_t<double> rolling_apply(const py::object& input_obj, int window, const py::object& out, Kernel kernel) {
+    check_window(window);
+    Input input(input_obj);
+
+    long long size = input.size();
     long long win = static_cast<long long>(window);
 
-    if (size < win) return py::array_t<double>();
+    auto result = output_buffer(out, {static_cast<py::ssize_t>(size)});
+    double* output = result.mutable_data();
 
-    auto result = py::array_t<double>(size);
-    auto output = result.mutable_unchecked<1>();
+    for (long long k = 0; k < std::min(size, win - 1); ++k) {
+        output[k] = std::nan("");
+    }
+
+    {
+        py::gil_scoped_release release;
+
+        input.visit([&](const auto& x) {
+            rolling::parallel_chunks(win - 1, size, [&](long long lo, long long hi) {
+                kernel(x, output, win, lo, hi);
+            });
+        });
+    }
+
+    return result;
+}
+
+py::array_t<double> calculate_volatility(const py::object& input_obj, int window, const py::object& out) {
+    check_window(window);
+    Input input(input_obj);
+
+    long long size = input.size();
+    long long win = static_cast<long long>(window);
+
+    // Too short: an empty array, or `out` filled with NaN when supplied.
+    if (size < win && out.is_none()) return py::array_t<double>();
+
+    auto result = output_buffer(out, {static_cast<py::ssize_t>(size)});
+    double* output = result.mutable_data();
+
+    if (size < win) {
+        for (long long k = 0; k < size; ++k) output[k] = std::nan("");
+        return result;
+    }
 
     for(long long k = 0; k < win - 1; k++) {
-        output(k) = 0.0;
+        output[k] = 0.0;
     }
 
     {
         py::gil_scoped_release release;
 
-        #pragma omp parallel for schedule(static)
-        for (long long i = win - 1; i < size; ++i) {
-            
-            double sum = 0.0;
-            for (long long j = i - win + 1; j <= i; ++j) {
-                sum += input(j);
-            }
-            double mean = sum / win;
-
-            double sq_sum = 0.0;
-            for (long long j = i - win + 1; j <= i; ++j) {
-                double diff = input(j) - mean;
-                sq_sum += diff * diff;
-            }
-            
-            output(i) = std::sqrt(sq_sum / win);
-        }
+        input.visit([&](const auto& x) {
+            rolling::parallel_chunks(win - 1, size, [&](long long lo, long long hi) {
+                rolling::stddev(x, output, win, 0, lo, hi);
+            });
+        });
     }
 
     return result;
 }
 
-std::vector<double> get_weights_ffd(double d, double thres) {
-    std::vector<double> w;
-    w.push_back(1.0);
-    double k = 1.0;
+py::array_t<double> rolling_mean(const py::object& input, int window, const py::object& out) {
+    return rolling_apply(input, window, out, [](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::mean(x, y, win, lo, hi);
+    });
+}
 
-    while (true) {
-        double w_last = w.back();
-        double w_k = -w_last / k * (d - k + 1.0);
-        if (std::abs(w_k) < thres) break;
-        w.push_back(w_k);
-        k += 1.0;
-    }
+py::array_t<double> rolling_var(const py::object& input, int window, int ddof, const py::object& out) {
+    if (ddof < 0 || ddof >= window) throw std::invalid_argument("ddof must be in [0, window)");
+    return rolling_apply(input, window, out, [ddof](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::variance(x, y, win, ddof, lo, hi);
+    });
+}
+
+py::array_t<double> rolling_std(const py::object& input, int window, int ddof, const py::object& out) {
+    if (ddof < 0 || ddof >= window) throw std::invalid_argument("ddof must be in [0, window)");
+    return rolling_apply(input, window, out, [ddof](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::stddev(x, y, win, ddof, lo, hi);
+    });
+}
+
+py::array_t<double> rolling_zscore(const py::object& input, int window, const py::object& out) {
+    return rolling_apply(input, window, out, [](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::zscore(x, y, win, lo, hi);
+    });
+}
+
+py::array_t<double> rolling_skew(const py::object& input, int window, const py::object& out) {
+    return rolling_apply(input, window, out, [](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::skew(x, y, win, lo, hi);
+    });
+}
+
+py::array_t<double> rolling_min(const py::object& input, int window, const py::object& out) {
+    return rolling_apply(input, window, out, [](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::extremum(x, y, win, lo, hi, std::less<double>());
+    });
+}
 
-    std::reverse(w.begin(), w.end());
-    return w;
+py::array_t<double> rolling_max(const py::object& input, int window, const py::object& out) {
+    return rolling_apply(input, window, out, [](const auto& x, double* y, long long win, long long lo, long long hi) {
+        rolling::extremum(x, y, win, lo, hi, std::greater<double>());
+    });
 }
 
-py::array_t<double> fractional_diff(py::array_t<double> input_array, double d, double thres) {
-    auto input = input_array.unchecked<1>();
-    long long size = input.shape(0);
-    
-    std::vector<double> weights = get_weights_ffd(d, thres);
-    long long width = static_cast<long long>(weights.size());
+py::array_t<double> get_weights_ffd(double d, double thres) {
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+    return py::array_t<double>(kernel->weights.size(), kernel->weights.data());
+}
+
+fracdiff::Method parse_method(const std::string& method) {
+    if (method == "auto") return fracdiff::Method::Auto;
+    if (method == "direct") return fracdiff::Method::Direct;
+    if (method == "fft") return fracdiff::Method::Fft;
+    throw std::invalid_argument("method must be 'auto', 'direct' or 'fft'");
+}
+
+py::array_t<double> fractional_diff(const py::object& input_obj, double d, double thres, const std::string& method,
+                                    const py::object& out) {
+    Input input(input_obj);
+    fracdiff::Method mode = parse_method(method);
+
+    long long size = input.size();
+
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+    long long width = kernel->width();
+
+    auto result = output_buffer(out, {static_cast<py::ssize_t>(size)});
+    double* output = result.mutable_data();
 
-    auto result = py::array_t<double>(size);
-    auto output = result.mutable_unchecked<1>();
-    
     if (size < width) {
         for (long long i = 0; i < size; ++i) {
-            output(i) = std::nan("");
+            output[i] = std::nan("");
         }
 
         return result;
     }
 
     for (long long i = 0; i < width - 1; ++i) {
-        output(i) = std::nan("");
+        output[i] = std::nan("");
     }
 
     {
         py::gil_scoped_release release;
 
-        #pragma omp parallel for schedule(static)
-        for (long long i = width - 1; i < size; ++i) {
-            double dot_product = 0.0;
-            
-            for (long long j = 0; j < width; ++j) {
-                long long price_idx = (i - width + 1) + j;
-                dot_product += weights[j] * input(price_idx);
+        input.visit([&](const auto& x) {
+            if (fracdiff::use_fft(mode, *kernel, size)) {
+                fracdiff::overlap_save(x, output, size, *kernel);
+            } else {
+                rolling::parallel_chunks(width - 1, size, [&](long long lo, long long hi) {
+                    fracdiff::direct(x, output, kernel->weights, lo, hi);
+                }, width);
             }
-            
-            output(i) = dot_product;
+        });
+    }
+
+    return result;
+}
+
+// --- Batch API ---
+// Two layouts are accepted: a ragged list of 1-D arrays (returns a list), or
+// one concatenated array plus Arrow-style offsets of length n_series + 1
+// (returns one concatenated array). Either way the whole universe runs in one
+// call with the GIL released once.
+
+std::vector<batch::Series> series_from_offsets(const InputArray& values, const OffsetArray& offsets, double* output) {
+    check_1d(values);
+    if (offsets.ndim() != 1 || offsets.shape(0) < 1) {
+        throw std::invalid_argument("offsets must be a 1-D array of length n_series + 1");
+    }
+
+    const long long* off = offsets.data();
+    long long n_series = offsets.shape(0) - 1;
+    if (off[0] != 0 || off[n_series] != values.shape(0)) {
+        throw std::invalid_argument("offsets must start at 0 and end at len(values)");
+    }
+
+    std::vector<batch::Series> series;
+    series.reserve(static_cast<size_t>(n_series));
+    for (long long s = 0; s < n_series; ++s) {
+        if (off[s + 1] < off[s]) throw std::invalid_argument("offsets must be non-decreasing");
+        series.push_back(batch::Series{values.data() + off[s], output + off[s], off[s + 1] - off[s]});
+    }
+    return series;
+}
+
+py::list batch_volatility(std::vector<InputArray> series_list, int window) {
+    check_window(window);
+
+    std::vector<batch::Series> series;
+    py::list results;
+    for (auto& input_array : series_list) {
+        check_1d(input_array);
+        long long size = input_array.shape(0);
+        // Like batch_volatility_offsets, short series come back as NaN of their length.
+        auto result = py::array_t<double>(size);
+        series.push_back(batch::Series{input_array.data(), result.mutable_data(), size});
+        results.append(result);
+    }
+
+    {
+        py::gil_scoped_release release;
+        batch::volatility(series, window);
+    }
+
+    return results;
+}
+
+py::array_t<double> batch_volatility_offsets(InputArray values, OffsetArray offsets, int window) {
+    check_window(window);
+
+    auto result = py::array_t<double>(values.shape(0));
+    auto series = series_from_offsets(values, offsets, result.mutable_data());
+
+    {
+        py::gil_scoped_release release;
+        batch::volatility(series, window);
+    }
+
+    return result;
+}
+
+py::list batch_fractional_diff(std::vector<InputArray> series_list, double d, double thres, const std::string& method) {
+    fracdiff::Method mode = parse_method(method);
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+
+    std::vector<batch::Series> series;
+    py::list results;
+    for (auto& input_array : series_list) {
+        check_1d(input_array);
+        long long size = input_array.shape(0);
+        auto result = py::array_t<double>(size);
+        series.push_back(batch::Series{input_array.data(), result.mutable_data(), size});
+        results.append(result);
+    }
+
+    {
+        py::gil_scoped_release release;
+        batch::fractional_diff(series, *kernel, mode);
+    }
+
+    return results;
+}
+
+py::array_t<double> batch_fractional_diff_offsets(InputArray values, OffsetArray offsets, double d, double thres, const std::string& method) {
+    fracdiff::Method mode = parse_method(method);
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+
+    auto result = py::array_t<double>(values.shape(0));
+    auto series = series_from_offsets(values, offsets, result.mutable_data());
+
+    {
+        py::gil_scoped_release release;
+        batch::fractional_diff(series, *kernel, mode);
+    }
+
+    return result;
+}
+
+// --- Bar sampling ---
+// Timestamps are int64 (e.g. epoch nanoseconds); prices and volumes float64.
+// Bars come back as a dict of column arrays plus the residual "state" dict,
+// which can be passed back in to resume the stream.
+
+bars::Kind parse_bar_kind(const std::string& kind) {
+    if (kind == "dollar") return bars::Kind::Dollar;
+    if (kind == "volume") return bars::Kind::Volume;
+    if (kind == "tick") return bars::Kind::Tick;
+    if (kind == "tick_imbalance") return bars::Kind::TickImbalance;
+    throw std::invalid_argument("kind must be 'dollar', 'volume', 'tick' or 'tick_imbalance'");
+}
+
+bars::Config bar_config(const std::string& kind, double threshold, double alpha) {
+    if (!(threshold > 0.0)) throw std::invalid_argument("threshold must be > 0");
+    if (!(alpha > 0.0 && alpha <= 1.0)) throw std::invalid_argument("alpha must be in (0, 1]");
+    return bars::Config{parse_bar_kind(kind), threshold, alpha};
+}
+
+bars::State state_from_object(const py::object& obj) {
+    bars::State state;
+    if (obj.is_none()) return state;
+
+    py::dict d = obj.cast<py::dict>();
+    auto get = [&](const char* key, double fallback) {
+        return d.contains(key) ? d[key].cast<double>() : fallback;
+    };
+
+    state.has_open_bar = d.contains("has_open_bar") && d["has_open_bar"].cast<bool>();
+    state.bar.timestamp = d.contains("timestamp") ? d["timestamp"].cast<long long>() : 0;
+    state.bar.open = get("open", 0.0);
+    state.bar.high = get("high", 0.0);
+    state.bar.low = get("low", 0.0);
+    state.bar.close = get("close", 0.0);
+    state.bar.volume = get("volume", 0.0);
+    state.bar.dollar_volume = get("dollar_volume", 0.0);
+    state.bar.ticks = d.contains("ticks") ? d["ticks"].cast<long long>() : 0;
+    state.accumulator = get("accumulator", 0.0);
+    state.last_price = get("last_price", std::nan(""));
+    state.last_sign = get("last_sign", 0.0);
+    state.expected_ticks = get("expected_ticks", 0.0);
+    state.expected_imbalance = get("expected_imbalance", 1.0);
+    return state;
+}
+
+py::dict state_to_dict(const bars::State& state) {
+    py::dict d;
+    d["has_open_bar"] = state.has_open_bar;
+    d["timestamp"] = state.bar.timestamp;
+    d["open"] = state.bar.open;
+    d["high"] = state.bar.high;
+    d["low"] = state.bar.low;
+    d["close"] = state.bar.close;
+    d["volume"] = state.bar.volume;
+    d["dollar_volume"] = state.bar.dollar_volume;
+    d["ticks"] = state.bar.ticks;
+    d["accumulator"] = state.accumulator;
+    d["last_price"] = state.last_price;
+    d["last_sign"] = state.last_sign;
+    d["expected_ticks"] = state.expected_ticks;
+    d["expected_imbalance"] = state.expected_imbalance;
+    return d;
+}
+
+py::dict bars_to_dict(const std::vector<bars::Bar>& out) {
+    size_t n = out.size();
+    py::array_t<long long> timestamp(n), ticks(n);
+    py::array_t<double> open(n), high(n), low(n), close(n), volume(n), dollar_volume(n);
+
+    long long* ts = timestamp.mutable_data();
+    long long* tk = ticks.mutable_data();
+    double *o = open.mutable_data(), *h = high.mutable_data(), *l = low.mutable_data();
+    double *c = close.mutable_data(), *v = volume.mutable_data(), *dv = dollar_volume.mutable_data();
+    for (size_t i = 0; i < n; ++i) {
+        const bars::Bar& bar = out[i];
+        ts[i] = bar.timestamp;
+        o[i] = bar.open;
+        h[i] = bar.high;
+        l[i] = bar.low;
+        c[i] = bar.close;
+        v[i] = bar.volume;
+        dv[i] = bar.dollar_volume;
+        tk[i] = bar.ticks;
+    }
+
+    py::dict d;
+    d["timestamp"] = timestamp;
+    d["open"] = open;
+    d["high"] = high;
+    d["low"] = low;
+    d["close"] = close;
+    d["volume"] = volume;
+    d["dollar_volume"] = dollar_volume;
+    d["ticks"] = ticks;
+    return d;
+}
+
+long long check_rows(const TimestampArray& timestamp, const std::vector<const InputArray*>& columns) {
+    if (timestamp.ndim() != 1) throw std::invalid_argument("timestamp must be a 1-D array");
+    long long size = timestamp.shape(0);
+    for (const InputArray* column : columns) {
+        check_1d(*column);
+        if (column->shape(0) != size) throw std::invalid_argument("all columns must have the same length");
+    }
+    return size;
+}
+
+py::dict build_bars(TimestampArray timestamp, InputArray open, InputArray high, InputArray low,
+                    InputArray close, InputArray volume, double threshold, const std::string& kind,
+                    py::object state, double alpha) {
+    bars::Config config = bar_config(kind, threshold, alpha);
+    long long size = check_rows(timestamp, {&open, &high, &low, &close, &volume});
+    bars::State st = state_from_object(state);
+
+    bars::Rows rows{timestamp.data(), open.data(), high.data(), low.data(), close.data(), volume.data(), size};
+    std::vector<bars::Bar> out;
+
+    {
+        py::gil_scoped_release release;
+        bars::sample(rows, config, st, out);
+    }
+
+    py::dict result = bars_to_dict(out);
+    result["state"] = state_to_dict(st);
+    return result;
+}
+
+py::dict batch_build_bars(TimestampArray timestamp, InputArray open, InputArray high, InputArray low,
+                          InputArray close, InputArray volume, OffsetArray offsets, double threshold,
+                          const std::string& kind, py::object states, double alpha) {
+    bars::Config config = bar_config(kind, threshold, alpha);
+    long long size = check_rows(timestamp, {&open, &high, &low, &close, &volume});
+
+    if (offsets.ndim() != 1 || offsets.shape(0) < 1) {
+        throw std::invalid_argument("offsets must be a 1-D array of length n_series + 1");
+    }
+    const long long* off = offsets.data();
+    long long n_series = offsets.shape(0) - 1;
+    if (off[0] != 0 || off[n_series] != size) {
+        throw std::invalid_argument("offsets must start at 0 and end at len(values)");
+    }
+    for (long long s = 0; s < n_series; ++s) {
+        if (off[s + 1] < off[s]) throw std::invalid_argument("offsets must be non-decreasing");
+    }
+
+    std::vector<bars::State> st(static_cast<size_t>(n_series));
+    if (!states.is_none()) {
+        py::list state_list = states.cast<py::list>();
+        if (static_cast<long long>(state_list.size()) != n_series) {
+            throw std::invalid_argument("states must have one entry per series");
         }
+        for (long long s = 0; s < n_series; ++s) st[s] = state_from_object(state_list[s]);
+    }
+
+    std::vector<std::vector<bars::Bar>> outs(static_cast<size_t>(n_series));
 
+    int team = threads::team_size(off[n_series]);
+
+    {
+        py::gil_scoped_release release;
+
+        #pragma omp parallel for schedule(dynamic, 1) num_threads(team) if(team > 1)
+        for (long long s = 0; s < n_series; ++s) {
+            long long lo = off[s];
+            bars::Rows rows{timestamp.data() + lo, open.data() + lo, high.data() + lo, low.data() + lo,
+                            close.data() + lo, volume.data() + lo, off[s + 1] - lo};
+            bars::sample(rows, config, st[s], outs[s]);
+        }
     }
 
+    std::vector<bars::Bar> all;
+    py::array_t<long long> bar_offsets(n_series + 1);
+    long long* bo = bar_offsets.mutable_data();
+    bo[0] = 0;
+    for (long long s = 0; s < n_series; ++s) {
+        all.insert(all.end(), outs[s].begin(), outs[s].end());
+        bo[s + 1] = static_cast<long long>(all.size());
+    }
+
+    py::dict result = bars_to_dict(all);
+    result["offsets"] = bar_offsets;
+    py::list state_list;
+    for (const auto& state : st) state_list.append(state_to_dict(state));
+    result["states"] = state_list;
     return result;
 }
 
+// --- Labeling ---
+
+py::tuple triple_barrier(InputArray close_array, InputArray vol_array, double pt, double sl, int horizon) {
+    check_1d(close_array);
+    check_1d(vol_array);
+    if (close_array.shape(0) != vol_array.shape(0)) {
+        throw std::invalid_argument("close and volatility must have the same length");
+    }
+    if (horizon < 1) throw std::invalid_argument("horizon must be >= 1");
+
+    long long size = close_array.shape(0);
+    py::array_t<int> labels(size);
+    py::array_t<long long> touch(size);
+    py::array_t<double> ret(size);
+
+    const double* close = close_array.data();
+    const double* vol = vol_array.data();
+    int* label_out = labels.mutable_data();
+    long long* touch_out = touch.mutable_data();
+    double* ret_out = ret.mutable_data();
+
+    {
+        py::gil_scoped_release release;
+        barriers::label(close, vol, size, pt, sl, horizon, label_out, touch_out, ret_out);
+    }
+
+    return py::make_tuple(labels, touch, ret);
+}
+
+// --- Fused features ---
+
+features::Params feature_params(double d, double thres, long long vol_span, long long rsi_period,
+                                const std::vector<long long>& lags, double vol_fill) {
+    if (vol_span < 1) throw std::invalid_argument("vol_span must be >= 1");
+    if (rsi_period < 1) throw std::invalid_argument("rsi_period must be >= 1");
+    for (long long lag : lags) {
+        if (lag < 1) throw std::invalid_argument("lags must be >= 1");
+    }
+    return features::Params{d, thres, vol_span, rsi_period, lags, vol_fill};
+}
+
+py::array_t<double> compute_features(const py::object& close_obj, double d, double thres, long long vol_span,
+                                     long long rsi_period, std::vector<long long> lags, double vol_fill,
+                                     py::object out, py::object log_return) {
+    Input close(close_obj);
+    features::Params params = feature_params(d, thres, vol_span, rsi_period, lags, vol_fill);
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+
+    py::ssize_t size = close.size();
+    auto matrix = output_buffer(out, {size, static_cast<py::ssize_t>(features::n_columns(params))});
+    auto returns = output_buffer(log_return, {size});
+
+    double* matrix_out = matrix.mutable_data();
+    double* returns_out = returns.mutable_data();
+
+    {
+        py::gil_scoped_release release;
+        close.visit([&](const auto& x) {
+            features::compute(x, size, params, *kernel, matrix_out, returns_out);
+        });
+    }
+
+    return matrix;
+}
+
+py::tuple batch_compute_features(std::vector<InputArray> series_list, double d, double thres, long long vol_span,
+                                 long long rsi_period, std::vector<long long> lags, double vol_fill) {
+    features::Params params = feature_params(d, thres, vol_span, rsi_period, lags, vol_fill);
+    auto kernel = fracdiff::kernel_cache().get(d, thres);
+    py::ssize_t cols = static_cast<py::ssize_t>(features::n_columns(params));
+
+    struct Job {
+        const double* close;
+        long long size;
+        double* matrix;
+        double* log_return;
+    };
+
+    std::vector<Job> jobs;
+    py::list matrix_list, returns_list;
+    for (auto& input_array : series_list) {
+        check_1d(input_array);
+        py::ssize_t size = input_array.shape(0);
+        auto matrix = py::array_t<double>({size, cols});
+        auto log_return = py::array_t<double>(size);
+        jobs.push_back(Job{input_array.data(), size, matrix.mutable_data(), log_return.mutable_data()});
+        matrix_list.append(matrix);
+        returns_list.append(log_return);
+    }
+
+    long long n_jobs = static_cast<long long>(jobs.size());
+    kernel->plan();
+
+    long long rows = 0;
+    for (const Job& job : jobs) rows += job.size;
+    int team = threads::team_size(rows * (std::min<long long>(kernel->width(), 64) + 16));
+
+    {
+        py::gil_scoped_release release;
+
+        #pragma omp parallel for schedule(dynamic, 1) num_threads(team) if(team > 1)
+        for (long long s = 0; s < n_jobs; ++s) {
+            const Job& job = jobs[s];
+            features::compute(job.close, job.size, params, *kernel, job.matrix, job.log_return);
+        }
+    }
+
+    return py::make_tuple(matrix_list, returns_list);
+}
+
+// --- Parameter-sweep backtest ---
+
+// Per-column parameter: a scalar (or length-1 array) is broadcast to every
+// column, otherwise the array must have one entry per column.
+template <typename T>
+std::vector<T> column_param(const py::array_t<T, py::array::c_style | py::array::forcecast>& values,
+                            long long n_cols, const char* name) {
+    if (values.ndim() > 1) throw std::invalid_argument(std::string(name) + " must be a scalar or 1-D array");
+    long long size = values.size();
+    if (size == 1) return std::vector<T>(static_cast<size_t>(n_cols), values.data()[0]);
+    if (size != n_cols) throw std::invalid_argument(std::string(name) + " must have one entry per column");
+    return std::vector<T>(values.data(), values.data() + size);
+}
+
+py::dict metrics_to_dict(const std::vector<backtest::Metrics>& metrics, const std::vector<py::ssize_t>& shape) {
+    py::array_t<double> cum_return(shape), sharpe(shape), max_drawdown(shape), turnover(shape);
+    double* c = cum_return.mutable_data();
+    double* s = sharpe.mutable_data();
+    double* m = max_drawdown.mutable_data();
+    double* t = turnover.mutable_data();
+    for (size_t k = 0; k < metrics.size(); ++k) {
+        c[k] = metrics[k].cum_return;
+        s[k] = metrics[k].sharpe;
+        m[k] = metrics[k].max_drawdown;
+        t[k] = metrics[k].turnover;
+    }
+
+    py::dict result;
+    result["cum_return"] = cum_return;
+    result["sharpe"] = sharpe;
+    result["max_drawdown"] = max_drawdown;
+    result["turnover"] = turnover;
+    return result;
+}
+
+py::dict backtest_signals(InputArray returns, InputArray signals, InputArray cost, double risk_free,
+                          double periods_per_year) {
+    check_1d(returns);
+    if (signals.ndim() != 2 || signals.shape(0) != returns.shape(0)) {
+        throw std::invalid_argument("signals must be a (len(returns), n_columns) array");
+    }
+    long long size = returns.shape(0);
+    long long n_cols = signals.shape(1);
+    std::vector<double> costs = column_param(cost, n_cols, "cost");
+
+    std::vector<backtest::Metrics> metrics(static_cast<size_t>(n_cols));
+    backtest::Config config{risk_free, periods_per_year};
+    const double* ret = returns.data();
+    const double* sig = signals.data();
+
+    {
+        py::gil_scoped_release release;
+        backtest::signals(ret, sig, size, n_cols, costs.data(), config, metrics.data());
+    }
+
+    return metrics_to_dict(metrics, {static_cast<py::ssize_t>(n_cols)});
+}
+
+py::dict backtest_thresholds(InputArray returns, InputArray score, InputArray threshold, OffsetArray holding,
+                             InputArray cost, py::object offsets, double risk_free, double periods_per_year) {
+    check_1d(returns);
+    check_1d(score);
+    check_1d(threshold);
+    if (score.shape(0) != returns.shape(0)) throw std::invalid_argument("score and returns must have the same length");
+
+    long long size = returns.shape(0);
+    long long n_cols = threshold.shape(0);
+    std::vector<long long> holds = column_param(holding, n_cols, "holding");
+    std::vector<double> costs = column_param(cost, n_cols, "cost");
+    for (long long h : holds) {
+        if (h < 1) throw std::invalid_argument("holding must be >= 1");
+    }
+
+    std::vector<long long> bounds{0, size};
+    if (!offsets.is_none()) {
+        auto off = offsets.cast<OffsetArray>();
+        if (off.ndim() != 1 || off.shape(0) < 1) {
+            throw std::invalid_argument("offsets must be a 1-D array of length n_series + 1");
+        }
+        bounds.assign(off.data(), off.data() + off.shape(0));
+        if (bounds.front() != 0 || bounds.back() != size) {
+            throw std::invalid_argument("offsets must start at 0 and end at len(returns)");
+        }
+        for (size_t k = 1; k < bounds.size(); ++k) {
+            if (bounds[k] < bounds[k - 1]) throw std::invalid_argument("offsets must be non-decreasing");
+        }
+    }
+    long long n_series = static_cast<long long>(bounds.size()) - 1;
+
+    std::vector<backtest::Metrics> metrics(static_cast<size_t>(n_series * n_cols));
+    backtest::Config config{risk_free, periods_per_year};
+    const double* ret = returns.data();
+    const double* sc = score.data();
+    const double* thr = threshold.data();
+
+    {
+        py::gil_scoped_release release;
+        backtest::thresholds(ret, sc, bounds.data(), n_series, thr, holds.data(), costs.data(), n_cols, config,
+                             metrics.data());
+    }
+
+    if (offsets.is_none()) return metrics_to_dict(metrics, {static_cast<py::ssize_t>(n_cols)});
+    return metrics_to_dict(metrics, {static_cast<py::ssize_t>(n_series), static_cast<py::ssize_t>(n_cols)});
+}
+
+// --- Minimum-d search ---
+
+py::dict min_ffd_d(std::vector<InputArray> series_list, std::vector<double> d_grid, double thres, int lags) {
+    if (d_grid.empty()) throw std::invalid_argument("d_grid must not be empty");
+    if (lags < 0) throw std::invalid_argument("lags must be >= 0");
+
+    // Kernels are fetched (and, for long ones, planned) with the GIL held so
+    // the worker threads only ever read them.
+    std::vector<std::shared_ptr<const fracdiff::Kernel>> owned;
+    std::vector<const fracdiff::Kernel*> kernels;
+    for (double d : d_grid) {
+        auto kernel = fracdiff::kernel_cache().get(d, thres);
+        if (kernel->width() >= fracdiff::MIN_FFT_WIDTH) kernel->plan();
+        kernels.push_back(kernel.get());
+        owned.push_back(kernel);
+    }
+
+    std::vector<stationarity::Series> series;
+    for (auto& input_array : series_list) {
+        check_1d(input_array);
+        series.push_back(stationarity::Series{input_array.data(), input_array.shape(0)});
+    }
+
+    py::ssize_t n_series = static_cast<py::ssize_t>(series.size());
+    py::ssize_t n_d = static_cast<py::ssize_t>(d_grid.size());
+    std::vector<stationarity::AdfResult> results(static_cast<size_t>(n_series * n_d));
+
+    {
+        py::gil_scoped_release release;
+        stationarity::grid(series, kernels, lags, results.data());
+    }
+
+    py::array_t<double> chosen(n_series), stat({n_series, n_d}), critical({n_series, n_d});
+    py::array_t<long long> nobs({n_series, n_d});
+    double* chosen_out = chosen.mutable_data();
+    double* stat_out = stat.mutable_data();
+    double* critical_out = critical.mutable_data();
+    long long* nobs_out = nobs.mutable_data();
+
+    for (py::ssize_t s = 0; s < n_series; ++s) {
+        chosen_out[s] = std::nan("");
+        for (py::ssize_t j = 0; j < n_d; ++j) {
+            const stationarity::AdfResult& r = results[s * n_d + j];
+            stat_out[s * n_d + j] = r.stat;
+            critical_out[s * n_d + j] = r.critical;
+            nobs_out[s * n_d + j] = r.nobs;
+            bool stationary = r.stat < r.critical;
+            if (stationary && !(chosen_out[s] <= d_grid[j])) chosen_out[s] = d_grid[j];
+        }
+    }
+
+    py::dict result;
+    result["d"] = chosen;
+    result["adf"] = stat;
+    result["critical"] = critical;
+    result["nobs"] = nobs;
+    return result;
+}
+
+// --- Streaming state ---
+
+template <typename State>
+py::array_t<double> update_state(State& state, const py::object& values, const py::object& out) {
+    Input input(values);
+    long long size = input.size();
+
+    auto result = output_buffer(out, {static_cast<py::ssize_t>(size)});
+    double* output = result.mutable_data();
+    input.visit([&](const auto& x) {
+        for (long long i = 0; i < size; ++i) {
+            output[i] = state.update(x[i]);
+        }
+    });
+    return result;
+}
+
+template <typename State>
+void bind_state(py::class_<State>& cls) {
+    cls.def("update", &update_state<State>, "Advance by the new values; returns one output per value",
+            py::arg("values"), py::arg("out") = py::none())
+       .def("to_bytes", [](const State& state) { return py::bytes(state.to_bytes()); })
+       .def_static("from_bytes", [](const py::bytes& data) { return State::from_bytes(std::string(data)); },
+                   py::arg("data"))
+       .def(py::pickle(
+           [](const State& state) { return py::bytes(state.to_bytes()); },
+           [](const py::bytes& data) { return State::from_bytes(std::string(data)); }));
+}
+
+// --- Thread budget ---
+
+void set_num_threads(int n) {
+    if (n < 0) throw std::invalid_argument("n must be >= 0 (0 restores the default)");
+    threads::process_budget().store(n);
+}
+
+int get_num_threads() {
+    return threads::budget();
+}
+
+void set_parallel_threshold(long long work) {
+    if (work < 1) throw std::invalid_argument("threshold must be >= 1");
+    threads::parallel_threshold().store(work);
+}
+
+long long get_parallel_threshold() {
+    return threads::parallel_threshold().load();
+}
+
+// Context manager capping the budget on the calling thread only; it never
+// raises the process budget or an enclosing limit, and restores the previous
+// limit on exit.
+class ThreadLimit {
+public:
+    explicit ThreadLimit(int n) : n_(n) {
+        if (n < 1) throw std::invalid_argument("n must be >= 1");
+    }
+
+    ThreadLimit& enter() {
+        previous_ = threads::call_limit();
+        threads::call_limit() = previous_ > 0 ? std::min(previous_, n_) : n_;
+        return *this;
+    }
+
+    void exit(const py::args&) { threads::call_limit() = previous_; }
+
+private:
+    int n_;
+    int previous_ = 0;
+};
+
+void clear_weights_cache() {
+    fracdiff::kernel_cache().clear();
+}
+
+size_t weights_cache_size() {
+    return fracdiff::kernel_cache().size();
+}
+
+size_t weights_cache_capacity() {
+    return fracdiff::kernel_cache().capacity();
+}
+
+void set_weights_cache_capacity(size_t capacity) {
+    fracdiff::kernel_cache().set_capacity(capacity);
+}
+
 PYBIND11_MODULE(quant_engine, m) {
     m.doc() = "C++23 Quant Engine";
-    m.def("calculate_volatility", &calculate_volatility, "Calculate Rolling Volatility");
-    m.def("fractional_diff", &fractional_diff, "Calculate FFD");
+
+    if (const char* env = std::getenv("QUANT_ENGINE_THREADS")) {
+        threads::process_budget().store(std::max(0, std::atoi(env)));
+    }
+
+    m.def("calculate_volatility", &calculate_volatility, "Calculate Rolling Volatility",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("rolling_mean", &rolling_mean, "Rolling Mean (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("rolling_var", &rolling_var, "Rolling Variance (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("ddof") = 0, py::arg("out") = py::none());
+    m.def("rolling_std", &rolling_std, "Rolling Standard Deviation (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("ddof") = 0, py::arg("out") = py::none());
+    m.def("rolling_zscore", &rolling_zscore, "Rolling Z-Score of the last element (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("rolling_skew", &rolling_skew, "Rolling Skewness, biased (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("rolling_min", &rolling_min, "Rolling Minimum, monotonic deque (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("rolling_max", &rolling_max, "Rolling Maximum, monotonic deque (O(n))",
+          py::arg("input"), py::arg("window"), py::arg("out") = py::none());
+    m.def("fractional_diff", &fractional_diff,
+          "Calculate FFD. method='auto' switches to FFT overlap-save for long weight vectors",
+          py::arg("input"), py::arg("d"), py::arg("thres"), py::arg("method") = "auto",
+          py::arg("out") = py::none());
+    m.def("batch_volatility", &batch_volatility,
+          "calculate_volatility over a list of series in one native call (short series are NaN)",
+          py::arg("series"), py::arg("window"));
+    m.def("batch_volatility_offsets", &batch_volatility_offsets,
+          "calculate_volatility over concatenated series delimited by offsets (short series are NaN)",
+          py::arg("values"), py::arg("offsets"), py::arg("window"));
+    m.def("batch_fractional_diff", &batch_fractional_diff,
+          "fractional_diff over a list of series in one native call",
+          py::arg("series"), py::arg("d"), py::arg("thres"), py::arg("method") = "auto");
+    m.def("batch_fractional_diff_offsets", &batch_fractional_diff_offsets,
+          "fractional_diff over concatenated series delimited by offsets",
+          py::arg("values"), py::arg("offsets"), py::arg("d"), py::arg("thres"), py::arg("method") = "auto");
+    m.def("build_bars", &build_bars,
+          "Sample dollar/volume/tick/tick_imbalance bars in one pass; returns columns plus the residual state",
+          py::arg("timestamp"), py::arg("open"), py::arg("high"), py::arg("low"), py::arg("close"),
+          py::arg("volume"), py::arg("threshold"), py::arg("kind") = "dollar",
+          py::arg("state") = py::none(), py::arg("alpha") = 0.1);
+    m.def("batch_build_bars", &batch_build_bars,
+          "build_bars over concatenated series delimited by offsets, parallel across series",
+          py::arg("timestamp"), py::arg("open"), py::arg("high"), py::arg("low"), py::arg("close"),
+          py::arg("volume"), py::arg("offsets"), py::arg("threshold"), py::arg("kind") = "dollar",
+          py::arg("states") = py::none(), py::arg("alpha") = 0.1);
+    m.def("triple_barrier", &triple_barrier,
+          "First-touch triple-barrier labels; returns (label, touch_index, touch_return)",
+          py::arg("close"), py::arg("volatility"), py::arg("profit_take"), py::arg("stop_loss"),
+          py::arg("horizon"));
+    m.def("compute_features", &compute_features,
+          "Fused single-pass feature matrix: volatility, rsi, frac_diff, return lags (in that column order)",
+          py::arg("close"), py::arg("d") = 0.4, py::arg("thres") = 1e-3, py::arg("vol_span") = 20,
+          py::arg("rsi_period") = 14, py::arg("lags") = std::vector<long long>{1, 2, 3, 5, 10},
+          py::arg("vol_fill") = 0.01, py::arg("out") = py::none(), py::arg("log_return") = py::none());
+    m.def("batch_compute_features", &batch_compute_features,
+          "compute_features over a list of series; returns (matrices, log_returns)",
+          py::arg("series"), py::arg("d") = 0.4, py::arg("thres") = 1e-3, py::arg("vol_span") = 20,
+          py::arg("rsi_period") = 14, py::arg("lags") = std::vector<long long>{1, 2, 3, 5, 10},
+          py::arg("vol_fill") = 0.01);
+    m.def("backtest_signals", &backtest_signals,
+          "Backtest every column of a (n, k) position matrix in parallel; returns per-column "
+          "cum_return, sharpe, max_drawdown, turnover",
+          py::arg("returns"), py::arg("signals"), py::arg("cost") = 0.0, py::arg("risk_free") = 0.0,
+          py::arg("periods_per_year") = 252.0 * 7.0);
+    m.def("backtest_thresholds", &backtest_thresholds,
+          "Sweep (threshold, holding, cost) rules over a score series, or over concatenated series "
+          "delimited by offsets (metrics are then (n_series, k))",
+          py::arg("returns"), py::arg("score"), py::arg("threshold"), py::arg("holding") = 1,
+          py::arg("cost") = 0.0, py::arg("offsets") = py::none(), py::arg("risk_free") = 0.0,
+          py::arg("periods_per_year") = 252.0 * 7.0);
+    m.def("min_ffd_d", &min_ffd_d,
+          "Smallest d of the grid whose FFD passes a 5% ADF test, per series (NaN if none); "
+          "also returns the full (n_series, n_d) adf/critical/nobs tables",
+          py::arg("series"), py::arg("d_grid"), py::arg("thres") = 1e-3, py::arg("lags") = 1);
+
+    py::class_<streaming::FracDiffState> frac_diff_state(m, "FracDiffState",
+        "Incremental FFD over a ring buffer of the last `width` prices");
+    frac_diff_state.def(py::init<double, double>(), py::arg("d"), py::arg("thres"))
+        .def_property_readonly("d", &streaming::FracDiffState::d)
+        .def_property_readonly("thres", &streaming::FracDiffState::thres)
+        .def_property_readonly("width", &streaming::FracDiffState::width)
+        .def_property_readonly("count", &streaming::FracDiffState::count);
+    bind_state(frac_diff_state);
+
+    py::class_<streaming::RollingVolState> rolling_vol_state(m, "RollingVolState",
+        "Incremental calculate_volatility (population std, 0.0 padding)");
+    rolling_vol_state.def(py::init<long long>(), py::arg("window"))
+        .def_property_readonly("window", &streaming::RollingVolState::window)
+        .def_property_readonly("count", &streaming::RollingVolState::count);
+    bind_state(rolling_vol_state);
+
+    py::class_<streaming::EwmRsiState> ewm_rsi_state(m, "EwmRsiState",
+        "Incremental EWMA RSI matching feature_engineering.calculate_rsi");
+    ewm_rsi_state.def(py::init<long long>(), py::arg("period") = 14)
+        .def_property_readonly("period", &streaming::EwmRsiState::period);
+    bind_state(ewm_rsi_state);
+
+    m.def("set_num_threads", &set_num_threads,
+          "Process-wide thread budget for every kernel (0 restores the default; "
+          "QUANT_ENGINE_THREADS sets it at import)", py::arg("n"));
+    m.def("get_num_threads", &get_num_threads, "Thread budget in effect on the calling thread");
+    m.def("set_parallel_threshold", &set_parallel_threshold,
+          "Estimated work below which kernels run on the calling thread", py::arg("work"));
+    m.def("get_parallel_threshold", &get_parallel_threshold, "Current serial/parallel cut-over");
+    py::class_<ThreadLimit>(m, "thread_limit",
+        "Context manager capping the thread budget for calls made on this thread")
+        .def(py::init<int>(), py::arg("n"))
+        .def("__enter__", &ThreadLimit::enter, py::return_value_policy::reference_internal)
+        .def("__exit__", &ThreadLimit::exit);
+
+    m.def("get_weights_ffd", &get_weights_ffd, "FFD weights (oldest first), served from the (d, thres) cache",
+          py::arg("d"), py::arg("thres"));
+    m.def("clear_weights_cache", &clear_weights_cache, "Drop all cached FFD weight vectors and spectra");
+    m.def("weights_cache_size", &weights_cache_size, "Number of (d, thres) pairs in the FFD weight cache");
+    m.def("weights_cache_capacity", &weights_cache_capacity, "Most (d, thres) pairs the FFD weight cache keeps");
+    m.def("set_weights_cache_capacity", &set_weights_cache_capacity, py::arg("capacity"),
+          "Cap the FFD weight cache at `capacity` pairs (at least 1), evicting the least recently used");
 }
\ No newline at end of file
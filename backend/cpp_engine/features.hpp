@@ -0,0 +1,124 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+
+#include "fracdiff.hpp"
+#include "streaming.hpp"
+
+// Fused feature pass. Walks the close series once and writes every model
+// feature into a row-major (n, columns) matrix in the order the models
+// consume them:
+//
+//   volatility, rsi, frac_diff, return_lag_<lag> for each lag
+//
+// plus the log return into a separate vector. Definitions follow the Polars
+// expressions they replace:
+//   volatility  close.pct_change().ewm_std(span).fill_null(vol_fill)
+//               (adjust=True, bias=False)
+//   rsi         feature_engineering.calculate_rsi (EWMA, adjust=False)
+//   frac_diff   fractional_diff(close, d, thres)
+//   log_return  log(close / close.shift(1))
+
+namespace features {
+
+struct Params {
+    double d;
+    double thres;
+    long long vol_span;
+    long long rsi_period;
+    std::vector<long long> lags;
+    double vol_fill;
+};
+
+inline long long n_columns(const Params& params) {
+    return 3 + static_cast<long long>(params.lags.size());
+}
+
+// Unbiased exponentially weighted variance with adjust=True, kept as decayed
+// weight and moment sums.
+class EwmVar {
+public:
+    explicit EwmVar(long long span) : decay_(1.0 - 2.0 / (span + 1.0)) {}
+
+    void add(double x) {
+        sum_w_ = decay_ * sum_w_ + 1.0;
+        sum_w2_ = decay_ * decay_ * sum_w2_ + 1.0;
+        sum_x_ = decay_ * sum_x_ + x;
+        sum_xx_ = decay_ * sum_xx_ + x * x;
+    }
+
+    // NaN until two observations make the bias correction defined.
+    double std() const {
+        double denom = sum_w_ * sum_w_ - sum_w2_;
+        if (!(denom > 0.0)) return std::nan("");
+        double mean = sum_x_ / sum_w_;
+        double biased = std::max(0.0, sum_xx_ / sum_w_ - mean * mean);
+        return std::sqrt(biased * sum_w_ * sum_w_ / denom);
+    }
+
+private:
+    double decay_;
+    double sum_w_ = 0.0;
+    double sum_w2_ = 0.0;
+    double sum_x_ = 0.0;
+    double sum_xx_ = 0.0;
+};
+
+template <typename X>
+inline void compute(const X& close, long long size, const Params& params, const fracdiff::Kernel& kernel,
+                    double* out, double* log_return) {
+    const double nan = std::nan("");
+    long long cols = n_columns(params);
+    long long width = kernel.width();
+    const double* w = kernel.weights.data();
+
+    // Long weight vectors go through overlap-save first; short ones are
+    // folded into the main loop while the window is still in L1.
+    std::vector<double> frac;
+    bool use_fft = fracdiff::prefer_fft(kernel, size);
+    if (use_fft) {
+        frac.assign(static_cast<size_t>(size), nan);
+        std::vector<fracdiff::cplx> buffer(kernel.fft_size());
+        long long n_pairs = fracdiff::overlap_save_layout(kernel, size).n_pairs;
+        fracdiff::overlap_save_pairs(close, frac.data(), size, kernel, 0, n_pairs, buffer.data());
+    }
+
+    EwmVar vol(params.vol_span);
+    streaming::EwmRsiState rsi(params.rsi_period);
+
+    for (long long i = 0; i < size; ++i) {
+        double* row = out + i * cols;
+
+        if (i > 0) {
+            double ratio = close[i] / close[i - 1];
+            log_return[i] = std::log(ratio);
+            vol.add(ratio - 1.0);
+        } else {
+            log_return[i] = nan;
+        }
+
+        double sd = vol.std();
+        row[0] = std::isnan(sd) ? params.vol_fill : sd;
+        row[1] = rsi.update(close[i]);
+
+        if (i < width - 1) {
+            row[2] = nan;
+        } else if (use_fft) {
+            row[2] = frac[i];
+        } else {
+            long long first = i - width + 1;
+            double dot_product = 0.0;
+            for (long long j = 0; j < width; ++j) dot_product += w[j] * close[first + j];
+            row[2] = dot_product;
+        }
+
+        for (size_t k = 0; k < params.lags.size(); ++k) {
+            long long lag = params.lags[k];
+            row[3 + k] = i >= lag ? log_return[i - lag] : nan;
+        }
+    }
+}
+
+}  // namespace features
@@ -0,0 +1,351 @@
+#pragma once
+
+#include <cmath>
+#include <complex>
+#include <list>
+#include <map>
+#include <memory>
+#include <mutex>
+#include <utility>
+#include <vector>
+#include <algorithm>
+#include <omp.h>
+
+#include "threads.hpp"
+
+// Fixed-width fractional differentiation (FFD) kernels.
+//
+// The direct path is a dense dot product of `width` weights per output. When
+// the weight vector gets long (small d or a tight threshold) the same
+// correlation is computed by FFT overlap-save: the series is cut into blocks of
+// a fixed FFT size that stays cache resident, and two real blocks are packed
+// into one complex transform. Weight vectors and their spectra are cached by
+// (d, thres) so a universe-wide pass only builds them once; the cache keeps
+// the most recently used CACHE_CAPACITY pairs.
+
+namespace fracdiff {
+
+using cplx = std::complex<double>;
+
+enum class Method { Auto, Direct, Fft };
+
+// Below this many weights the direct dot product always wins.
+constexpr long long MIN_FFT_WIDTH = 64;
+
+// Smallest transform used by overlap-save; keeps the per-block overhead low
+// for medium widths.
+constexpr size_t MIN_FFT_SIZE = 1024;
+
+// Kernels kept by the process-wide cache: the whole d grid many times over.
+constexpr size_t CACHE_CAPACITY = 64;
+
+inline std::vector<double> get_weights_ffd(double d, double thres) {
+    std::vector<double> w;
+    w.push_back(1.0);
+    double k = 1.0;
+
+    while (true) {
+        double w_last = w.back();
+        double w_k = -w_last / k * (d - k + 1.0);
+        if (std::abs(w_k) < thres) break;
+        w.push_back(w_k);
+        k += 1.0;
+    }
+
+    std::reverse(w.begin(), w.end());
+    return w;
+}
+
+inline size_t next_pow2(size_t n) {
+    size_t p = 1;
+    while (p < n) p <<= 1;
+    return p;
+}
+
+// Iterative radix-2 FFT with a precomputed twiddle table. Twiddles are taken
+// from the table rather than a recurrence to keep the round-off at O(log n).
+class FftPlan {
+public:
+    explicit FftPlan(size_t n) : n_(n), twiddle_(n / 2), rev_(n) {
+        const double pi = std::acos(-1.0);
+        for (size_t k = 0; k < n / 2; ++k) {
+            double angle = -2.0 * pi * static_cast<double>(k) / static_cast<double>(n);
+            twiddle_[k] = cplx(std::cos(angle), std::sin(angle));
+        }
+
+        size_t bits = 0;
+        while ((size_t(1) << bits) < n) ++bits;
+        for (size_t i = 0; i < n; ++i) {
+            size_t r = 0;
+            for (size_t b = 0; b < bits; ++b) {
+                if (i & (size_t(1) << b)) r |= size_t(1) << (bits - 1 - b);
+            }
+            rev_[i] = r;
+        }
+    }
+
+    size_t size() const { return n_; }
+
+    void forward(cplx* a) const { transform(a, false); }
+
+    void inverse(cplx* a) const {
+        transform(a, true);
+        double scale = 1.0 / static_cast<double>(n_);
+        for (size_t i = 0; i < n_; ++i) a[i] *= scale;
+    }
+
+private:
+    void transform(cplx* a, bool invert) const {
+        for (size_t i = 0; i < n_; ++i) {
+            if (i < rev_[i]) std::swap(a[i], a[rev_[i]]);
+        }
+
+        for (size_t len = 2; len <= n_; len <<= 1) {
+            size_t half = len / 2;
+            size_t step = n_ / len;
+            for (size_t start = 0; start < n_; start += len) {
+                for (size_t j = 0; j < half; ++j) {
+                    cplx w = twiddle_[j * step];
+                    if (invert) w = std::conj(w);
+                    cplx u = a[start + j];
+                    cplx v = a[start + j + half] * w;
+                    a[start + j] = u + v;
+                    a[start + j + half] = u - v;
+                }
+            }
+        }
+    }
+
+    size_t n_;
+    std::vector<cplx> twiddle_;
+    std::vector<size_t> rev_;
+};
+
+// Weights for one (d, thres) pair, plus the FFT plan and filter spectrum that
+// the overlap-save path needs. The spectrum is built on first use.
+class Kernel {
+public:
+    Kernel(double d, double thres) : weights(get_weights_ffd(d, thres)) {}
+
+    long long width() const { return static_cast<long long>(weights.size()); }
+
+    size_t fft_size() const {
+        return std::max(MIN_FFT_SIZE, next_pow2(4 * weights.size()));
+    }
+
+    const FftPlan& plan() const {
+        std::call_once(spectrum_once_, [this] { build_spectrum(); });
+        return *plan_;
+    }
+
+    const std::vector<cplx>& spectrum() const {
+        std::call_once(spectrum_once_, [this] { build_spectrum(); });
+        return spectrum_;
+    }
+
+    const std::vector<double> weights;
+
+private:
+    void build_spectrum() const {
+        size_t n = fft_size();
+        plan_ = std::make_unique<FftPlan>(n);
+        spectrum_.assign(n, cplx(0.0, 0.0));
+
+        // weights are stored in dot-product order (oldest first); the
+        // convolution filter is the reverse, i.e. h[0] = 1.
+        size_t width = weights.size();
+        for (size_t k = 0; k < width; ++k) spectrum_[k] = cplx(weights[width - 1 - k], 0.0);
+        plan_->forward(spectrum_.data());
+    }
+
+    mutable std::once_flag spectrum_once_;
+    mutable std::unique_ptr<FftPlan> plan_;
+    mutable std::vector<cplx> spectrum_;
+};
+
+// Process-wide LRU cache of kernels keyed by (d, thres). Long-lived
+// processes see arbitrary d values, so it holds at most capacity() kernels;
+// an evicted kernel lives on while a caller still holds it.
+class KernelCache {
+public:
+    std::shared_ptr<const Kernel> get(double d, double thres) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        auto key = std::make_pair(d, thres);
+        auto it = cache_.find(key);
+        if (it != cache_.end()) {
+            order_.splice(order_.begin(), order_, it->second.second);
+            return it->second.first;
+        }
+
+        auto kernel = std::make_shared<const Kernel>(d, thres);
+        order_.push_front(key);
+        cache_.emplace(key, std::make_pair(kernel, order_.begin()));
+        evict();
+        return kernel;
+    }
+
+    void clear() {
+        std::lock_guard<std::mutex> lock(mutex_);
+        cache_.clear();
+        order_.clear();
+    }
+
+    size_t size() {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return cache_.size();
+    }
+
+    size_t capacity() {
+        std::lock_guard<std::mutex> lock(mutex_);
+        return capacity_;
+    }
+
+    void set_capacity(size_t capacity) {
+        std::lock_guard<std::mutex> lock(mutex_);
+        capacity_ = std::max<size_t>(1, capacity);
+        evict();
+    }
+
+private:
+    using Key = std::pair<double, double>;
+
+    // Drops the least recently used kernels beyond the capacity.
+    void evict() {
+        while (cache_.size() > capacity_) {
+            cache_.erase(order_.back());
+            order_.pop_back();
+        }
+    }
+
+    std::mutex mutex_;
+    size_t capacity_ = CACHE_CAPACITY;
+    std::list<Key> order_;  // most recently used first
+    std::map<Key, std::pair<std::shared_ptr<const Kernel>, std::list<Key>::iterator>> cache_;
+};
+
+inline KernelCache& kernel_cache() {
+    static KernelCache cache;
+    return cache;
+}
+
+// out[i] = sum_j w[j] * x[i - width + 1 + j] for i in [begin, end).
+template <typename X>
+inline void direct(const X& x, double* out, const std::vector<double>& weights, long long begin, long long end) {
+    long long width = static_cast<long long>(weights.size());
+    const double* w = weights.data();
+    for (long long i = begin; i < end; ++i) {
+        long long first = i - width + 1;
+        double dot_product = 0.0;
+        for (long long j = 0; j < width; ++j) {
+            dot_product += w[j] * x[first + j];
+        }
+        out[i] = dot_product;
+    }
+}
+
+// Rough operation counts used by the automatic dispatch.
+inline bool prefer_fft(const Kernel& kernel, long long size) {
+    long long width = kernel.width();
+    if (width < MIN_FFT_WIDTH || size < width) return false;
+
+    double outputs = static_cast<double>(size - width + 1);
+    double n = static_cast<double>(kernel.fft_size());
+    double block = n - static_cast<double>(width) + 1.0;
+    double pairs = std::ceil(outputs / block / 2.0);
+
+    double direct_cost = outputs * static_cast<double>(width);
+    double fft_cost = pairs * 2.0 * n * std::log2(n) * 2.5;
+    return fft_cost < direct_cost;
+}
+
+inline bool use_fft(Method method, const Kernel& kernel, long long size) {
+    return method == Method::Fft || (method == Method::Auto && prefer_fft(kernel, size));
+}
+
+// Overlap-save over [width - 1, size). Block b yields outputs
+// [width - 1 + b * L, width - 1 + (b + 1) * L) from the input segment starting
+// at b * L, where L = fft_size - width + 1. Blocks are processed in pairs, the
+// even one in the real part and the odd one in the imaginary part.
+struct OverlapSaveLayout {
+    long long n;
+    long long width;
+    long long block;
+    long long n_blocks;
+    long long n_pairs;
+};
+
+inline OverlapSaveLayout overlap_save_layout(const Kernel& kernel, long long size) {
+    OverlapSaveLayout layout;
+    layout.n = static_cast<long long>(kernel.fft_size());
+    layout.width = kernel.width();
+    layout.block = layout.n - layout.width + 1;
+    long long outputs = size - layout.width + 1;
+    layout.n_blocks = (outputs + layout.block - 1) / layout.block;
+    layout.n_pairs = (layout.n_blocks + 1) / 2;
+    return layout;
+}
+
+// Processes block pairs [pair_begin, pair_end) using a caller-owned scratch
+// buffer of fft_size elements, so batch callers can split one series across
+// threads.
+template <typename X>
+inline void overlap_save_pairs(const X& x, double* out, long long size, const Kernel& kernel,
+                               long long pair_begin, long long pair_end, cplx* buffer) {
+    const FftPlan& plan = kernel.plan();
+    const std::vector<cplx>& spectrum = kernel.spectrum();
+    OverlapSaveLayout layout = overlap_save_layout(kernel, size);
+    long long n = layout.n;
+    long long width = layout.width;
+
+    for (long long pair = pair_begin; pair < pair_end; ++pair) {
+        long long even = 2 * pair;
+        long long odd = even + 1;
+        long long even_start = even * layout.block;
+        long long odd_start = odd * layout.block;
+        bool has_odd = odd < layout.n_blocks;
+
+        for (long long p = 0; p < n; ++p) {
+            long long ie = even_start + p;
+            long long io = odd_start + p;
+            double re = ie < size ? x[ie] : 0.0;
+            double im = (has_odd && io < size) ? x[io] : 0.0;
+            buffer[p] = cplx(re, im);
+        }
+
+        plan.forward(buffer);
+        for (long long p = 0; p < n; ++p) buffer[p] *= spectrum[p];
+        plan.inverse(buffer);
+
+        for (long long p = width - 1; p < n; ++p) {
+            long long ie = even_start + p;
+            if (ie >= size) break;
+            out[ie] = buffer[p].real();
+        }
+        if (has_odd) {
+            for (long long p = width - 1; p < n; ++p) {
+                long long io = odd_start + p;
+                if (io >= size) break;
+                out[io] = buffer[p].imag();
+            }
+        }
+    }
+}
+
+template <typename X>
+inline void overlap_save(const X& x, double* out, long long size, const Kernel& kernel) {
+    long long n_pairs = overlap_save_layout(kernel, size).n_pairs;
+    long long n = static_cast<long long>(kernel.fft_size());
+    int team = threads::team_size(n_pairs * n * 32);
+
+    #pragma omp parallel num_threads(team) if(team > 1)
+    {
+        std::vector<cplx> buffer(kernel.fft_size());
+
+        #pragma omp for schedule(static)
+        for (long long pair = 0; pair < n_pairs; ++pair) {
+            overlap_save_pairs(x, out, size, kernel, pair, pair + 1, buffer.data());
+        }
+    }
+}
+
+}  // namespace fracdiff
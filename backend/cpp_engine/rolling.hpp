@@ -0,0 +1,208 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+#include <limits>
+#include <omp.h>
+
+#include "threads.hpp"
+
+// Streaming rolling-window kernels.
+//
+// Inputs are any indexable type (`const double*` or a view::Strided<T>).
+//
+// Every kernel writes the statistic of the window ending at index i into
+// out[i] for i in [begin, end), with begin >= window - 1. Callers split the
+// output range into one contiguous chunk per OpenMP thread; each chunk warms
+// its accumulators up from the window that precedes it, so the cost is
+// O(n + threads * window) instead of O(n * window).
+
+namespace rolling {
+
+constexpr double NaN = std::numeric_limits<double>::quiet_NaN();
+
+// Neumaier-compensated accumulator. Keeps add/remove updates exact enough
+// that a window slid over millions of rows matches a direct re-sum.
+struct CompensatedSum {
+    double sum = 0.0;
+    double comp = 0.0;
+
+    inline void add(double v) {
+        double t = sum + v;
+        if (std::abs(sum) >= std::abs(v)) {
+            comp += (sum - t) + v;
+        } else {
+            comp += (v - t) + sum;
+        }
+        sum = t;
+    }
+
+    inline double value() const { return sum + comp; }
+};
+
+// Power sums of (x - shift) over the current window, up to the given order.
+// The shift is re-anchored to the window's first element every `window`
+// steps, which bounds both cancellation (prices drift away from the anchor)
+// and accumulated rounding while keeping the amortised cost O(1) per row.
+template <int Order>
+struct ShiftedMoments {
+    double shift = 0.0;
+    CompensatedSum s[Order];
+
+    inline void reset(double new_shift) {
+        shift = new_shift;
+        for (int k = 0; k < Order; ++k) s[k] = CompensatedSum{};
+    }
+
+    inline void add(double x) {
+        double d = x - shift;
+        double p = d;
+        for (int k = 0; k < Order; ++k) {
+            s[k].add(p);
+            p *= d;
+        }
+    }
+
+    inline void remove(double x) {
+        double d = x - shift;
+        double p = d;
+        for (int k = 0; k < Order; ++k) {
+            s[k].add(-p);
+            p *= d;
+        }
+    }
+
+    inline double raw(int k) const { return s[k - 1].value(); }
+};
+
+// Runs `emit(i, moments)` for every window ending in [begin, end).
+template <int Order, typename X, typename Emit>
+inline void slide_moments(const X& x, long long window, long long begin, long long end, Emit emit) {
+    ShiftedMoments<Order> m;
+    long long i = begin;
+
+    while (i < end) {
+        long long first = i - window + 1;
+        m.reset(x[first]);
+        for (long long j = first; j <= i; ++j) m.add(x[j]);
+        emit(i, m);
+
+        long long block_end = std::min(end, i + window);
+        for (long long j = i + 1; j < block_end; ++j) {
+            m.remove(x[j - window]);
+            m.add(x[j]);
+            emit(j, m);
+        }
+        i = block_end;
+    }
+}
+
+// Splits [begin, end) into one contiguous chunk per thread and calls
+// `body(chunk_begin, chunk_end)` on each. `cost` is the work per index, used
+// to size the team; small ranges run on the calling thread.
+template <typename Body>
+inline void parallel_chunks(long long begin, long long end, Body body, long long cost = 1) {
+    if (end <= begin) return;
+
+    int team = threads::team_size((end - begin) * cost);
+    if (team == 1) {
+        body(begin, end);
+        return;
+    }
+
+    #pragma omp parallel num_threads(team)
+    {
+        long long n_threads = omp_get_num_threads();
+        long long tid = omp_get_thread_num();
+        long long total = end - begin;
+        long long chunk = (total + n_threads - 1) / n_threads;
+        long long lo = begin + tid * chunk;
+        long long hi = std::min(end, lo + chunk);
+        if (lo < hi) body(lo, hi);
+    }
+}
+
+inline double window_mean(const ShiftedMoments<1>& m, long long window) {
+    return m.shift + m.raw(1) / window;
+}
+
+// Population (ddof = 0) central moments derived from the shifted power sums.
+inline double central_m2(double mu1, double mu2) {
+    return std::max(0.0, mu2 - mu1 * mu1);
+}
+
+inline double central_m3(double mu1, double mu2, double mu3) {
+    return mu3 - 3.0 * mu1 * mu2 + 2.0 * mu1 * mu1 * mu1;
+}
+
+template <typename X>
+inline void mean(const X& x, double* out, long long window, long long begin, long long end) {
+    slide_moments<1>(x, window, begin, end, [&](long long i, const ShiftedMoments<1>& m) {
+        out[i] = window_mean(m, window);
+    });
+}
+
+template <typename X>
+inline void variance(const X& x, double* out, long long window, int ddof, long long begin, long long end) {
+    double scale = static_cast<double>(window) / static_cast<double>(window - ddof);
+    slide_moments<2>(x, window, begin, end, [&](long long i, const ShiftedMoments<2>& m) {
+        double mu1 = m.raw(1) / window;
+        double mu2 = m.raw(2) / window;
+        out[i] = central_m2(mu1, mu2) * scale;
+    });
+}
+
+template <typename X>
+inline void stddev(const X& x, double* out, long long window, int ddof, long long begin, long long end) {
+    variance(x, out, window, ddof, begin, end);
+    for (long long i = begin; i < end; ++i) out[i] = std::sqrt(out[i]);
+}
+
+template <typename X>
+inline void zscore(const X& x, double* out, long long window, long long begin, long long end) {
+    slide_moments<2>(x, window, begin, end, [&](long long i, const ShiftedMoments<2>& m) {
+        double mu1 = m.raw(1) / window;
+        double mu2 = m.raw(2) / window;
+        double sd = std::sqrt(central_m2(mu1, mu2));
+        out[i] = sd > 0.0 ? (x[i] - m.shift - mu1) / sd : NaN;
+    });
+}
+
+template <typename X>
+inline void skew(const X& x, double* out, long long window, long long begin, long long end) {
+    slide_moments<3>(x, window, begin, end, [&](long long i, const ShiftedMoments<3>& m) {
+        double mu1 = m.raw(1) / window;
+        double mu2 = m.raw(2) / window;
+        double mu3 = m.raw(3) / window;
+        double m2 = central_m2(mu1, mu2);
+        out[i] = m2 > 0.0 ? central_m3(mu1, mu2, mu3) / (m2 * std::sqrt(m2)) : NaN;
+    });
+}
+
+// Monotonic-deque extremum. `better(older, newer)` is true when the older
+// value still dominates the newer one, i.e. std::less for a rolling min and
+// std::greater for a rolling max.
+template <typename X, typename Better>
+inline void extremum(const X& x, double* out, long long window, long long begin, long long end, Better better) {
+    // Indices are stored in a ring buffer of size window; every index is
+    // pushed and popped at most once, so the chunk costs O(end - begin + window).
+    std::vector<long long> ring(static_cast<size_t>(window));
+    long long head = 0, count = 0;
+
+    for (long long j = begin - window + 1; j < end; ++j) {
+        if (count > 0 && ring[head] <= j - window) {
+            head = (head + 1) % window;
+            --count;
+        }
+        while (count > 0 && !better(x[ring[(head + count - 1) % window]], x[j])) {
+            --count;
+        }
+        ring[(head + count) % window] = j;
+        ++count;
+
+        if (j >= begin) out[j] = x[ring[head]];
+    }
+}
+
+}  // namespace rolling
@@ -0,0 +1,173 @@
+#pragma once
+
+#include <cmath>
+#include <vector>
+#include <algorithm>
+#include <omp.h>
+
+#include "fracdiff.hpp"
+
+// Minimum-d search for fractional differentiation (Lopez de Prado ch. 5.6):
+// for each series and each d of a grid, run FFD and an augmented Dickey-Fuller
+// test on the result; the chosen d is the smallest one whose ADF statistic is
+// below the 5% critical value. Every (series, d) pair is an independent task
+// and all tasks share the process-wide kernel cache.
+
+namespace stationarity {
+
+struct AdfResult {
+    double stat;      // t-statistic of the lagged level, NaN if too short
+    double critical;  // MacKinnon 5% critical value for nobs
+    long long nobs;
+};
+
+// MacKinnon (2010) response surface, constant only, one variable, 5% level.
+inline double critical_value_5pct(long long nobs) {
+    double t = static_cast<double>(nobs);
+    return -2.86154 - 2.8903 / t - 4.234 / (t * t) - 40.040 / (t * t * t);
+}
+
+// Solves the small symmetric positive-definite system a * x = b in place
+// (Cholesky on the lower triangle of row-major k x k `a`) and sets inv_00 to
+// (a^-1)[0][0]. Returns false if a is singular.
+inline bool cholesky_solve(std::vector<double>& a, std::vector<double>& b, double& inv_00, int k) {
+    for (int j = 0; j < k; ++j) {
+        double diag = a[j * k + j];
+        for (int p = 0; p < j; ++p) diag -= a[j * k + p] * a[j * k + p];
+        if (!(diag > 0.0)) return false;
+        double l = std::sqrt(diag);
+        a[j * k + j] = l;
+        for (int i = j + 1; i < k; ++i) {
+            double v = a[i * k + j];
+            for (int p = 0; p < j; ++p) v -= a[i * k + p] * a[j * k + p];
+            a[i * k + j] = v / l;
+        }
+    }
+
+    // Forward/back substitution for the coefficients.
+    for (int i = 0; i < k; ++i) {
+        for (int p = 0; p < i; ++p) b[i] -= a[i * k + p] * b[p];
+        b[i] /= a[i * k + i];
+    }
+    for (int i = k - 1; i >= 0; --i) {
+        for (int p = i + 1; p < k; ++p) b[i] -= a[p * k + i] * b[p];
+        b[i] /= a[i * k + i];
+    }
+
+    // (a^-1)[0][0] = ||L^-1 e_0||^2.
+    std::vector<double> e(static_cast<size_t>(k), 0.0);
+    e[0] = 1.0;
+    double sum = 0.0;
+    for (int i = 0; i < k; ++i) {
+        for (int p = 0; p < i; ++p) e[i] -= a[i * k + p] * e[p];
+        e[i] /= a[i * k + i];
+        sum += e[i] * e[i];
+    }
+    inv_00 = sum;
+    return true;
+}
+
+// ADF with a constant and a fixed number of lagged differences:
+//   dy[t] = c + gamma * y[t-1] + sum_i beta_i * dy[t-i] + e[t]
+// The constant is removed by centering the regressors (Frisch-Waugh), and
+// the residuals are recomputed in a second pass so the RSS does not suffer
+// from cancellation.
+inline AdfResult adf(const double* y, long long size, int lags) {
+    const double nan = std::nan("");
+    int k = lags + 1;
+    long long nobs = size - 1 - lags;
+    if (nobs < static_cast<long long>(k) + 2) return AdfResult{nan, nan, std::max(0LL, nobs)};
+
+    long long first = lags + 1;  // first t with all regressors available
+    auto regressor = [&](long long t, int r) {
+        return r == 0 ? y[t - 1] : y[t - r] - y[t - r - 1];
+    };
+    auto target = [&](long long t) { return y[t] - y[t - 1]; };
+
+    std::vector<double> mean(static_cast<size_t>(k), 0.0);
+    double mean_dy = 0.0;
+    for (long long t = first; t < size; ++t) {
+        mean_dy += target(t);
+        for (int r = 0; r < k; ++r) mean[r] += regressor(t, r);
+    }
+    mean_dy /= static_cast<double>(nobs);
+    for (int r = 0; r < k; ++r) mean[r] /= static_cast<double>(nobs);
+
+    std::vector<double> xtx(static_cast<size_t>(k * k), 0.0), xty(static_cast<size_t>(k), 0.0);
+    std::vector<double> row(static_cast<size_t>(k));
+    for (long long t = first; t < size; ++t) {
+        double dy = target(t) - mean_dy;
+        for (int r = 0; r < k; ++r) row[r] = regressor(t, r) - mean[r];
+        for (int i = 0; i < k; ++i) {
+            xty[i] += row[i] * dy;
+            for (int j = 0; j <= i; ++j) xtx[i * k + j] += row[i] * row[j];
+        }
+    }
+
+    std::vector<double> beta = xty;
+    double inv_00 = 0.0;
+    if (!cholesky_solve(xtx, beta, inv_00, k)) return AdfResult{nan, critical_value_5pct(nobs), nobs};
+
+    double rss = 0.0;
+    for (long long t = first; t < size; ++t) {
+        double resid = target(t) - mean_dy;
+        for (int r = 0; r < k; ++r) resid -= beta[r] * (regressor(t, r) - mean[r]);
+        rss += resid * resid;
+    }
+
+    double sigma2 = rss / static_cast<double>(nobs - k - 1);
+    double se = std::sqrt(sigma2 * inv_00);
+    return AdfResult{beta[0] / se, critical_value_5pct(nobs), nobs};
+}
+
+// FFD of one series on the calling thread (the caller parallelises across
+// tasks), followed by the ADF test on the non-NaN tail.
+inline AdfResult ffd_adf(const double* x, long long size, const fracdiff::Kernel& kernel, int lags,
+                         std::vector<double>& scratch, std::vector<fracdiff::cplx>& buffer) {
+    long long width = kernel.width();
+    if (size < width) return AdfResult{std::nan(""), std::nan(""), 0};
+
+    scratch.resize(static_cast<size_t>(size));
+    double* out = scratch.data();
+    if (fracdiff::prefer_fft(kernel, size)) {
+        buffer.resize(kernel.fft_size());
+        long long n_pairs = fracdiff::overlap_save_layout(kernel, size).n_pairs;
+        fracdiff::overlap_save_pairs(x, out, size, kernel, 0, n_pairs, buffer.data());
+    } else {
+        fracdiff::direct(x, out, kernel.weights, width - 1, size);
+    }
+    return adf(out + width - 1, size - width + 1, lags);
+}
+
+struct Series {
+    const double* input;
+    long long size;
+};
+
+// results is row-major (n_series, n_d).
+inline void grid(const std::vector<Series>& series, const std::vector<const fracdiff::Kernel*>& kernels, int lags,
+                 AdfResult* results) {
+    long long n_series = static_cast<long long>(series.size());
+    long long n_d = static_cast<long long>(kernels.size());
+    long long n_tasks = n_series * n_d;
+    long long rows = 0;
+    for (const Series& item : series) rows += item.size;
+    long long width = 0;
+    for (const fracdiff::Kernel* kernel : kernels) width += std::min<long long>(kernel->width(), 64);
+    int team = threads::team_size(rows * width);
+
+    #pragma omp parallel num_threads(team) if(team > 1)
+    {
+        std::vector<double> scratch;
+        std::vector<fracdiff::cplx> buffer;
+
+        #pragma omp for schedule(dynamic, 1)
+        for (long long task = 0; task < n_tasks; ++task) {
+            long long s = task / n_d;
+            long long j = task % n_d;
+            results[task] = ffd_adf(series[s].input, series[s].size, *kernels[j], lags, scratch, buffer);
+        }
+    }
+}
+
+}  // namespace stationarity
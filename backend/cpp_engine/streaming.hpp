@@ -0,0 +1,305 @@
+#pragma once
+
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <memory>
+#include <stdexcept>
+#include <string>
+#include <vector>
+
+#include "rolling.hpp"
+#include "fracdiff.hpp"
+
+// Stateful indicators that advance one value at a time, so an hourly run only
+// pays for the bars that arrived since the last run. Each state reproduces its
+// batch counterpart (fractional_diff, calculate_volatility, calculate_rsi) on
+// the concatenated history, and round-trips through a compact byte string.
+
+namespace streaming {
+
+constexpr double NaN = std::numeric_limits<double>::quiet_NaN();
+
+// Little helpers for the byte format: a 4-byte tag, a version, then raw
+// fields in declaration order.
+class Writer {
+public:
+    explicit Writer(const char* tag) { buffer_.append(tag, 4); put<uint32_t>(1); }
+
+    template <typename T>
+    void put(T value) { buffer_.append(reinterpret_cast<const char*>(&value), sizeof(T)); }
+
+    void put_vector(const std::vector<double>& values) {
+        put<uint64_t>(values.size());
+        buffer_.append(reinterpret_cast<const char*>(values.data()), values.size() * sizeof(double));
+    }
+
+    const std::string& str() const { return buffer_; }
+
+private:
+    std::string buffer_;
+};
+
+class Reader {
+public:
+    Reader(const std::string& data, const char* tag) : data_(data) {
+        if (data_.size() < 8 || data_.compare(0, 4, tag) != 0) {
+            throw std::invalid_argument(std::string("not a serialized ") + tag + " state");
+        }
+        pos_ = 4;
+        if (get<uint32_t>() != 1) throw std::invalid_argument("unsupported state version");
+    }
+
+    template <typename T>
+    T get() {
+        if (pos_ + sizeof(T) > data_.size()) throw std::invalid_argument("truncated state");
+        T value;
+        std::memcpy(&value, data_.data() + pos_, sizeof(T));
+        pos_ += sizeof(T);
+        return value;
+    }
+
+    std::vector<double> get_vector() {
+        uint64_t n = get<uint64_t>();
+        if (n > (data_.size() - pos_) / sizeof(double)) throw std::invalid_argument("truncated state");
+        std::vector<double> values(n);
+        std::memcpy(values.data(), data_.data() + pos_, n * sizeof(double));
+        pos_ += n * sizeof(double);
+        return values;
+    }
+
+private:
+    const std::string& data_;
+    size_t pos_;
+};
+
+// FFD over a ring buffer of the last `width` prices.
+class FracDiffState {
+public:
+    FracDiffState(double d, double thres)
+        : d_(d), thres_(thres), kernel_(fracdiff::kernel_cache().get(d, thres)),
+          ring_(kernel_->weights.size(), 0.0) {}
+
+    double update(double price) {
+        long long width = kernel_->width();
+        ring_[head_] = price;
+        head_ = (head_ + 1) % width;
+        ++count_;
+        if (count_ < width) return NaN;
+
+        // head_ now points at the oldest price; weights are oldest first.
+        const double* w = kernel_->weights.data();
+        double dot_product = 0.0;
+        long long tail = width - head_;
+        for (long long j = 0; j < tail; ++j) dot_product += w[j] * ring_[head_ + j];
+        for (long long j = 0; j < head_; ++j) dot_product += w[tail + j] * ring_[j];
+        return dot_product;
+    }
+
+    double d() const { return d_; }
+    double thres() const { return thres_; }
+    long long width() const { return kernel_->width(); }
+    long long count() const { return count_; }
+
+    std::string to_bytes() const {
+        Writer out("QEFD");
+        out.put<double>(d_);
+        out.put<double>(thres_);
+        out.put<int64_t>(count_);
+        out.put<int64_t>(head_);
+        out.put_vector(ring_);
+        return out.str();
+    }
+
+    static FracDiffState from_bytes(const std::string& data) {
+        Reader in(data, "QEFD");
+        double d = in.get<double>();
+        double thres = in.get<double>();
+        if (!std::isfinite(d) || !std::isfinite(thres) || thres <= 0.0) {
+            throw std::invalid_argument("corrupt FFD state: bad d or thres");
+        }
+        FracDiffState state(d, thres);
+        state.count_ = in.get<int64_t>();
+        state.head_ = in.get<int64_t>();
+        std::vector<double> ring = in.get_vector();
+        if (ring.size() != state.ring_.size()) throw std::invalid_argument("FFD width mismatch");
+        // count_ is the number of prices seen; the ring is written in order.
+        if (state.count_ < 0 || state.head_ != state.count_ % state.width()) {
+            throw std::invalid_argument("corrupt FFD state: position out of range");
+        }
+        state.ring_ = ring;
+        return state;
+    }
+
+private:
+    double d_;
+    double thres_;
+    std::shared_ptr<const fracdiff::Kernel> kernel_;
+    std::vector<double> ring_;
+    long long head_ = 0;
+    long long count_ = 0;
+};
+
+// Population rolling standard deviation with calculate_volatility's 0.0
+// padding. Uses the same shifted, compensated sums as the batch kernel and
+// re-anchors on the ring buffer every `window` updates.
+class RollingVolState {
+public:
+    explicit RollingVolState(long long window) : window_(window), ring_(window, 0.0) {
+        if (window < 1) throw std::invalid_argument("window must be >= 1");
+    }
+
+    double update(double value) {
+        if (count_ < window_) {
+            if (count_ == 0) moments_.reset(value);
+            moments_.add(value);
+            ring_[count_] = value;
+            ++count_;
+            if (count_ < window_) return 0.0;
+            since_reseed_ = 0;
+            return current();
+        }
+
+        double oldest = ring_[head_];
+        ring_[head_] = value;
+        head_ = (head_ + 1) % window_;
+        ++count_;
+
+        if (++since_reseed_ >= window_) {
+            reseed();
+        } else {
+            moments_.remove(oldest);
+            moments_.add(value);
+        }
+        return current();
+    }
+
+    long long window() const { return window_; }
+    long long count() const { return count_; }
+
+    std::string to_bytes() const {
+        Writer out("QERV");
+        out.put<int64_t>(window_);
+        out.put<int64_t>(count_);
+        out.put<int64_t>(head_);
+        out.put_vector(ring_);
+        return out.str();
+    }
+
+    static RollingVolState from_bytes(const std::string& data) {
+        Reader in(data, "QERV");
+        long long window = in.get<int64_t>();
+        long long count = in.get<int64_t>();
+        long long head = in.get<int64_t>();
+        std::vector<double> ring = in.get_vector();
+        if (static_cast<long long>(ring.size()) != window) throw std::invalid_argument("window mismatch");
+        // count_ is the number of values seen: the ring fills from 0, then
+        // head_ advances once per value.
+        bool filling = count >= 0 && count < window && head == 0;
+        bool full = count >= window && window > 0 && head == (count - window) % window;
+        if (!filling && !full) throw std::invalid_argument("corrupt rolling volatility state: position out of range");
+        RollingVolState state(window);
+        state.count_ = count;
+        state.head_ = head;
+        state.ring_ = ring;
+        // Sums are rebuilt from the buffer instead of being serialized.
+        if (state.count_ >= state.window_) {
+            state.reseed();
+        } else {
+            for (long long j = 0; j < state.count_; ++j) {
+                if (j == 0) state.moments_.reset(state.ring_[0]);
+                state.moments_.add(state.ring_[j]);
+            }
+        }
+        return state;
+    }
+
+private:
+    void reseed() {
+        moments_.reset(ring_[head_]);
+        for (long long j = 0; j < window_; ++j) moments_.add(ring_[(head_ + j) % window_]);
+        since_reseed_ = 0;
+    }
+
+    double current() const {
+        double mu1 = moments_.raw(1) / window_;
+        double mu2 = moments_.raw(2) / window_;
+        return std::sqrt(rolling::central_m2(mu1, mu2));
+    }
+
+    long long window_;
+    std::vector<double> ring_;
+    rolling::ShiftedMoments<2> moments_;
+    long long head_ = 0;
+    long long count_ = 0;
+    long long since_reseed_ = 0;
+};
+
+// Wilder-style RSI on EWMA(span = period, adjust = False) of gains and losses,
+// the same recursion feature_engineering.calculate_rsi expresses in Polars.
+class EwmRsiState {
+public:
+    explicit EwmRsiState(long long period) : period_(period), alpha_(2.0 / (period + 1.0)) {
+        if (period < 1) throw std::invalid_argument("period must be >= 1");
+    }
+
+    double update(double price) {
+        if (!has_price_) {
+            has_price_ = true;
+            last_price_ = price;
+            return NaN;
+        }
+
+        double delta = price - last_price_;
+        last_price_ = price;
+        double up = delta > 0.0 ? delta : 0.0;
+        double down = delta < 0.0 ? -delta : 0.0;
+
+        if (!has_average_) {
+            roll_up_ = up;
+            roll_down_ = down;
+            has_average_ = true;
+        } else {
+            roll_up_ = (1.0 - alpha_) * roll_up_ + alpha_ * up;
+            roll_down_ = (1.0 - alpha_) * roll_down_ + alpha_ * down;
+        }
+
+        double rs = roll_up_ / roll_down_;
+        return 100.0 - (100.0 / (1.0 + rs));
+    }
+
+    long long period() const { return period_; }
+
+    std::string to_bytes() const {
+        Writer out("QERS");
+        out.put<int64_t>(period_);
+        out.put<uint8_t>(has_price_);
+        out.put<uint8_t>(has_average_);
+        out.put<double>(last_price_);
+        out.put<double>(roll_up_);
+        out.put<double>(roll_down_);
+        return out.str();
+    }
+
+    static EwmRsiState from_bytes(const std::string& data) {
+        Reader in(data, "QERS");
+        EwmRsiState state(in.get<int64_t>());
+        state.has_price_ = in.get<uint8_t>() != 0;
+        state.has_average_ = in.get<uint8_t>() != 0;
+        state.last_price_ = in.get<double>();
+        state.roll_up_ = in.get<double>();
+        state.roll_down_ = in.get<double>();
+        return state;
+    }
+
+private:
+    long long period_;
+    double alpha_;
+    bool has_price_ = false;
+    bool has_average_ = false;
+    double last_price_ = 0.0;
+    double roll_up_ = 0.0;
+    double roll_down_ = 0.0;
+};
+
+}  // namespace streaming
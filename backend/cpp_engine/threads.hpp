@@ -0,0 +1,57 @@
+#pragma once
+
+#include <algorithm>
+#include <atomic>
+#include <omp.h>
+
+// Thread budget and size-based dispatch shared by every parallel region.
+//
+// Each region estimates its work (roughly, inner-loop iterations) and asks
+// team_size() how many threads to fork: below the parallel threshold it runs
+// on the calling thread, above it one thread per `threshold` of work up to the
+// budget. The budget is process-wide (set_num_threads / QUANT_ENGINE_THREADS),
+// and can be capped further on the calling thread for a block of calls
+// (thread_limit), so an API server or a process pool can split the cores
+// between its workers instead of every process forking a team per core.
+
+namespace threads {
+
+constexpr long long DEFAULT_PARALLEL_THRESHOLD = 1LL << 15;
+
+inline std::atomic<long long>& parallel_threshold() {
+    static std::atomic<long long> threshold{DEFAULT_PARALLEL_THRESHOLD};
+    return threshold;
+}
+
+// 0 means the OpenMP default (OMP_NUM_THREADS or the number of cores).
+inline std::atomic<int>& process_budget() {
+    static std::atomic<int> budget{0};
+    return budget;
+}
+
+inline int& call_limit() {
+    thread_local int limit = 0;
+    return limit;
+}
+
+inline int default_threads() {
+    static const int n = std::max(1, omp_get_max_threads());
+    return n;
+}
+
+// The process budget, capped by the calling thread's limit if one is set.
+inline int budget() {
+    int process = process_budget().load(std::memory_order_relaxed);
+    int total = process > 0 ? process : default_threads();
+    int limit = call_limit();
+    return limit > 0 ? std::min(limit, total) : total;
+}
+
+inline int team_size(long long work) {
+    long long threshold = std::max(1LL, parallel_threshold().load(std::memory_order_relaxed));
+    if (work < 2 * threshold) return 1;
+    long long by_work = work / threshold;
+    return static_cast<int>(std::max(1LL, std::min<long long>(budget(), by_work)));
+}
+
+}  // namespace threads
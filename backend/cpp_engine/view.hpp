@@ -0,0 +1,23 @@
+#pragma once
+
+#include <cstddef>
+
+// Read-only element access over caller-owned memory. Kernels are templated on
+// the input type and only ever index it, so a contiguous float64 series is read
+// through a plain `const double*` while float32 columns and strided views
+// (x[::2], a column of a row-major matrix, a reversed slice) are read in place
+// through `Strided<T>` instead of being copied into a fresh float64 array.
+
+namespace view {
+
+template <typename T>
+struct Strided {
+    const char* data;
+    std::ptrdiff_t stride;  // in bytes, may be negative
+
+    inline double operator[](long long i) const {
+        return static_cast<double>(*reinterpret_cast<const T*>(data + i * stride));
+    }
+};
+
+}  // namespace view
@@ -25,7 +25,7 @@ cd /app/backend
 alembic upgrade head
 
 
-if [ ! -f "/app/data/models/AAPL_primary.json" ]; then
+if [ ! -f "/app/data/models/AAPL_primary.json" ] && [ ! -f "/app/data/models/pooled_model.json" ]; then
     echo "COLD START DETECTED: No models found."
     echo "Triggering Initial Pipeline Run (Ingest -> Train)..."
     
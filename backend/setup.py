@@ -1,6 +1,7 @@
 from setuptools import setup, Extension
 import pybind11
 import sys
+import glob
 
 cpp_args = ['-std=c++23', '-O3', '-march=native', '-fopenmp']
 link_args = ['-fopenmp']
@@ -13,6 +14,7 @@ ext_modules = [
     Extension(
         'quant_engine',
         ['cpp_engine/engine.cpp'],
+        depends=glob.glob('cpp_engine/*.hpp'),
         include_dirs=[pybind11.get_include()],
         language='c++',
         extra_compile_args=cpp_args,
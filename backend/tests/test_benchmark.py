@@ -0,0 +1,27 @@
+import copy
+import benchmark_engine
+
+def test_suite_covers_engine_and_matches_references():
+    results = benchmark_engine.run_suite([3_000], repeat=1, threads=1)
+
+    names = {entry["name"] for entry in results}
+    assert {"calculate_volatility", "fractional_diff", "compute_features", "build_bars", "min_ffd_d"} <= names
+    assert all(entry["ok"] for entry in results), [e for e in results if not e["ok"]]
+
+def test_find_regressions_flags_slowdowns_and_errors():
+    entry = {
+        "name": "rolling_std", "size": 1_000_000, "params": {"window": 100}, "threads": 1,
+        "engine_ms": 10.0, "reference_ms": 50.0, "speedup": 5.0,
+        "error": 1e-14, "tolerance": 1e-8, "ok": True,
+    }
+    baseline = {"results": [entry]}
+
+    assert benchmark_engine.find_regressions([entry], baseline) == []
+
+    slower = copy.deepcopy(entry)
+    slower["engine_ms"] = 20.0
+    assert len(benchmark_engine.find_regressions([slower], baseline)) == 1
+
+    wrong = copy.deepcopy(entry)
+    wrong.update(error=1e-3, ok=False)
+    assert len(benchmark_engine.find_regressions([wrong], baseline)) == 2
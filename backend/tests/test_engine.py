@@ -0,0 +1,294 @@
+import numpy as np
+import pickle
+import struct
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+import quant_engine
+
+rng = np.random.default_rng(42)
+prices = np.cumsum(rng.normal(size=5_000)) + 1_000.0
+
+@pytest.mark.parametrize("window", [2, 10, 100, 1000])
+def test_rolling_moments_match_numpy(window):
+    """
+    Streaming kernels must match a direct re-reduction of every window.
+    """
+    views = sliding_window_view(prices, window)
+    mean = views.mean(axis=1)
+    std = views.std(axis=1)
+
+    np.testing.assert_allclose(quant_engine.rolling_mean(prices, window)[window - 1:], mean, rtol=1e-10)
+    np.testing.assert_allclose(quant_engine.rolling_std(prices, window)[window - 1:], std, rtol=1e-8)
+    np.testing.assert_allclose(quant_engine.rolling_var(prices, window, ddof=1)[window - 1:], views.var(axis=1, ddof=1), rtol=1e-8)
+    np.testing.assert_allclose(quant_engine.rolling_zscore(prices, window)[window - 1:], (prices[window - 1:] - mean) / std, rtol=1e-6, atol=1e-9)
+    np.testing.assert_array_equal(quant_engine.rolling_min(prices, window)[window - 1:], views.min(axis=1))
+    np.testing.assert_array_equal(quant_engine.rolling_max(prices, window)[window - 1:], views.max(axis=1))
+
+    if window < 3:
+        return
+    skew = ((views - mean[:, None]) ** 3).mean(axis=1) / std ** 3
+    np.testing.assert_allclose(quant_engine.rolling_skew(prices, window)[window - 1:], skew, rtol=1e-6, atol=1e-9)
+
+def test_rolling_padding_contract():
+    """
+    Rolling family pads with NaN; calculate_volatility keeps its zero padding
+    and returns an empty array when the history is shorter than the window.
+    """
+    window = 20
+    assert np.isnan(quant_engine.rolling_std(prices, window)[:window - 1]).all()
+    assert (quant_engine.calculate_volatility(prices, window)[:window - 1] == 0.0).all()
+
+    short = prices[:5]
+    assert len(quant_engine.calculate_volatility(short, window)) == 0
+    assert np.isnan(quant_engine.rolling_mean(short, window)).all()
+
+    with pytest.raises(ValueError):
+        quant_engine.rolling_std(prices, 0)
+
+@pytest.mark.parametrize("d, thres", [(0.4, 1e-3), (0.3, 1e-5), (0.05, 1e-6)])
+def test_fractional_diff_fft_matches_direct(d, thres):
+    """
+    Overlap-save path must agree with the dense dot product and keep the NaN padding.
+    """
+    series = np.tile(prices, 8)
+    width = len(quant_engine.get_weights_ffd(d, thres))
+
+    direct = quant_engine.fractional_diff(series, d, thres, method="direct")
+    fft = quant_engine.fractional_diff(series, d, thres, method="fft")
+    auto = quant_engine.fractional_diff(series, d, thres)
+
+    assert np.isnan(fft[:width - 1]).all()
+    assert not np.isnan(fft[width - 1:]).any()
+    np.testing.assert_allclose(fft[width - 1:], direct[width - 1:], rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(auto[width - 1:], direct[width - 1:], rtol=1e-9, atol=1e-9)
+
+def test_weights_cache_reuses_vectors():
+    quant_engine.clear_weights_cache()
+    quant_engine.fractional_diff(prices, 0.4, 1e-3)
+    quant_engine.fractional_diff(prices[::-1], 0.4, 1e-3)
+    assert quant_engine.weights_cache_size() == 1
+
+    weights = quant_engine.get_weights_ffd(0.4, 1e-3)
+    assert weights[-1] == 1.0
+    assert quant_engine.weights_cache_size() == 1
+
+def test_weights_cache_evicts_least_recently_used():
+    quant_engine.clear_weights_cache()
+    default = quant_engine.weights_cache_capacity()
+    quant_engine.set_weights_cache_capacity(2)
+    try:
+        quant_engine.get_weights_ffd(0.3, 1e-3)
+        quant_engine.get_weights_ffd(0.4, 1e-3)
+        quant_engine.get_weights_ffd(0.3, 1e-3)
+        quant_engine.get_weights_ffd(0.5, 1e-3)  # evicts 0.4
+        assert quant_engine.weights_cache_size() == 2
+        quant_engine.get_weights_ffd(0.3, 1e-3)
+        assert quant_engine.weights_cache_size() == 2
+
+        quant_engine.set_weights_cache_capacity(1)
+        assert quant_engine.weights_cache_size() == 1
+        # A kernel evicted while a stream holds it keeps working.
+        state = quant_engine.FracDiffState(0.4, 1e-3)
+        quant_engine.get_weights_ffd(0.6, 1e-3)
+        np.testing.assert_allclose(
+            state.update(prices[:300])[-1], quant_engine.fractional_diff(prices[:300], 0.4, 1e-3)[-1],
+        )
+    finally:
+        quant_engine.set_weights_cache_capacity(default)
+
+def test_batch_api_matches_single_series():
+    """
+    Ragged-list and offsets layouts must reproduce the per-series kernels.
+    """
+    lengths = [0, 3, 40, 700, 5_000]
+    series = [prices[:n].copy() for n in lengths]
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    values = np.concatenate(series)
+
+    ffd = quant_engine.batch_fractional_diff(series, 0.4, 1e-3)
+    flat = quant_engine.batch_fractional_diff_offsets(values, offsets, 0.4, 1e-3)
+    for s, got, part in zip(series, ffd, np.split(flat, offsets[1:-1])):
+        expected = quant_engine.fractional_diff(s, 0.4, 1e-3)
+        np.testing.assert_array_equal(got, expected)
+        np.testing.assert_array_equal(part, expected)
+
+    vol = quant_engine.batch_volatility(series, 20)
+    flat = quant_engine.batch_volatility_offsets(values, offsets, 20)
+    for s, got, part in zip(series, vol, np.split(flat, offsets[1:-1])):
+        # Both layouts return NaN of the input length for series shorter than the window.
+        expected = quant_engine.calculate_volatility(s, 20) if len(s) >= 20 else np.full(len(s), np.nan)
+        np.testing.assert_allclose(got, expected, rtol=1e-10)
+        np.testing.assert_allclose(part, expected, rtol=1e-10)
+
+    with pytest.raises(ValueError):
+        quant_engine.batch_volatility_offsets(values, offsets[:-1], 20)
+
+def test_build_bars_kinds():
+    n = 1_000
+    timestamp = np.arange(n, dtype=np.int64)
+    volume = np.full(n, 10.0)
+
+    tick = quant_engine.build_bars(timestamp, prices[:n], prices[:n], prices[:n], prices[:n], volume, 7, kind="tick")
+    assert len(tick["close"]) == n // 7
+    assert (tick["ticks"] == 7).all()
+    np.testing.assert_array_equal(tick["timestamp"], np.arange(0, 7 * (n // 7), 7))
+    assert tick["state"]["ticks"] == n % 7
+
+    vol = quant_engine.build_bars(timestamp, prices[:n], prices[:n], prices[:n], prices[:n], volume, 25.0, kind="volume")
+    assert (vol["volume"] == 30.0).all()
+
+    imbalance = quant_engine.build_bars(timestamp, prices[:n], prices[:n], prices[:n], prices[:n], volume, 20.0, kind="tick_imbalance")
+    assert len(imbalance["close"]) > 0
+    assert imbalance["ticks"].sum() + imbalance["state"]["ticks"] == n
+
+    with pytest.raises(ValueError):
+        quant_engine.build_bars(timestamp, prices[:n], prices[:n], prices[:n], prices[:n], volume[:10], 7.0)
+
+def test_streaming_states_match_batch_kernels():
+    """
+    Advancing a state in pieces, with a serialize/restore in between, must
+    reproduce the batch kernels on the full history.
+    """
+    head, tail = prices[:700], prices[700:]
+
+    ffd = quant_engine.FracDiffState(0.4, 1e-3)
+    first = ffd.update(head)
+    restored = quant_engine.FracDiffState.from_bytes(ffd.to_bytes())
+    streamed = np.concatenate([first, restored.update(tail)])
+    np.testing.assert_allclose(streamed, quant_engine.fractional_diff(prices, 0.4, 1e-3), rtol=1e-10, equal_nan=True)
+    assert restored.count == len(prices)
+
+    vol = quant_engine.RollingVolState(50)
+    first = vol.update(head)
+    restored = pickle.loads(pickle.dumps(vol))
+    streamed = np.concatenate([first, restored.update(tail)])
+    np.testing.assert_allclose(streamed, quant_engine.calculate_volatility(prices, 50), rtol=1e-10)
+
+    rsi = quant_engine.EwmRsiState(14)
+    first = rsi.update(head)
+    restored = quant_engine.EwmRsiState.from_bytes(rsi.to_bytes())
+    streamed = np.concatenate([first, restored.update(tail)])
+    assert np.isnan(streamed[0])
+    assert np.all((streamed[1:] >= 0.0) & (streamed[1:] <= 100.0))
+
+    with pytest.raises(ValueError):
+        quant_engine.RollingVolState.from_bytes(ffd.to_bytes())
+
+def test_corrupt_state_bytes_are_rejected():
+    def patched(data, offset, value):
+        return data[:offset] + struct.pack("<q", value) + data[offset + 8:]
+
+    ffd = quant_engine.FracDiffState(0.4, 1e-3)
+    ffd.update(prices[:30])
+    data = ffd.to_bytes()
+    # Layout: tag, version, d, thres, count, head, ring length, ring.
+    for offset, value in [(24, -1), (32, ffd.width), (32, -3), (40, 1 << 61), (40, -1)]:
+        with pytest.raises(ValueError):
+            quant_engine.FracDiffState.from_bytes(patched(data, offset, value))
+    with pytest.raises(ValueError):
+        quant_engine.FracDiffState.from_bytes(data[:-8])
+
+    vol = quant_engine.RollingVolState(50)
+    vol.update(prices[:120])
+    data = vol.to_bytes()
+    # Layout: tag, version, window, count, head, ring length, ring.
+    for offset, value in [(16, -5), (24, 50), (24, 7), (8, 1 << 40), (32, 1 << 61)]:
+        with pytest.raises(ValueError):
+            quant_engine.RollingVolState.from_bytes(patched(data, offset, value))
+    assert quant_engine.RollingVolState.from_bytes(data).count == 120
+
+def test_flexible_inputs_are_read_in_place():
+    """
+    float32 columns, strided views and null-free Arrow arrays give the same
+    result as a contiguous float64 copy; `out` is filled and returned as is.
+    """
+    import pyarrow as pa
+
+    window = 20
+    cases = {
+        "strided": prices[::3],
+        "reversed": prices[::-1],
+        "column": np.stack([prices, -prices], axis=1)[:, 0],
+        "float32": prices.astype(np.float32),
+    }
+    for name, values in cases.items():
+        expected = quant_engine.rolling_std(np.ascontiguousarray(values, dtype=np.float64), window)
+        np.testing.assert_allclose(quant_engine.rolling_std(values, window), expected, rtol=1e-12, equal_nan=True, err_msg=name)
+
+    arrow = pa.array(prices).slice(100)
+    np.testing.assert_allclose(quant_engine.fractional_diff(arrow, 0.4, 1e-3),
+                               quant_engine.fractional_diff(prices[100:], 0.4, 1e-3), rtol=1e-12, equal_nan=True)
+
+    out = np.empty(len(prices))
+    assert quant_engine.calculate_volatility(prices, window, out=out) is out
+    np.testing.assert_array_equal(out, quant_engine.calculate_volatility(prices, window))
+    short = np.zeros(window - 1)
+    assert quant_engine.calculate_volatility(prices[:window - 1], window, out=short) is short
+    assert np.isnan(short).all()
+
+    with pytest.raises(ValueError):
+        quant_engine.rolling_mean(np.ones((3, 3)), 2)
+    with pytest.raises(ValueError):
+        quant_engine.rolling_mean(prices, window, out=np.empty(len(prices), dtype=np.float32))
+
+def test_backtest_signals_match_numpy():
+    """
+    Every column of a position matrix is scored like a standalone
+    close-to-close backtest with a cost per unit of position change.
+    """
+    returns = np.diff(prices) / prices[:-1]
+    signals = (rng.random((len(returns), 5)) > 0.5).astype(np.float64)
+    costs = np.array([0.0, 0.001, 0.0, 0.002, 0.0])
+    result = quant_engine.backtest_signals(returns, signals, cost=costs, periods_per_year=252.0)
+
+    for c in range(signals.shape[1]):
+        trades = np.abs(np.diff(signals[:, c], prepend=0.0))
+        pnl = signals[:, c] * returns - costs[c] * trades
+        equity = np.cumprod(1 + pnl)
+        peak = np.maximum.accumulate(np.concatenate([[1.0], equity]))[1:]
+        np.testing.assert_allclose(result["cum_return"][c], equity[-1] - 1, rtol=1e-10)
+        np.testing.assert_allclose(result["sharpe"][c], pnl.mean() / pnl.std(ddof=1) * np.sqrt(252.0), rtol=1e-8)
+        np.testing.assert_allclose(result["max_drawdown"][c], np.max(1 - equity / peak), rtol=1e-10)
+        np.testing.assert_allclose(result["turnover"][c], trades.mean(), rtol=1e-12)
+
+def test_thread_budget_does_not_change_results():
+    """
+    Serial and parallel dispatch must agree; thread_limit nests and restores.
+    """
+    default = quant_engine.get_num_threads()
+    threshold = quant_engine.get_parallel_threshold()
+    serial = quant_engine.rolling_std(prices, 50)
+
+    try:
+        quant_engine.set_parallel_threshold(1)
+        quant_engine.set_num_threads(8)
+        with quant_engine.thread_limit(4):
+            assert quant_engine.get_num_threads() == 4
+            with quant_engine.thread_limit(2):
+                assert quant_engine.get_num_threads() == 2
+            parallel = quant_engine.rolling_std(prices, 50)
+        assert quant_engine.get_num_threads() == 8
+    finally:
+        quant_engine.set_parallel_threshold(threshold)
+        quant_engine.set_num_threads(0)
+
+    np.testing.assert_allclose(parallel, serial, rtol=1e-10, equal_nan=True)
+
+    quant_engine.set_num_threads(3)
+    assert quant_engine.get_num_threads() == 3
+    quant_engine.set_num_threads(0)
+    assert quant_engine.get_num_threads() == default
+
+def test_thread_limit_only_caps_the_budget():
+    try:
+        quant_engine.set_num_threads(1)
+        with quant_engine.thread_limit(8):
+            assert quant_engine.get_num_threads() == 1
+        quant_engine.set_num_threads(4)
+        with quant_engine.thread_limit(2):
+            assert quant_engine.get_num_threads() == 2
+            with quant_engine.thread_limit(3):
+                assert quant_engine.get_num_threads() == 2
+        assert quant_engine.get_num_threads() == 4
+    finally:
+        quant_engine.set_num_threads(0)
@@ -3,6 +3,8 @@ import numpy as np
 import xgboost as xgb
 import os
 import matplotlib.pyplot as plt
+import quant_engine
+from feature_schema import FEATURE_COLS
 
 # Config
 FEATURES_DIR = "./data/processed/features"
@@ -10,6 +12,15 @@ LABELED_DIR = "./data/processed/labeled" # Contains 'close' prices and dates
 MODEL_DIR = "./data/models"
 TICKER = "AAPL" # Test
 
+PERIODS_PER_YEAR = 252 * 7
+RISK_FREE = 0.04 / PERIODS_PER_YEAR
+
+# Default research grid for run_sweep: meta-confidence threshold x holding
+# period (bars) x cost per unit of position change.
+SWEEP_THRESHOLDS = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9]
+SWEEP_HOLDING = [1, 3, 7, 14]
+SWEEP_COSTS = [0.0, 0.0005, 0.001]
+
 def load_models(ticker):
     primary = xgb.XGBClassifier()
     primary.load_model(f"{MODEL_DIR}/{ticker}_primary.json")
@@ -18,9 +29,11 @@ def load_models(ticker):
     meta.load_model(f"{MODEL_DIR}/{ticker}_meta.json")
     return primary, meta
 
-def run_backtest(ticker):
-    print(f"--- Backtesting {ticker} ---")
-    
+def strategy_inputs(ticker):
+    """
+    Prices aligned with model outputs: market_return (close to next close),
+    the primary prediction and the meta model's confidence in a trade.
+    """
     df_features = pl.read_parquet(f"{FEATURES_DIR}/{ticker}_features.parquet")
     df_price = pl.read_parquet(f"{LABELED_DIR}/{ticker}_db.parquet")
     
@@ -28,8 +41,7 @@ def run_backtest(ticker):
     df_features = df_features.slice(0, min_len)
     df_price = df_price.slice(0, min_len)
     
-    feature_cols = ["volatility", "rsi"] + [col for col in df_features.columns if "return_lag_" in col]
-    X = df_features.select(feature_cols).to_numpy()
+    X = df_features.select(FEATURE_COLS).to_numpy()
     
     primary_model, meta_model = load_models(ticker)
 
@@ -39,13 +51,65 @@ def run_backtest(ticker):
     primary_conf = np.max(primary_probs, axis=1).reshape(-1, 1)
     X_meta = np.hstack([X, primary_conf])
     
-    meta_preds = meta_model.predict(X_meta)
+    meta_conf = meta_model.predict_proba(X_meta)[:, 1]
     
-    signal = (primary_preds == 1) & (meta_preds == 1)
-    
-    df_res = df_price.with_columns(
-        (pl.col("close").shift(-1) / pl.col("close") - 1).alias("market_return")
+    return df_price.with_columns(
+        (pl.col("close").shift(-1) / pl.col("close") - 1).alias("market_return"),
+        pl.Series(name="primary_pred", values=primary_preds),
+        pl.Series(name="meta_conf", values=meta_conf),
+    )
+
+def sweep_grid(thresholds=SWEEP_THRESHOLDS, holding=SWEEP_HOLDING, costs=SWEEP_COSTS):
+    """
+    One row per strategy variant (cartesian product of the parameters).
+    """
+    return (
+        pl.DataFrame({"threshold": thresholds}, schema={"threshold": pl.Float64})
+        .join(pl.DataFrame({"holding": holding}, schema={"holding": pl.Int64}), how="cross")
+        .join(pl.DataFrame({"cost": costs}, schema={"cost": pl.Float64}), how="cross")
+    )
+
+def sweep_universe(inputs, grid):
+    """
+    Evaluates every grid row on every ticker in one native call.
+    inputs maps ticker -> frame with market_return, primary_pred and meta_conf;
+    a bar is traded when the primary model says 1 and meta_conf > threshold.
+    """
+    tickers = list(inputs)
+    frames = [inputs[t] for t in tickers]
+    lengths = [df.height for df in frames]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    combined = pl.concat([df.select("market_return", "primary_pred", "meta_conf") for df in frames],
+                         how="vertical_relaxed")
+    returns = combined["market_return"].cast(pl.Float64).fill_null(np.nan).to_numpy()
+    score = np.where(combined["primary_pred"].to_numpy() == 1, combined["meta_conf"].to_numpy(), -np.inf)
+
+    metrics = quant_engine.backtest_thresholds(
+        returns, score,
+        grid["threshold"].to_numpy(), grid["holding"].to_numpy(), grid["cost"].to_numpy(),
+        offsets=offsets, risk_free=RISK_FREE, periods_per_year=PERIODS_PER_YEAR,
     )
+
+    n = len(tickers)
+    result = pl.concat([grid] * n).with_columns(
+        pl.Series("ticker", np.repeat(tickers, grid.height)),
+    )
+    return result.with_columns(
+        pl.Series(name, metrics[name].ravel()) for name in ["cum_return", "sharpe", "max_drawdown", "turnover"]
+    ).select("ticker", pl.exclude("ticker"))
+
+def run_sweep(tickers, thresholds=SWEEP_THRESHOLDS, holding=SWEEP_HOLDING, costs=SWEEP_COSTS):
+    grid = sweep_grid(thresholds, holding, costs)
+    inputs = {ticker: strategy_inputs(ticker) for ticker in tickers}
+    return sweep_universe(inputs, grid)
+
+def run_backtest(ticker):
+    print(f"--- Backtesting {ticker} ---")
+    
+    df_res = strategy_inputs(ticker)
+    
+    signal = (df_res["primary_pred"] == 1) & (df_res["meta_conf"] > 0.5)
     
     df_res = df_res.with_columns(pl.Series(name="signal", values=signal))
     
@@ -61,9 +125,8 @@ def run_backtest(ticker):
     final_market = df_res["cum_market"].tail(1).item()
     final_strategy = df_res["cum_strategy"].tail(1).item()
     
-    risk_free = 0.04 / (252*7)
-    excess_ret = df_res["strategy_return"] - risk_free
-    sharpe = (excess_ret.mean() / excess_ret.std()) * np.sqrt(252 * 7)
+    excess_ret = df_res["strategy_return"] - RISK_FREE
+    sharpe = (excess_ret.mean() / excess_ret.std()) * np.sqrt(PERIODS_PER_YEAR)
     
     print(f"Buy & Hold Return: {(final_market - 1):.2%}")
     print(f"Strategy Return:   {(final_strategy - 1):.2%}")
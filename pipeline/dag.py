@@ -0,0 +1,155 @@
+import json
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import polars as pl
+
+# In-process pipeline runner. The pipeline is a chain of stages and every
+# (stage, ticker) pair is a task that depends on the previous stage's task
+# for the same ticker, so a ticker moves on to the next stage as soon as it
+# is ready instead of waiting for the whole universe. Ready tasks of later
+# stages are scheduled first, which lets tickers flow through to training
+# while others are still being ingested.
+#
+# A task receives the upstream Output: the upstream frame when it was kept
+# in memory (None means "read it from disk") and whether the upstream
+# changed. Tasks that checkpoint their output are appended to a journal, so
+# a crashed run can be resumed from the last completed task. A task's
+# `details` are journaled with it and handed back to its stage's restore
+# callback when the task is resumed instead of run.
+
+class Output:
+    """
+    What a task hands to the next stage for the same ticker, and optional
+    JSON-serializable details to keep in the journal.
+    """
+    __slots__ = ("frame", "changed", "details")
+
+    def __init__(self, frame=None, changed=False, details=None):
+        self.frame = frame
+        self.changed = changed
+        self.details = details
+
+class Stage:
+    """
+    run(ticker, upstream: Output) -> Output. checkpoint marks stages whose
+    output is persisted by run, which makes them resumable. restore(ticker,
+    details), if given, is called for each task resumed from the journal
+    with the details its Output carried.
+    """
+    def __init__(self, name, run, checkpoint=True, restore=None):
+        self.name = name
+        self.run = run
+        self.checkpoint = checkpoint
+        self.restore = restore
+
+class Journal:
+    """
+    Append-only JSON lines of completed, checkpointed tasks.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def reset(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def load(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        done = {}
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn last line after a crash
+                done[(record["stage"], record["ticker"])] = (record["changed"], record.get("details"))
+        return done
+
+    def record(self, stage, ticker, changed, details=None):
+        if not self.path:
+            return
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"stage": stage, "ticker": ticker, "changed": changed, "details": details}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+REPORT_SCHEMA = {
+    "ticker": pl.Utf8, "stage": pl.Utf8, "status": pl.Utf8, "changed": pl.Boolean,
+    "error": pl.Utf8, "seconds": pl.Float64,
+}
+
+class Runner:
+    def __init__(self, stages, workers=4, journal_path=None):
+        self.stages = list(stages)
+        self.workers = max(1, workers)
+        self.journal = Journal(journal_path)
+
+    def run(self, tickers, resume=False) -> pl.DataFrame:
+        """
+        Runs every stage for every ticker and returns one report row per
+        task (status ok, failed, skipped after an upstream failure, or
+        resumed from the journal).
+        """
+        if not resume:
+            self.journal.reset()
+        done = self.journal.load() if resume else {}
+
+        rows = []
+        # Ready tasks as (stage index, ticker, upstream Output).
+        ready = [(0, ticker, Output(changed=False)) for ticker in tickers]
+        in_flight = {}
+
+        def advance(index, ticker, output):
+            if index + 1 < len(self.stages):
+                ready.append((index + 1, ticker, output))
+
+        def execute(index, ticker, upstream):
+            stage = self.stages[index]
+            start = time.perf_counter()
+            output = stage.run(ticker, upstream) or Output()
+            if stage.checkpoint:
+                self.journal.record(stage.name, ticker, output.changed, output.details)
+            return output, time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while ready or in_flight:
+                # Later stages first, so started tickers finish before new ones begin.
+                ready.sort(key=lambda task: task[0])
+                while ready and len(in_flight) < self.workers:
+                    index, ticker, upstream = ready.pop()
+                    stage = self.stages[index]
+                    if (stage.name, ticker) in done:
+                        changed, details = done[(stage.name, ticker)]
+                        if stage.restore is not None:
+                            stage.restore(ticker, details)
+                        rows.append(self.row(ticker, stage.name, "resumed", changed))
+                        advance(index, ticker, Output(changed=changed))
+                        continue
+                    in_flight[pool.submit(execute, index, ticker, upstream)] = (index, ticker)
+
+                if not in_flight:
+                    continue
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    index, ticker = in_flight.pop(future)
+                    name = self.stages[index].name
+                    try:
+                        output, seconds = future.result()
+                    except Exception as e:
+                        rows.append(self.row(ticker, name, "failed", False, f"{type(e).__name__}: {e}"))
+                        rows += [self.row(ticker, s.name, "skipped", False) for s in self.stages[index + 1:]]
+                        continue
+                    rows.append(self.row(ticker, name, "ok", output.changed, seconds=seconds))
+                    advance(index, ticker, output)
+
+        return pl.DataFrame(rows, schema=REPORT_SCHEMA)
+
+    @staticmethod
+    def row(ticker, stage, status, changed, error=None, seconds=0.0):
+        return {"ticker": ticker, "stage": stage, "status": status, "changed": changed, "error": error, "seconds": seconds}
@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+import polars as pl
+from tqdm import tqdm
+
+# Process-pool fan-out shared by the per-ticker stages.
+#
+# Tickers are split into chunks; each chunk is one task, run either through
+# the stage's batched function (one native call for the whole chunk) or,
+# without one or if the batch fails, ticker by ticker so every failure is
+# attributed. Workers are spawned with their thread budgets (quant_engine and
+# Polars) set to cores / workers, so a pool of single-threaded stages does not
+# turn into workers x cores threads, and are recycled after a number of
+# chunks to bound their memory.
+
+WORKERS = int(os.environ.get("PIPELINE_WORKERS", os.cpu_count() or 1))
+CHUNK_SIZE = 16
+MAX_CHUNKS_PER_WORKER = 32
+
+REPORT_SCHEMA = {"ticker": pl.Utf8, "status": pl.Utf8, "error": pl.Utf8, "seconds": pl.Float64}
+
+def threads_per_worker(workers: int) -> int:
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+@contextmanager
+def thread_environment(threads: int):
+    """
+    Thread budgets for processes started inside the block. They must be in
+    the environment before the child imports Polars or quant_engine.
+    """
+    names = ["POLARS_MAX_THREADS", "QUANT_ENGINE_THREADS", "OMP_NUM_THREADS"]
+    saved = {name: os.environ.get(name) for name in names}
+    os.environ.update({name: str(threads) for name in names})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+def init_worker(threads: int):
+    import quant_engine
+    quant_engine.set_num_threads(threads)
+
+def describe(error: Exception) -> str:
+    return f"{type(error).__name__}: {error}"
+
+def run_chunk(task, batch_task, chunk):
+    """
+    Runs one chunk and returns a report row per ticker. batch_task may return
+    {ticker: error} for tickers it could not process.
+    """
+    if batch_task is not None:
+        start = time.perf_counter()
+        try:
+            errors = batch_task(chunk) or {}
+            seconds = (time.perf_counter() - start) / len(chunk)
+            return [
+                {"ticker": t, "status": "failed" if t in errors else "ok", "error": errors.get(t), "seconds": seconds}
+                for t in chunk
+            ]
+        except Exception:
+            pass
+
+    rows = []
+    for ticker in chunk:
+        start = time.perf_counter()
+        try:
+            task(ticker)
+            rows.append({"ticker": ticker, "status": "ok", "error": None, "seconds": time.perf_counter() - start})
+        except Exception as e:
+            rows.append({"ticker": ticker, "status": "failed", "error": describe(e), "seconds": time.perf_counter() - start})
+    return rows
+
+def chunked(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+def run_stage(task, tickers, batch_task=None, workers=WORKERS, chunk_size=CHUNK_SIZE, desc=None) -> pl.DataFrame:
+    """
+    Runs task(ticker) (or batch_task(chunk)) over tickers and returns one
+    report row per ticker in input order. Progress advances in chunk order.
+    task and batch_task must be picklable (module-level functions or
+    functools.partial of them) when workers > 1.
+    """
+    tickers = list(tickers)
+    chunks = chunked(tickers, max(1, chunk_size))
+    workers = max(1, min(workers, len(chunks)))
+    rows = []
+
+    if workers == 1:
+        for chunk in tqdm(chunks, desc=desc):
+            rows += run_chunk(task, batch_task, chunk)
+    else:
+        threads = threads_per_worker(workers)
+        context = multiprocessing.get_context("spawn")
+        with thread_environment(threads), ProcessPoolExecutor(
+            max_workers=workers, mp_context=context, initializer=init_worker, initargs=(threads,),
+            max_tasks_per_child=MAX_CHUNKS_PER_WORKER,
+        ) as pool:
+            futures = [pool.submit(run_chunk, task, batch_task, chunk) for chunk in chunks]
+            for chunk, future in zip(chunks, tqdm(futures, desc=desc)):
+                try:
+                    rows += future.result()
+                except Exception as e:
+                    # The worker itself died (e.g. out of memory).
+                    rows += [{"ticker": t, "status": "failed", "error": describe(e), "seconds": 0.0} for t in chunk]
+
+    return pl.DataFrame(rows, schema=REPORT_SCHEMA)
+
+def print_failures(report: pl.DataFrame, stage: str):
+    failed = report.filter(pl.col("status") == "failed")
+    print(f"{stage}: {report.height - failed.height} ok, {failed.height} failed.")
+    for row in failed.iter_rows(named=True):
+        print(f"   FAILED {row['ticker']}: {row['error']}")
@@ -1,12 +1,22 @@
 import polars as pl
+import json
 import os
 import functools
-from tqdm import tqdm
 import quant_engine
 import numpy as np
+import executor
+import manifest
+import streaming
+from feature_schema import (
+    FEATURE_COLS, FRAC_DIFF_D, FRAC_DIFF_THRES, FRAC_DIFF_GRID, ADF_LAGS, VOL_SPAN, RSI_PERIOD, LAGS
+)
 
 LABELED_DIR = "./data/processed/labeled"
 FEATURES_DIR = "./data/processed/features"
+FRAC_DIFF_TABLE = "./data/processed/frac_diff_d.parquet"
+STAGE_VERSION = 1
+# Label files larger than this get their features in chunks (see context()).
+MEMORY_LIMIT = streaming.memory_limit("features")
 
 def ensure_dir(path):
     if not os.path.exists(path):
@@ -29,56 +39,289 @@ def calculate_rsi(expr, period=14):
     rsi = 100.0 - (100.0 / (1.0 + rs))
     return rsi.alias("rsi")
 
-def process_ticker(ticker):
-    input_path = f"{LABELED_DIR}/{ticker}_db.parquet"
+def engine_params(d=FRAC_DIFF_D):
+    return dict(
+        d=d, thres=FRAC_DIFF_THRES, vol_span=VOL_SPAN,
+        rsi_period=RSI_PERIOD, lags=LAGS
+    )
+
+def feature_params(d=FRAC_DIFF_D):
+    return {**engine_params(d), "features": FEATURE_COLS}
+
+def context(d=FRAC_DIFF_D):
+    """
+    Rows of history each chunk needs in front of it: the FFD window, the
+    longest lag and the warm-up of the volatility and RSI EWMs.
+    """
+    width = len(quant_engine.get_weights_ffd(d, FRAC_DIFF_THRES))
+    return max(width - 1, max(LAGS), streaming.ewm_warmup(VOL_SPAN), streaming.ewm_warmup(RSI_PERIOD))
+
+def labeled_path(ticker):
+    return f"{LABELED_DIR}/{ticker}_db.parquet"
+
+def load_labeled(ticker, columns=None):
+    input_path = labeled_path(ticker)
     if not os.path.exists(input_path):
         print(f"Missing {ticker}")
-        return
+        return None
+
+    return pl.read_parquet(input_path, columns=columns)
+
+def scan_labeled(ticker):
+    """
+    (lazy frame, rows, schema) of a ticker's labels, or None if missing.
+    """
+    if not os.path.exists(labeled_path(ticker)):
+        print(f"Missing {ticker}")
+        return None
+    return streaming.scan(labeled_path(ticker))
+
+def search_params():
+    """
+    Settings the minimum-d search depends on, stored with each row of
+    FRAC_DIFF_TABLE so rows found under other settings are searched again.
+    """
+    return json.dumps({"grid": FRAC_DIFF_GRID, "thres": FRAC_DIFF_THRES, "lags": ADF_LAGS}, sort_keys=True)
+
+def read_frac_diff_table():
+    """
+    Rows of FRAC_DIFF_TABLE found with the current search settings.
+    """
+    if not os.path.exists(FRAC_DIFF_TABLE):
+        return None
+    table = pl.read_parquet(FRAC_DIFF_TABLE)
+    if "search" not in table.columns:
+        return table.clear()
+    return table.filter(pl.col("search") == search_params())
+
+def load_frac_diff_d():
+    """
+    ticker -> d from the minimum-d table ({} until the search has run).
+    Tickers searched with another grid, thres or lag count are left out,
+    so callers search them again.
+    """
+    table = read_frac_diff_table()
+    if table is None:
+        return {}
+    return dict(zip(table["ticker"].to_list(), table["d"].to_list()))
+
+def search_frac_diff_d(tickers, frames=None):
+    """
+    Smallest d in FRAC_DIFF_GRID whose FFD of close passes a 5% ADF test, for
+    every ticker in one quant_engine call (parallel across tickers and d).
+    Tickers where no grid value passes get the largest d. Results are merged
+    into FRAC_DIFF_TABLE and returned as ticker -> d. Labeled frames are read
+    unless given in `frames`.
+    """
+    frames = dict(frames or {})
+    for ticker in tickers:
+        if ticker in frames:
+            continue
+        df = load_labeled(ticker, columns=["close"])
+        if df is not None:
+            frames[ticker] = df
 
-    df = pl.read_parquet(input_path)
+    if not frames:
+        return {}
 
+    names = list(frames)
+    closes = [frames[t]["close"].to_numpy().astype(np.float64) for t in names]
+    result = quant_engine.min_ffd_d(closes, FRAC_DIFF_GRID, thres=FRAC_DIFF_THRES, lags=ADF_LAGS)
+
+    chosen = result["d"]
+    column = np.argmax(np.asarray(FRAC_DIFF_GRID)[None, :] == chosen[:, None], axis=1)
+    rows = np.arange(len(names))
+    stationary = ~np.isnan(chosen)
+    column[~stationary] = int(np.argmax(FRAC_DIFF_GRID))
+
+    table = pl.DataFrame({
+        "ticker": names,
+        "d": np.asarray(FRAC_DIFF_GRID)[column],
+        "adf": result["adf"][rows, column],
+        "critical": result["critical"][rows, column],
+        "stationary": stationary,
+        "search": search_params(),
+    })
+
+    previous = read_frac_diff_table()
+    if previous is not None:
+        table = pl.concat([previous.filter(~pl.col("ticker").is_in(names)), table])
+
+    table.sort("ticker").write_parquet(FRAC_DIFF_TABLE)
+    print(f"Chose d for {len(names)} tickers ({(~stationary).sum()} not stationary on the grid)")
+    return dict(zip(names, np.asarray(FRAC_DIFF_GRID)[column].tolist()))
+
+def build_features(df, matrix, log_return):
+    """
+    Attaches the quant_engine.compute_features output to the labeled frame.
+    Rows the Polars expressions left null (first RSI value, log return and
+    lags before enough history) stay null; frac_diff_04 keeps its NaN padding.
+    """
+    columns = {name: pl.Series(name, matrix[:, j]) for j, name in enumerate(FEATURE_COLS)}
+
+    rsi = columns["rsi"]
+    if rsi.len() > 0:
+        rsi = rsi.scatter(0, None)
+
+    df = df.with_columns(columns["volatility"])
     df = df.with_columns([
-        (pl.col("close") / pl.col("close").shift(1)).log().alias("log_return"),
-        calculate_rsi(pl.col("close"), period=14)
+        pl.Series("log_return", log_return).fill_nan(None),
+        rsi,
+        columns["frac_diff_04"]
     ])
+    return df.with_columns([columns[f"return_lag_{lag}"].fill_nan(None) for lag in LAGS])
+
+def save_features(df, ticker, d=FRAC_DIFF_D, source_hash=None):
+    """
+    Writes the features and records them, with the labeled hash and the
+    parameters they were built from, in the features manifest.
+    """
+    df.write_parquet(f"{FEATURES_DIR}/{ticker}_features.parquet")
+    stats = {"rows": df.height}
+    if "timestamp" in df.columns:
+        stats.update(last_timestamp=df["timestamp"].max(), time_zone=df.schema["timestamp"].time_zone)
+    record_features(ticker, stats, d, source_hash)
+
+def record_features(ticker, stats, d=FRAC_DIFF_D, source_hash=None):
+    if source_hash is None:
+        source_hash = manifest.load(LABELED_DIR).get(ticker, {}).get("hash")
+    manifest.update(FEATURES_DIR, ticker, lambda _: manifest.file_entry(
+        f"{FEATURES_DIR}/{ticker}_features.parquet",
+        source_hash=source_hash,
+        params=feature_params(d),
+        version=STAGE_VERSION,
+        **stats,
+    ))
+
+def warn_if_short(ticker, matrix):
+    if np.isnan(matrix[:, FEATURE_COLS.index("frac_diff_04")]).all():
+        print(f"{ticker}: FracDiff returned all NaNs (History too short). Saving all NaNs.")
+
+def stream_features(ticker, lf, rows, schema, d=FRAC_DIFF_D, source_hash=None):
+    """
+    process_ticker for label files over MEMORY_LIMIT: each chunk is computed
+    with context(d) earlier rows in front and written through a streaming
+    sink. Returns a lazy scan of the features.
+    """
+    sink = streaming.Sink(f"{FEATURES_DIR}/{ticker}_features.parquet")
+    size = streaming.chunk_rows(schema, MEMORY_LIMIT)
+    for frame, _, start, stop in streaming.batches(lf, rows, size, context=context(d)):
+        close_prices = frame["close"].to_numpy().astype(np.float64)
+        log_return = np.empty(len(close_prices))
+        matrix = quant_engine.compute_features(close_prices, log_return=log_return, **engine_params(d))
+        sink.write(build_features(frame, matrix, log_return).slice(start, stop - start))
+
+    features = sink.finish()
+    stats = streaming.describe(features) if "timestamp" in schema else {"rows": rows}
+    record_features(ticker, stats, d, source_hash)
+    return features
+
+def process_ticker(ticker, d_table=None, df=None, save=True):
+    """
+    Features for one ticker (labels read from LABELED_DIR unless `df` is
+    given); with save, written and recorded in the features manifest.
+    Label files over MEMORY_LIMIT are processed in chunks and always
+    written; the result is then a lazy scan of the features.
+    """
+    if d_table is None:
+        d_table = load_frac_diff_d()
+    d = d_table.get(ticker, FRAC_DIFF_D)
+
+    if df is None:
+        scanned = scan_labeled(ticker)
+        if scanned is None:
+            return None
+        lf, rows, schema = scanned
+        if not streaming.fits(rows, schema, MEMORY_LIMIT):
+            return stream_features(ticker, lf, rows, schema, d)
+        df = lf.collect()
 
     close_prices = df["close"].to_numpy().astype(np.float64)
+    log_return = np.empty(len(close_prices))
 
-    try:
-        frac_diff_values = quant_engine.fractional_diff(close_prices, 0.4, 1e-3)
+    matrix = quant_engine.compute_features(close_prices, log_return=log_return, **engine_params(d))
+    warn_if_short(ticker, matrix)
 
-        if np.isnan(frac_diff_values).all():
-             print(f"{ticker}: FracDiff returned all NaNs (History too short). Saving all NaNs.")
+    features = build_features(df, matrix, log_return)
+    if save:
+        save_features(features, ticker, d)
+    return features
 
-        df = df.with_columns(
-            pl.Series(name="frac_diff_04", values=frac_diff_values)
-        )
+def process_universe(tickers):
+    """
+    Batched variant of process_ticker: tickers sharing a d get their feature
+    matrices from a single quant_engine call, parallel across tickers.
+    Returns {ticker: error} for the tickers that failed.
+    """
+    errors = {}
+    frames = {}
+    d_table = load_frac_diff_d()
+    for ticker in tickers:
+        scanned = scan_labeled(ticker)
+        if scanned is None:
+            continue
+        lf, rows, schema = scanned
+        if streaming.fits(rows, schema, MEMORY_LIMIT):
+            frames[ticker] = lf.collect()
+            continue
+        try:
+            stream_features(ticker, lf, rows, schema, d_table.get(ticker, FRAC_DIFF_D))
+        except Exception as e:
+            errors[ticker] = executor.describe(e)
 
-    except Exception as e:
-        print(f"C++ Engine Error on {ticker}: {e}")
-        return
+    if not frames:
+        return errors
 
-    lags = [1, 2, 3, 5, 10]
-    lag_expressions = [
-        pl.col("log_return").shift(lag).alias(f"return_lag_{lag}") 
-        for lag in lags
-    ]
-    df = df.with_columns(lag_expressions)
+    groups = {}
+    for ticker in frames:
+        groups.setdefault(d_table.get(ticker, FRAC_DIFF_D), []).append(ticker)
 
-    output_path = f"{FEATURES_DIR}/{ticker}_features.parquet"
-    df.write_parquet(output_path)
+    labeled = manifest.load(LABELED_DIR)
+    names, matrices, log_returns = [], [], []
+    for d, group in groups.items():
+        closes = [frames[t]["close"].to_numpy().astype(np.float64) for t in group]
+        try:
+            group_matrices, group_returns = quant_engine.batch_compute_features(closes, **engine_params(d))
+        except Exception as e:
+            errors.update({t: f"C++ Engine Error on batch (d={d}): {e}" for t in group})
+            continue
+        names += group
+        matrices += group_matrices
+        log_returns += group_returns
 
-def main():
-    ensure_dir(FEATURES_DIR)
-    ensure_dir(LABELED_DIR)
-    files = [f.replace("_db.parquet", "") for f in os.listdir(LABELED_DIR) if f.endswith("_db.parquet")]
-    
-    print(f"Engineering features for {len(files)} tickers...")
-    for ticker in tqdm(files):
+    for ticker, matrix, log_return in zip(names, matrices, log_returns):
         try:
-            process_ticker(ticker)
+            warn_if_short(ticker, matrix)
+            save_features(
+                build_features(frames[ticker], matrix, log_return), ticker,
+                d_table.get(ticker, FRAC_DIFF_D), labeled.get(ticker, {}).get("hash"),
+            )
         except Exception as e:
-            print(f"Error {ticker}: {e}")
+            errors[ticker] = executor.describe(e)
+    return errors
+
+def main(workers=executor.WORKERS, tickers=None):
+    ensure_dir(FEATURES_DIR)
+    ensure_dir(LABELED_DIR)
+    labeled = manifest.load(LABELED_DIR)
+
+    scope = sorted(labeled) if tickers is None else [t for t in tickers if t in labeled]
+    d_table = load_frac_diff_d()
+    missing = [t for t in scope if t not in d_table]
+    if missing:
+        print(f"Searching minimum FracDiff d for {len(missing)} tickers...")
+        d_table.update(search_frac_diff_d(missing))
+
+    # Only tickers whose labels, d or feature parameters changed.
+    tickers = manifest.changed(
+        labeled, manifest.load(FEATURES_DIR), tickers=scope,
+        params=lambda t: feature_params(d_table.get(t, FRAC_DIFF_D)), version=STAGE_VERSION,
+    )
+
+    print(f"Engineering features for {len(tickers)} of {len(labeled)} tickers...")
+    report = executor.run_stage(process_ticker, tickers, batch_task=process_universe, workers=workers, desc="Features")
+    executor.print_failures(report, "Features")
+    return report
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
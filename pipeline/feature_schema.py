@@ -0,0 +1,20 @@
+"""
+Single source of truth for the model feature layout.
+
+quant_engine.compute_features writes its matrix in FEATURE_COLS order, and
+training, backtesting and the API select columns with the same list, so the
+order a model was trained on is the order it is served with.
+"""
+
+FRAC_DIFF_D = 0.4
+FRAC_DIFF_THRES = 1e-3
+# Candidate orders for the per-ticker minimum-d search; FRAC_DIFF_D is the
+# fallback for tickers the search has not covered. d = 0 is left out: it
+# would turn frac_diff_04 into the raw, non-stationary close level.
+FRAC_DIFF_GRID = [round(0.05 * k, 2) for k in range(1, 21)]
+ADF_LAGS = 1
+VOL_SPAN = 20
+RSI_PERIOD = 14
+LAGS = [1, 2, 3, 5, 10]
+
+FEATURE_COLS = ["volatility", "rsi", "frac_diff_04"] + [f"return_lag_{lag}" for lag in LAGS]
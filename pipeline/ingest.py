@@ -1,83 +1,60 @@
-import yfinance as yf
 import polars as pl
-import pandas as pd
-import requests
 import os
-from datetime import datetime
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, time as clock_time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
-from io import StringIO
-from utils import time_execution, retry
+from utils import time_execution, retry, TokenBucket, backoff_delay
+import raw_store
+import universe
 
 DATA_DIR = "./data/raw"
 
-def get_sp500_tickers() -> list[str]:
-    if os.path.exists(DATA_DIR):
-        existing_files = [f.replace(".parquet", "") for f in os.listdir(DATA_DIR) if f.endswith(".parquet")]
-        if len(existing_files) > 10:
-            print(f"Loaded {len(existing_files)} tickers from local storage.")
-            return existing_files
+# Concurrent ingestion: requests are network bound, so a small thread pool
+# shares one rate limit; failed tickers back off exponentially with jitter.
+MAX_WORKERS = 8
+REQUESTS_PER_SECOND = 2.0
+BURST = 4
+MAX_ATTEMPTS = 4
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
 
-    print("Local data empty. Scraping S&P 500 constituents...")
-    try:
-        url = "https://raw.githubusercontent.com/datasets/s-and-p-500-companies/master/data/constituents.csv"
-
-        df = pd.read_csv(url)
-        tickers = df['Symbol'].tolist()
-        
-        tickers = [t.replace('.', '-') for t in tickers]
-        
-        print(f"Found {len(tickers)} tickers.")
-        return tickers
-    
-    except Exception as e:
-        print(f"Scraping failed: {e}")
-        print("Activating fallback method: Using Top 20 Liquid Tech Stocks.")
-        return [
-            "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "TSLA", "META", 
-            "AMD", "INTC", "QCOM", "CSCO", "NFLX", "ADBE", "TXN", 
-            "AVGO", "CRM", "PYPL", "IBM", "ORCL", "MU"
-        ]
+RAW_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
 
-TICKERS = get_sp500_tickers()
+# Regular NYSE session. Hourly bars start at 9:30, so the last one of a
+# session starts at 15:30; a ticker holding that bar needs no fetch until
+# the next session opens (holidays just cost one redundant fetch).
+MARKET_TZ = ZoneInfo("America/New_York")
+SESSION_OPEN = clock_time(9, 30)
+SESSION_CLOSE = clock_time(16, 0)
+LAST_BAR = clock_time(15, 30)
+SKIP_CURRENT = True
+
+def get_sp500_tickers() -> list[str]:
+    return universe.get_universe(raw_dir=DATA_DIR)
 
 def ensure_directories():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
 
 def get_latest_timestamp(ticker: str):
-    file_path = f"{DATA_DIR}/{ticker}.parquet"
-    if not os.path.exists(file_path):
-        return None
-    
-    df = pl.read_parquet(file_path)
-    return df["date"].max()
-
-@retry(retries=3, delay=2)
-def fetch_data(ticker: str, start_date: str | None = None) -> pl.DataFrame:
-    print(f"Fetching {ticker}..." + (f" from {start_date}" if start_date else " (Full History)"))
-
-    try:
-        if start_date:
-            start_str = start_date.strftime('%Y-%m-%d') if hasattr(start_date, 'strftime') else start_date
-            df_pandas = yf.download(ticker, start=start_str, interval="1h", progress=False, auto_adjust=True)
-        else:
-            df_pandas = yf.download(ticker, period="2y", interval="1h", progress=False, auto_adjust=True)
-
-    except Exception:
-        return None
-    
-    if df_pandas.empty:
-        return None
+    return raw_store.latest_timestamp(ticker, DATA_DIR)
 
+def normalize_download(df_pandas, ticker: str) -> pl.DataFrame:
+    """
+    yfinance frame -> raw schema: date, OHLCV, ticker and dollar_volume.
+    """
     df_pandas = df_pandas.reset_index()
 
     df = pl.from_pandas(df_pandas)
     
     if len(df.columns) == 6:
-        df.columns = ["date", "open", "high", "low", "close", "volume"]
+        df.columns = RAW_COLUMNS
     else:
         df = df.select(df.columns[:6])
-        df.columns = ["date", "open", "high", "low", "close", "volume"]
+        df.columns = RAW_COLUMNS
     
     df = df.with_columns(pl.lit(ticker).alias("ticker"))
     
@@ -87,44 +64,207 @@ def fetch_data(ticker: str, start_date: str | None = None) -> pl.DataFrame:
 
     return df
 
-def save_to_parquet(df: pl.DataFrame, ticker: str):
-    file_path = f"{DATA_DIR}/{ticker}.parquet"
-    df.write_parquet(file_path, compression="snappy")
+class DataSource(ABC):
+    """
+    Where raw bars come from. fetch returns the bars from start_date on (full
+    history when None) in the raw schema, None when there is nothing new, and
+    raises on errors so the caller can retry.
+    """
+    @abstractmethod
+    def fetch(self, ticker: str, start_date=None) -> pl.DataFrame | None:
+        ...
+
+class YFinanceSource(DataSource):
+    def __init__(self, interval="1h", period="2y"):
+        self.interval = interval
+        self.period = period
+
+    def fetch(self, ticker: str, start_date=None) -> pl.DataFrame | None:
+        import yfinance as yf  # slow to import; only needed when fetching
+
+        print(f"Fetching {ticker}..." + (f" from {start_date}" if start_date else " (Full History)"))
+
+        if start_date:
+            start_str = start_date.strftime('%Y-%m-%d') if hasattr(start_date, 'strftime') else start_date
+            df_pandas = yf.download(ticker, start=start_str, interval=self.interval, progress=False, auto_adjust=True)
+        else:
+            df_pandas = yf.download(ticker, period=self.period, interval=self.interval, progress=False, auto_adjust=True)
+
+        if df_pandas.empty:
+            return None
+
+        return normalize_download(df_pandas, ticker)
+
+class FixtureSource(DataSource):
+    """
+    Serves <root>/<ticker>.parquet files in the raw schema; used in tests and
+    for offline runs.
+    """
+    def __init__(self, root: str):
+        self.root = root
 
-def update_ticker(ticker: str):
+    def fetch(self, ticker: str, start_date=None) -> pl.DataFrame | None:
+        path = f"{self.root}/{ticker}.parquet"
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No fixture for {ticker}")
+
+        df = pl.read_parquet(path)
+        if start_date is not None:
+            df = df.filter(pl.col("date") >= start_date)
+        return df if df.height > 0 else None
+
+def last_session_bar(now: datetime):
+    """
+    Start of the last hourly bar of the most recent completed session, or
+    None while a session is open.
+    """
+    local = now.astimezone(MARKET_TZ)
+    day = local.date()
+    if local.weekday() < 5:
+        if SESSION_OPEN <= local.time() < SESSION_CLOSE:
+            return None
+        if local.time() < SESSION_OPEN:
+            day -= timedelta(days=1)
+    while day.weekday() >= 5:
+        day -= timedelta(days=1)
+    return datetime.combine(day, LAST_BAR, MARKET_TZ)
+
+def is_current(last_timestamp, now: datetime | None = None) -> bool:
+    """
+    True when the stored data already holds the last bar of the most recent
+    closed session, so a fetch cannot return anything new.
+    """
+    if last_timestamp is None:
+        return False
+    bar = last_session_bar(now or datetime.now(timezone.utc))
+    if bar is None:
+        return False
+    if last_timestamp.tzinfo is None:
+        bar = bar.replace(tzinfo=None)
+    return last_timestamp >= bar
+
+def update_ticker(ticker: str, source: DataSource | None = None) -> dict:
+    """
+    Fetches bars since the last stored one and appends them to the raw lake
+    as a new fragment. The fetch starts at the last stored bar, so the
+    overlap is written too and its newer values win at read/compaction time.
+    Returns the number of bars past the last stored one and their time range.
+    """
     last_date = get_latest_timestamp(ticker)
-    new_df = fetch_data(ticker, start_date=last_date)
+    new_df = (source or YFinanceSource()).fetch(ticker, start_date=last_date)
 
+    unchanged = {"rows": 0, "start": None, "end": None}
     if new_df is None or new_df.height == 0:
-        return
-    
-    if last_date is None:
-        final_df = new_df
-    else:
-        print(f"   Merging {new_df.height} new rows...")
-        old_df = pl.read_parquet(f"{DATA_DIR}/{ticker}.parquet")
-        final_df = (
-            old_df.vstack(new_df)
-            .unique(subset=["date"], keep="last")
-            .sort(by="date")
-        )
+        return unchanged
+
+    added_df = new_df if last_date is None else new_df.filter(pl.col("date") > last_date)
+    if added_df.height == 0:
+        return unchanged
 
-    save_to_parquet(final_df, ticker)
+    if last_date is not None:
+        print(f"   Appending {added_df.height} new rows...")
+    raw_store.append(new_df, ticker, DATA_DIR)
+    return {
+        "rows": added_df.height,
+        "start": added_df["date"].min().isoformat(),
+        "end": added_df["date"].max().isoformat(),
+    }
+
+def ingest_ticker(ticker: str, source: DataSource, limiter: TokenBucket,
+                  max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP,
+                  sleep=time.sleep, skip_current=SKIP_CURRENT, now=None) -> dict:
+    """
+    update_ticker under the shared rate limit, retried with exponential
+    backoff and jitter. Never raises: the outcome is returned as a report row.
+    Tickers already holding the last closed session's final bar are not
+    fetched (status "current").
+    """
+    start = time.perf_counter()
+    if skip_current and is_current(get_latest_timestamp(ticker), now):
+        return {
+            "ticker": ticker, "status": "current", "rows": 0, "start": None, "end": None,
+            "attempts": 0, "error": None, "seconds": time.perf_counter() - start,
+        }
+
+    attempts = 0
+
+    @retry(max_attempts, delay=lambda attempt: backoff_delay(attempt, backoff_base, backoff_cap), sleep=sleep)
+    def update():
+        nonlocal attempts
+        attempts += 1
+        limiter.acquire()
+        return update_ticker(ticker, source)
+
+    try:
+        result = update()
+    except Exception as e:
+        return {
+            "ticker": ticker, "status": "failed", "rows": 0, "start": None, "end": None,
+            "attempts": attempts, "error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - start,
+        }
+    return {
+        "ticker": ticker, "status": "updated" if result["rows"] > 0 else "unchanged",
+        **result, "attempts": attempts, "error": None, "seconds": time.perf_counter() - start,
+    }
+
+REPORT_SCHEMA = {
+    "ticker": pl.Utf8, "status": pl.Utf8, "rows": pl.Int64, "start": pl.Utf8, "end": pl.Utf8,
+    "attempts": pl.Int64, "error": pl.Utf8, "seconds": pl.Float64,
+}
+
+def ingest_universe(tickers, source: DataSource | None = None, max_workers=MAX_WORKERS,
+                    requests_per_second=REQUESTS_PER_SECOND, burst=BURST, **options) -> pl.DataFrame:
+    """
+    Ingests tickers on a bounded thread pool sharing one token bucket.
+    Returns one report row per ticker (status updated/unchanged/current/
+    failed, and the time range of the new bars).
+    """
+    ensure_directories()
+    source = source or YFinanceSource()
+    limiter = TokenBucket(requests_per_second, burst)
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(ingest_ticker, t, source, limiter, **options) for t in tickers]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Ingesting Market Data"):
+            results.append(future.result())
+
+    return pl.DataFrame(results, schema=REPORT_SCHEMA).sort("ticker")
+
+def print_report(report: pl.DataFrame):
+    counts = dict(report.group_by("status").len().iter_rows())
+    print(
+        f"Updated {counts.get('updated', 0)}, unchanged {counts.get('unchanged', 0)}, "
+        f"current {counts.get('current', 0)}, failed {counts.get('failed', 0)} ({report['rows'].sum()} new rows)."
+    )
+    for row in report.filter(pl.col("status") == "failed").iter_rows(named=True):
+        print(f"   FAILED {row['ticker']} after {row['attempts']} attempts: {row['error']}")
+
+def change_set(report: pl.DataFrame) -> dict:
+    """
+    {ticker: {"rows", "start", "end"}} for the tickers that got new bars.
+    """
+    updated = report.filter(pl.col("status") == "updated")
+    return {row["ticker"]: {k: row[k] for k in ("rows", "start", "end")} for row in updated.iter_rows(named=True)}
 
 @time_execution
-def main():
+def main(tickers=None):
     ensure_directories()
-    
-    success_count = 0
-    
-    for ticker in tqdm(TICKERS, desc="Ingesting Market Data"):
-        try:
-            df = update_ticker(ticker)
-            
-        except Exception as e:
-            pass
+    migrated = raw_store.migrate_flat_files(DATA_DIR)
+    if migrated:
+        print(f"Moved {migrated} flat ticker files into the partitioned raw store.")
+    if raw_store.ensure_manifest(DATA_DIR):
+        print("Rebuilt the raw store manifest.")
+
+    report = ingest_universe(tickers or get_sp500_tickers())
+    print_report(report)
+    raw_store.write_changes(change_set(report), DATA_DIR)
+
+    compacted = raw_store.compact_all(DATA_DIR, tickers=report.filter(pl.col("status") == "updated")["ticker"].to_list())
+    print(f"Compacted {compacted} month partitions.")
 
     print(f"\nPipeline Finished.")
+    return report
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,14 +1,13 @@
 import polars as pl
-import glob
+import raw_store
 
-# Read all parquet files at once (Polars magic)
-files = glob.glob("./data/raw/*.parquet")
-if not files:
+# Read the whole partitioned lake at once (Polars magic)
+if not raw_store.list_tickers():
     print("No data found!")
     exit()
 
 q = (
-    pl.scan_parquet("./data/raw/*.parquet")
+    raw_store.deduplicate(raw_store.scan())
     .group_by("ticker")
     .agg([
         pl.len(),
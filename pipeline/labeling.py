@@ -1,7 +1,27 @@
 import polars as pl
 import numpy as np
 import os
-import tqdm
+import functools
+import quant_engine
+import manifest
+import executor
+import streaming
+
+BARS_DIR = "./data/processed/dollar_bars"
+LABELED_DIR = "./data/processed/labeled"
+
+# "horizon": compare the return at the vertical barrier only (vectorized MVP).
+# "path": native first-touch search over the whole window.
+LABEL_MODE = "horizon"
+PROFIT_TAKE = 2.0
+STOP_LOSS = 2.0
+HORIZON = 10
+VOLATILITY_SPAN = 20
+STAGE_VERSION = 1
+# Bar files larger than this are labeled in chunks, each with enough
+# earlier bars for the volatility EWM and the next HORIZON bars.
+MEMORY_LIMIT = streaming.memory_limit("label")
+CONTEXT = streaming.ewm_warmup(VOLATILITY_SPAN)
 
 def get_volatility(df, span=100):
     # Compute daily volatility using Exponential Moving Average
@@ -10,14 +30,14 @@ def get_volatility(df, span=100):
         pl.col("close").pct_change().ewm_std(span=span).alias("volatility")
     )
 
-def triple_barrier_method(df, profit_take=2.0, stop_loss=2.0, horizon=10):
+def triple_barrier_method(df, profit_take=PROFIT_TAKE, stop_loss=STOP_LOSS, horizon=HORIZON):
     """
     labels: 1 (Profit), -1 (Loss), 0 (Time-out)
     """
     # Calculate Barriers based on dynamic volatility
     # This is dynamic: When market is crazy, barriers widen.
     df = df.with_columns(
-        pl.col("close").pct_change().ewm_std(span=20).fill_null(0.01).alias("volatility")
+        pl.col("close").pct_change().ewm_std(span=VOLATILITY_SPAN).fill_null(0.01).alias("volatility")
     )
 
     # Creating the 'Future' columns to peek ahead
@@ -41,26 +61,107 @@ def triple_barrier_method(df, profit_take=2.0, stop_loss=2.0, horizon=10):
     
     return df.with_columns(labels)
 
-def main():
-    # Process all parquet files in dollar_bars folder
-    files = [f for f in os.listdir("./data/processed/dollar_bars") if f.endswith("_db.parquet")]
-    
-    print(f"Labeling {len(files)} tickers...")
-    
-    for f in tqdm.tqdm(files):
-        try:
-            input_path = os.path.join("./data/processed/dollar_bars", f)
-            df = pl.read_parquet(input_path)
-            
-            labeled_df = triple_barrier_method(df)
-            
-            # Save to new folder "labeled"
-            output_dir = "./data/processed/labeled"
-            if not os.path.exists(output_dir): os.makedirs(output_dir)
-            
-            labeled_df.write_parquet(os.path.join(output_dir, f))
-        except Exception as e:
-            print(f"Error labeling {f}: {e}")
+def triple_barrier_path(df, profit_take=PROFIT_TAKE, stop_loss=STOP_LOSS, horizon=HORIZON):
+    """
+    Path-dependent labels: 1 / -1 for whichever barrier the price touches
+    first inside the window, 0 if the vertical barrier is reached first.
+    Adds touch_index (bar of the first touch, null if the window runs past
+    the data) and touch_return (return realized at that bar).
+    """
+    df = df.with_columns(
+        pl.col("close").pct_change().ewm_std(span=VOLATILITY_SPAN).fill_null(0.01).alias("volatility")
+    )
+
+    close = df["close"].cast(pl.Float64).to_numpy()
+    volatility = df["volatility"].cast(pl.Float64).to_numpy()
+    labels, touch, ret = quant_engine.triple_barrier(close, volatility, profit_take, stop_loss, horizon)
+
+    return df.with_columns([
+        pl.Series("label", labels).cast(pl.Int32),
+        pl.Series("touch_index", touch).cast(pl.Int64).replace(-1, None),
+        pl.Series("touch_return", ret).fill_nan(None),
+    ])
+
+LABELERS = {
+    "horizon": triple_barrier_method,
+    "path": triple_barrier_path,
+}
+
+def label_params(mode=LABEL_MODE):
+    return {
+        "mode": mode, "profit_take": PROFIT_TAKE, "stop_loss": STOP_LOSS, "horizon": HORIZON,
+        "volatility_span": VOLATILITY_SPAN,
+    }
+
+def label_ticker(ticker, mode=LABEL_MODE, source_hash=None, df=None, save=True):
+    """
+    Labels a ticker's bars (read from BARS_DIR unless `df` is given) and,
+    with save, writes them and records them in the labeled manifest. Bar
+    files over MEMORY_LIMIT are labeled in chunks and always written; the
+    result is then a lazy scan of the labels.
+    """
+    if df is None:
+        lf, rows, schema = streaming.scan(f"{BARS_DIR}/{ticker}_db.parquet")
+        if not streaming.fits(rows, schema, MEMORY_LIMIT):
+            return stream_labels(ticker, lf, rows, schema, mode, source_hash)
+        df = lf.collect()
+
+    labeled_df = LABELERS[mode](df, PROFIT_TAKE, STOP_LOSS, HORIZON)
+    if save:
+        save_labels(labeled_df, ticker, mode, source_hash)
+    return labeled_df
+
+def stream_labels(ticker, lf, rows, schema, mode=LABEL_MODE, source_hash=None):
+    sink = streaming.Sink(f"{LABELED_DIR}/{ticker}_db.parquet")
+    size = streaming.chunk_rows(schema, MEMORY_LIMIT)
+    for frame, offset, start, stop in streaming.batches(lf, rows, size, context=CONTEXT, lookahead=HORIZON):
+        labeled = LABELERS[mode](frame, PROFIT_TAKE, STOP_LOSS, HORIZON)
+        if "touch_index" in labeled.columns:
+            labeled = labeled.with_columns(pl.col("touch_index") + offset)
+        sink.write(labeled.slice(start, stop - start))
+
+    labeled_lf = sink.finish()
+    record_labels(ticker, streaming.describe(labeled_lf), mode, source_hash)
+    return labeled_lf
+
+def save_labels(labeled_df, ticker, mode=LABEL_MODE, source_hash=None):
+    if not os.path.exists(LABELED_DIR): os.makedirs(LABELED_DIR)
+    labeled_df.write_parquet(f"{LABELED_DIR}/{ticker}_db.parquet")
+    stats = {
+        "rows": labeled_df.height,
+        "last_timestamp": labeled_df["timestamp"].max(),
+        "time_zone": labeled_df.schema["timestamp"].time_zone,
+    }
+    record_labels(ticker, stats, mode, source_hash)
+
+def record_labels(ticker, stats, mode=LABEL_MODE, source_hash=None):
+    if source_hash is None:
+        source_hash = manifest.load(BARS_DIR).get(ticker, {}).get("hash")
+    output_path = f"{LABELED_DIR}/{ticker}_db.parquet"
+    manifest.update(LABELED_DIR, ticker, lambda _: manifest.file_entry(
+        output_path,
+        source_hash=source_hash,
+        params=label_params(mode),
+        version=STAGE_VERSION,
+        **stats,
+    ))
+
+def main(mode=LABEL_MODE, workers=executor.WORKERS, tickers=None):
+    if not os.path.exists(LABELED_DIR): os.makedirs(LABELED_DIR)
+
+    # Only tickers whose bars or label parameters changed since they were last labeled.
+    bars = manifest.load(BARS_DIR)
+    tickers = manifest.changed(
+        bars, manifest.load(LABELED_DIR), tickers=tickers, params=label_params(mode), version=STAGE_VERSION,
+    )
+
+    print(f"Labeling {len(tickers)} of {len(bars)} tickers (mode: {mode})...")
+
+    report = executor.run_stage(
+        functools.partial(label_ticker, mode=mode), tickers, workers=workers, desc="Labeling",
+    )
+    executor.print_failures(report, "Labeling")
+    return report
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
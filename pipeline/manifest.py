@@ -0,0 +1,149 @@
+import fcntl
+import json
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+# Per-directory JSON sidecar describing each ticker's data: last timestamp,
+# row count, size on disk and a content hash. Writers update it atomically
+# after every write; readers use it to find the last stored bar and to tell
+# which tickers changed since a downstream stage last ran, without opening
+# any parquet file.
+#
+#   {"version": 1, "tickers": {"AAPL": {"last_timestamp": ..., "rows": ...,
+#                                      "bytes": ..., "hash": ...}}}
+#
+# Downstream stages store the hash of the input they were built from as
+# `source_hash`, and a `fingerprint` of that hash plus the stage parameters
+# and code version. A stage reruns a ticker only when the fingerprint it
+# would produce differs from the stored one, so changing a parameter
+# invalidates that stage, and its new outputs (new hashes) invalidate the
+# stages downstream; an unchanged output stops the cascade.
+#
+# The code version is each stage module's STAGE_VERSION: bump it when a code
+# change alters the stage's output without touching its parameters, so every
+# ticker is rebuilt once.
+
+MANIFEST_NAME = "_manifest.json"
+VERSION = 1
+
+_lock = threading.Lock()
+
+@contextmanager
+def locked(directory: str):
+    """
+    Serialises manifest writers across threads and worker processes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _lock, open(f"{directory}/{MANIFEST_NAME}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def manifest_path(directory: str) -> str:
+    return f"{directory}/{MANIFEST_NAME}"
+
+def load(directory: str) -> dict:
+    """
+    Ticker -> entry. Empty when there is no manifest or it has another version.
+    """
+    path = manifest_path(directory)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != VERSION:
+        return {}
+    return data["tickers"]
+
+def _write(directory: str, tickers: dict):
+    os.makedirs(directory, exist_ok=True)
+    path = manifest_path(directory)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": VERSION, "tickers": tickers}, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def update(directory: str, ticker: str, change) -> dict:
+    """
+    Read-modify-write of one entry: `change` receives the current entry (empty
+    dict if none) and returns the new one. Serialised across processes and
+    published with an atomic rename.
+    """
+    with locked(directory):
+        tickers = load(directory)
+        entry = change(dict(tickers.get(ticker, {})))
+        tickers[ticker] = entry
+        _write(directory, tickers)
+        return entry
+
+def replace(directory: str, tickers: dict):
+    with locked(directory):
+        _write(directory, tickers)
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def chain_hash(previous: str | None, part: str) -> str:
+    """
+    Hash of a sequence of appended parts, updated one part at a time.
+    """
+    return hashlib.sha256(f"{previous or ''}:{part}".encode()).hexdigest()[:16]
+
+def encode_timestamp(value) -> str | None:
+    return value.isoformat() if value is not None else None
+
+def decode_timestamp(value: str | None, time_zone: str | None = None):
+    """
+    Back to a datetime in the column's own time zone, so it compares against
+    the stored `date` column directly.
+    """
+    if value is None:
+        return None
+    timestamp = datetime.fromisoformat(value)
+    return timestamp.astimezone(ZoneInfo(time_zone)) if time_zone else timestamp
+
+def entry_timestamp(entry: dict):
+    return decode_timestamp(entry.get("last_timestamp"), entry.get("time_zone"))
+
+def fingerprint(source_hash: str | None, params=None, version: int = 0) -> str:
+    payload = json.dumps({"source": source_hash, "params": params, "version": version}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+def file_entry(path: str, last_timestamp=None, time_zone: str | None = None, rows: int = 0,
+               source_hash: str | None = None, params=None, version: int = 0) -> dict:
+    """
+    Entry for a stage output written as one file.
+    """
+    return {
+        "last_timestamp": encode_timestamp(last_timestamp),
+        "time_zone": time_zone,
+        "rows": rows,
+        "bytes": os.path.getsize(path),
+        "hash": file_hash(path),
+        "source_hash": source_hash,
+        "fingerprint": fingerprint(source_hash, params, version),
+    }
+
+def changed(source: dict, target: dict, tickers=None, params=None, version: int = 0) -> list[str]:
+    """
+    Tickers whose target is missing or was built from another input, other
+    parameters or another code version. `params` may be a function of the
+    ticker for per-ticker parameters.
+    """
+    tickers = sorted(source) if tickers is None else tickers
+    params_of = params if callable(params) else (lambda _: params)
+    return [
+        t for t in tickers
+        if t in source
+        and target.get(t, {}).get("fingerprint") != fingerprint(source[t].get("hash"), params_of(t), version)
+    ]
@@ -0,0 +1,112 @@
+import json
+import os
+import numpy as np
+import xgboost as xgb
+
+# One primary and one meta booster for the whole universe, trained on every
+# ticker's features stacked together (see train.train_pooled). The ticker
+# and its sector are two extra categorical inputs, so the trees can still
+# split on them where a name behaves differently from the pool.
+#
+# Everything lives in a single JSON artifact: both boosters, the feature
+# list and the ticker/sector code tables. The API loads it once instead of
+# two boosters per ticker, and scores any batch of tickers with one predict
+# call per booster. A ticker the pool has not seen gets missing codes and
+# falls down the trees' default branches.
+#
+# This module is imported by the API as well, so it must not import other
+# pipeline modules.
+
+ARTIFACT_NAME = "pooled_model.json"
+ARTIFACT_VERSION = 1
+UNKNOWN_SECTOR = "Unknown"
+CODE_COLS = ["ticker_code", "sector_code"]
+
+def encodings(tickers, sectors: dict) -> tuple[dict, dict]:
+    """
+    Stable integer codes for tickers and their sectors.
+    """
+    ticker_codes = {t: i for i, t in enumerate(sorted(tickers))}
+    names = sorted({sectors.get(t) or UNKNOWN_SECTOR for t in tickers})
+    return ticker_codes, {name: i for i, name in enumerate(names)}
+
+class PooledModel:
+    def __init__(self, primary, meta, features, tickers, sectors, sector_codes, fingerprint=None):
+        self.primary = primary
+        self.meta = meta
+        self.features = list(features)
+        self.tickers = dict(tickers)
+        self.sectors = dict(sectors)
+        self.sector_codes = dict(sector_codes)
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def feature_types(features) -> list[str]:
+        return ["q"] * len(features) + ["c"] * len(CODE_COLS)
+
+    def codes(self, tickers) -> np.ndarray:
+        """
+        (ticker_code, sector_code) per ticker, NaN where unknown.
+        """
+        rows = []
+        for ticker in tickers:
+            sector = self.sectors.get(ticker, UNKNOWN_SECTOR)
+            rows.append([self.tickers.get(ticker, np.nan), self.sector_codes.get(sector, np.nan)])
+        return np.array(rows, dtype=float).reshape(-1, len(CODE_COLS))
+
+    def predict(self, tickers, features) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Primary and meta probabilities for rows of FEATURE_COLS, one row per
+        entry of `tickers`.
+        """
+        X = np.hstack([np.asarray(features, dtype=float).reshape(len(tickers), -1), self.codes(tickers)])
+        primary_probs = self.primary.inplace_predict(X)
+        meta_probs = self.meta.inplace_predict(np.hstack([X, primary_probs.reshape(-1, 1)]))
+        return primary_probs, meta_probs
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        artifact = {
+            "version": ARTIFACT_VERSION,
+            "features": self.features,
+            "tickers": self.tickers,
+            "sectors": self.sectors,
+            "sector_codes": self.sector_codes,
+            "fingerprint": self.fingerprint,
+            "primary": json.loads(self.primary.save_raw("json")),
+            "meta": json.loads(self.meta.save_raw("json")),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(artifact, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "PooledModel":
+        with open(path) as f:
+            artifact = json.load(f)
+        if artifact.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported pooled model version {artifact.get('version')} at {path}")
+
+        def booster(model):
+            b = xgb.Booster()
+            b.load_model(bytearray(json.dumps(model).encode()))
+            return b
+
+        return cls(
+            booster(artifact["primary"]), booster(artifact["meta"]), artifact["features"],
+            artifact["tickers"], artifact["sectors"], artifact["sector_codes"], artifact.get("fingerprint"),
+        )
+
+def read_fingerprint(path: str):
+    """
+    Fingerprint of an existing artifact without loading its boosters' trees
+    into XGBoost.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            return json.load(f).get("fingerprint")
+    except (OSError, ValueError):
+        return None
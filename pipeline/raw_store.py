@@ -0,0 +1,329 @@
+import polars as pl
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import manifest
+
+# Append-only raw bar lake, hive partitioned by ticker and calendar month:
+#
+#   <root>/ticker=AAPL/month=2024-05/part-<time_ns>-<id>.parquet
+#
+# Ingestion appends each delta as a new fragment, so a write costs the size
+# of the delta instead of the ticker's history. Fragment names sort in write
+# order; readers deduplicate on (ticker, date) keeping the newest row, and
+# compaction folds the fragments of a month into one. Only months where an
+# append rewrote stored dates hold duplicates, so only those are compacted.
+#
+# Every append and compaction also updates <root>/_manifest.json (see
+# manifest.py): last timestamp, rows (distinct dates, so overlaps are not
+# counted twice), bytes, a hash chained over the appended fragments and the
+# `overlaps` months waiting for compaction. Compaction leaves the hash alone
+# since the content it represents does not change.
+
+RAW_DIR = "./data/raw"
+CHANGES_NAME = "_changes.json"
+HIVE_SCHEMA = {"ticker": pl.String, "month": pl.String}
+MIN_FRAGMENTS = 2
+COMPACT_WORKERS = 4
+
+def ticker_dir(ticker: str, root: str = RAW_DIR) -> str:
+    return f"{root}/ticker={ticker}"
+
+def month_dir(ticker: str, month: str, root: str = RAW_DIR) -> str:
+    return f"{ticker_dir(ticker, root)}/month={month}"
+
+def fragment_name() -> str:
+    return f"part-{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.parquet"
+
+def fragments(directory: str) -> list[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(f"{directory}/{f}" for f in os.listdir(directory) if f.endswith(".parquet"))
+
+def write_fragment(df: pl.DataFrame, path: str):
+    """
+    Writes next to the target and renames, so readers never see a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    df.write_parquet(tmp_path, compression="snappy")
+    os.replace(tmp_path, path)
+
+def list_tickers(root: str = RAW_DIR) -> list[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(d[len("ticker="):] for d in os.listdir(root) if d.startswith("ticker="))
+
+def list_months(ticker: str, root: str = RAW_DIR) -> list[str]:
+    directory = ticker_dir(ticker, root)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(d[len("month="):] for d in os.listdir(directory) if d.startswith("month="))
+
+def stored_dates(df: pl.DataFrame, ticker: str, root: str = RAW_DIR) -> pl.DataFrame:
+    """
+    Rows of `df` (with a `month` column) whose date is already stored. Only
+    rows up to the manifest's last timestamp can be, and only their months
+    are read.
+    """
+    last = latest_timestamp(ticker, root)
+    if last is None:
+        return df.clear()
+    older = df.filter(pl.col("date") <= last)
+    files = [f for month in older["month"].unique().to_list() for f in fragments(month_dir(ticker, month, root))]
+    if not files:
+        return df.clear()
+    stored = (
+        pl.scan_parquet(files)
+        .filter(pl.col("date").is_between(older["date"].min(), older["date"].max()))
+        .select("date").unique().collect()
+    )
+    return older.join(stored, on="date", how="semi")
+
+def append(df: pl.DataFrame, ticker: str, root: str = RAW_DIR) -> int:
+    """
+    Appends rows as one new fragment per month touched and records them in
+    the manifest, counting only dates not stored yet and marking the months
+    where stored dates are rewritten for compaction. The ticker lives in the
+    partition path, so a `ticker` column is dropped. Returns rows written.
+    """
+    if df.height == 0:
+        return 0
+
+    df = df.drop("ticker", strict=False).with_columns(pl.col("date").dt.strftime("%Y-%m").alias("month"))
+    overlap = stored_dates(df, ticker, root)
+    paths = []
+    for (month,), part in df.partition_by("month", as_dict=True, maintain_order=True).items():
+        path = f"{month_dir(ticker, month, root)}/{fragment_name()}"
+        write_fragment(part.drop("month"), path)
+        paths.append(path)
+
+    last = df["date"].max()
+    def record(entry):
+        previous = manifest.entry_timestamp(entry)
+        entry["last_timestamp"] = manifest.encode_timestamp(last if previous is None else max(previous, last))
+        entry["time_zone"] = df.schema["date"].time_zone
+        entry["rows"] = entry.get("rows", 0) + df.height - overlap.height
+        entry["overlaps"] = sorted(set(entry.get("overlaps", [])) | set(overlap["month"].to_list()))
+        entry["bytes"] = entry.get("bytes", 0) + sum(os.path.getsize(p) for p in paths)
+        for path in paths:
+            entry["hash"] = manifest.chain_hash(entry.get("hash"), manifest.file_hash(path))
+        return entry
+
+    manifest.update(root, ticker, record)
+    return df.height
+
+def scan(root: str = RAW_DIR) -> pl.LazyFrame:
+    """
+    Lazy view of the whole lake with `ticker` and `month` partition columns;
+    filters on them prune fragments before any file is opened. Rows are raw
+    fragments, so an overlap that has not been compacted yet may appear
+    twice: use deduplicate() (or read_ticker) where that matters.
+    """
+    return pl.scan_parquet(
+        f"{root}/ticker=*/month=*/*.parquet", hive_partitioning=True, hive_schema=HIVE_SCHEMA,
+    )
+
+def deduplicate(lf: pl.LazyFrame) -> pl.LazyFrame:
+    """
+    One row per (ticker, date), the most recently written one wins.
+    """
+    return lf.unique(subset=["ticker", "date"], keep="last", maintain_order=True).sort(["ticker", "date"])
+
+def read_tickers(tickers, root: str = RAW_DIR) -> pl.DataFrame:
+    if not list_tickers(root):
+        return pl.DataFrame()
+    lf = scan(root).filter(pl.col("ticker").is_in(list(tickers)))
+    return deduplicate(lf).drop("month").collect()
+
+def read_ticker(ticker: str, root: str = RAW_DIR) -> pl.DataFrame:
+    return read_tickers([ticker], root)
+
+def read_since(since: dict, root: str = RAW_DIR) -> pl.DataFrame:
+    """
+    Rows newer than a per-ticker watermark ({ticker: timestamp or None for
+    the full history}), deduplicated. Month partitions older than the
+    watermark are pruned, so the read is proportional to the delta.
+    """
+    if not since or not list_tickers(root):
+        return pl.DataFrame()
+
+    condition = None
+    for ticker, start in since.items():
+        term = pl.col("ticker") == ticker
+        if start is not None:
+            term = term & (pl.col("month") >= start.strftime("%Y-%m")) & (pl.col("date") > start)
+        condition = term if condition is None else condition | term
+
+    return deduplicate(scan(root).filter(condition)).drop("month").collect()
+
+def read_month(ticker: str, month: str, since=None, root: str = RAW_DIR) -> pl.DataFrame:
+    """
+    One month of a ticker, deduplicated and sorted, optionally only rows
+    newer than `since`. A date belongs to exactly one month, so reading a
+    history month by month yields the same rows as read_ticker.
+    """
+    files = fragments(month_dir(ticker, month, root))
+    if not files:
+        return pl.DataFrame()
+    lf = pl.scan_parquet(files)
+    if since is not None:
+        lf = lf.filter(pl.col("date") > since)
+    return lf.unique(subset=["date"], keep="last", maintain_order=True).sort("date").collect()
+
+def entries(root: str = RAW_DIR) -> dict:
+    """
+    Manifest entries by ticker; no data file is opened.
+    """
+    return manifest.load(root)
+
+def latest_timestamp(ticker: str, root: str = RAW_DIR):
+    """
+    Last stored bar according to the manifest.
+    """
+    return manifest.entry_timestamp(entries(root).get(ticker, {}))
+
+def scan_latest_timestamp(ticker: str, root: str = RAW_DIR):
+    """
+    Last stored bar read from the newest month partition.
+    """
+    months = list_months(ticker, root)
+    if not months:
+        return None
+    files = fragments(month_dir(ticker, months[-1], root))
+    if not files:
+        return None
+    return pl.scan_parquet(files).select(pl.col("date").max()).collect().item()
+
+def compact_month(ticker: str, month: str, root: str = RAW_DIR, min_fragments: int = MIN_FRAGMENTS) -> bool:
+    """
+    Merges the fragments of one month into a single deduplicated, sorted
+    fragment. The result replaces the newest merged fragment, so it still
+    sorts before anything appended meanwhile. Returns True if it compacted.
+    """
+    files = fragments(month_dir(ticker, month, root))
+    if len(files) < min_fragments:
+        return False
+
+    old_bytes = sum(os.path.getsize(p) for p in files)
+    merged = (
+        pl.scan_parquet(files)
+        .unique(subset=["date"], keep="last", maintain_order=True)
+        .sort("date")
+        .collect()
+    )
+    write_fragment(merged, files[-1])
+    for path in files[:-1]:
+        os.remove(path)
+
+    def record(entry):
+        entry["bytes"] = entry.get("bytes", 0) + os.path.getsize(files[-1]) - old_bytes
+        entry["overlaps"] = [m for m in entry.get("overlaps", []) if m != month]
+        return entry
+
+    manifest.update(root, ticker, record)
+    return True
+
+def compact(ticker: str, root: str = RAW_DIR, min_fragments: int = MIN_FRAGMENTS, months=None) -> int:
+    """
+    Compacts `months` of a ticker, by default the ones the manifest marks
+    as holding overlapping fragments. Returns months merged.
+    """
+    if months is None:
+        months = entries(root).get(ticker, {}).get("overlaps", [])
+    return sum(compact_month(ticker, month, root, min_fragments) for month in months)
+
+def compact_all(root: str = RAW_DIR, tickers=None, min_fragments: int = MIN_FRAGMENTS,
+                max_workers: int = COMPACT_WORKERS) -> int:
+    """
+    Compacts the overlapping months of every ticker on a small thread pool.
+    Tickers never share a partition, so they can be compacted concurrently.
+    Returns months merged.
+    """
+    tickers = list_tickers(root) if tickers is None else tickers
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return sum(pool.map(lambda t: compact(t, root, min_fragments), tickers))
+
+def rebuild_manifest(root: str = RAW_DIR) -> dict:
+    """
+    Recomputes the manifest from the fragments on disk, for lakes written
+    before it existed or after manual edits. Hashes are chained over the
+    fragments as they are now, so a compacted ticker gets a new hash and is
+    rebuilt once downstream.
+    """
+    tickers = {}
+    for ticker in list_tickers(root):
+        by_month = {month: fragments(month_dir(ticker, month, root)) for month in list_months(ticker, root)}
+        files = [f for month_files in by_month.values() for f in month_files]
+        if not files:
+            continue
+        counts = {
+            month: pl.scan_parquet(month_files).select(pl.len(), pl.col("date").n_unique()).collect().row(0)
+            for month, month_files in by_month.items() if month_files
+        }
+        last = scan_latest_timestamp(ticker, root)
+        entry = {
+            "last_timestamp": manifest.encode_timestamp(last),
+            "time_zone": pl.scan_parquet(files[-1]).collect_schema()["date"].time_zone,
+            "rows": sum(unique for _, unique in counts.values()),
+            "bytes": sum(os.path.getsize(p) for p in files),
+            "hash": None,
+            "overlaps": sorted(month for month, (rows, unique) in counts.items() if rows > unique),
+        }
+        for path in files:
+            entry["hash"] = manifest.chain_hash(entry["hash"], manifest.file_hash(path))
+        tickers[ticker] = entry
+
+    manifest.replace(root, tickers)
+    return tickers
+
+def ensure_manifest(root: str = RAW_DIR) -> bool:
+    """
+    Rebuilds the manifest if some ticker in the lake is missing from it.
+    """
+    if set(list_tickers(root)) <= set(entries(root)):
+        return False
+    rebuild_manifest(root)
+    return True
+
+def write_changes(changes: dict, root: str = RAW_DIR):
+    """
+    Publishes the change set of the last ingest run: {ticker: {"rows",
+    "start", "end"}} for every ticker that received new bars.
+    """
+    os.makedirs(root, exist_ok=True)
+    path = f"{root}/{CHANGES_NAME}"
+    with open(f"{path}.tmp", "w") as f:
+        json.dump({"tickers": changes}, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+def read_changes(root: str = RAW_DIR) -> dict:
+    path = f"{root}/{CHANGES_NAME}"
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["tickers"]
+
+def migrate_flat_files(root: str = RAW_DIR) -> int:
+    """
+    Moves legacy <root>/<ticker>.parquet files into the partitioned layout.
+    """
+    if not os.path.isdir(root):
+        return 0
+
+    flat = sorted(f for f in os.listdir(root) if f.endswith(".parquet"))
+    for f in flat:
+        path = f"{root}/{f}"
+        append(pl.read_parquet(path), f[:-len(".parquet")], root)
+        os.remove(path)
+    return len(flat)
+
+if __name__ == "__main__":
+    root = sys.argv[1] if len(sys.argv) > 1 else RAW_DIR
+    migrated = migrate_flat_files(root)
+    ensure_manifest(root)
+    merged = compact_all(root)
+    print(f"Migrated {migrated} flat files, compacted {merged} month partitions.")
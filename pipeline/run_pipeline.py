@@ -1,57 +1,212 @@
-import subprocess
+import argparse
+import threading
 import time
-import sys
-import os
-
-# Define the sequence of scripts to run
-PIPELINE_STEPS = [
-    ("Ingestion", "ingest.py"),
-    ("Transformation (Dollar Bars)", "transform_dollar_bars.py"),
-    ("Labeling (Triple Barrier)", "labeling.py"),
-    ("Feature Engineering", "feature_engineering.py"),
-    ("Training (XGBoost)", "train.py")
-]
-
-def run_step(step_name, script_name):
-    print(f"\n========================================")
-    print(f"STARTING: {step_name}")
-    print(f"========================================")
-    start_time = time.time()
-    
-    # We run the script as a separate process
-    # sys.executable ensures we use the same python interpreter
-    try:
-        result = subprocess.run(
-            [sys.executable, script_name], 
-            check=True, # Raises error if script fails
-            capture_output=False # Let the script print to console
+import polars as pl
+
+import dag
+import manifest
+import raw_store
+import ingest
+import transform_dollar_bars
+import labeling
+import feature_engineering
+import train
+from utils import TokenBucket
+
+# The whole pipeline in one process: each ticker runs through
+# ingest -> transform -> label -> features -> train as soon as its previous
+# stage is done (see dag.py). Frames are handed to the next stage in memory
+# unless they are larger than MAX_FRAME_BYTES or were streamed to disk under
+# the stage's memory ceiling (see streaming.py); every stage checkpoints its
+# output by default, so downstream manifests and the API keep working and an
+# interrupted run can be resumed with --resume.
+#
+# With --changed-only (the scheduler's hourly mode) the downstream stages run
+# only for tickers whose ingest added bars in this run, without consulting the
+# manifests; tickers left stale by a parameter change or an earlier failure
+# are caught up by the next default run, which the scheduler does once a day.
+# Tickers already holding the last closed session's bars are not fetched at
+# all, so a no-op hour outside market hours touches nothing but the manifests.
+#
+# With --pooled (or USE_POOLED_MODEL) the per-ticker train stage is skipped
+# and the single pooled model is retrained once the DAG is done, if any
+# ticker's features changed.
+
+WORKERS = 4
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+JOURNAL_PATH = "./data/pipeline_journal.jsonl"
+STAGE_NAMES = ["ingest", "transform", "label", "features", "train"]
+
+def fits(frame):
+    """
+    Whether to hand a stage's output to the next stage in memory. Streamed
+    outputs come back as lazy scans of the written file and never are.
+    """
+    return isinstance(frame, pl.DataFrame) and frame.estimated_size() <= MAX_FRAME_BYTES
+
+def streamed(frame):
+    return isinstance(frame, pl.LazyFrame)
+
+def stale_sets(d_table) -> dict:
+    """
+    Tickers each stage would rebuild according to the manifests.
+    """
+    raw_entries = raw_store.entries(transform_dollar_bars.RAW_DIR)
+    bars = manifest.load(transform_dollar_bars.PROCESSED_DIR)
+    labeled = manifest.load(labeling.LABELED_DIR)
+    features = manifest.load(feature_engineering.FEATURES_DIR)
+    return {
+        "ingest": set(),
+        "transform": set(manifest.changed(
+            raw_entries, bars, params=transform_dollar_bars.bar_params(),
+            version=transform_dollar_bars.STAGE_VERSION,
+        )),
+        "label": set(manifest.changed(
+            bars, labeled, params=labeling.label_params(), version=labeling.STAGE_VERSION,
+        )),
+        "features": set(manifest.changed(
+            labeled, features,
+            params=lambda t: feature_engineering.feature_params(d_table.get(t, feature_engineering.FRAC_DIFF_D)),
+            version=feature_engineering.STAGE_VERSION,
+        )),
+        "train": set(manifest.changed(
+            features, manifest.load(train.MODEL_DIR), params=train.train_params(), version=train.STAGE_VERSION,
+        )),
+    }
+
+def build_stages(tickers, checkpoint=True, source=None, changed_only=False, changes=None, pooled=False):
+    """
+    Stage callables for the DAG runner. Which tickers each stage considers
+    stale is decided once from the manifests (not at all when changed_only);
+    on top of that, a stage always runs when its upstream changed during this
+    run. Ingest records {ticker: {"rows", "start", "end"}} into `changes`,
+    also for ingest tasks resumed from the journal.
+    With `pooled` no per-ticker model is trained.
+    """
+    ingest.ensure_directories()
+    raw_store.migrate_flat_files(ingest.DATA_DIR)
+    raw_store.ensure_manifest(ingest.DATA_DIR)
+
+    source = source or ingest.YFinanceSource()
+    limiter = TokenBucket(ingest.REQUESTS_PER_SECOND, ingest.BURST)
+    d_lock = threading.Lock()
+    d_table = feature_engineering.load_frac_diff_d()
+    train_tickers = set() if pooled else set(train.select_tickers(sorted(tickers)))
+
+    changes = {} if changes is None else changes
+    stale = {name: set() for name in STAGE_NAMES} if changed_only else stale_sets(d_table)
+
+    def needed(stage, ticker, upstream):
+        return upstream.changed or ticker in stale[stage]
+
+    def run_ingest(ticker, upstream):
+        row = ingest.ingest_ticker(ticker, source, limiter)
+        if row["status"] == "failed":
+            raise RuntimeError(row["error"])
+        if row["status"] != "updated":
+            return dag.Output()
+        changes[ticker] = {k: row[k] for k in ("rows", "start", "end")}
+        return dag.Output(changed=True, details=changes[ticker])
+
+    def restore_ingest(ticker, details):
+        if details is not None:
+            changes[ticker] = details
+
+    def run_transform(ticker, upstream):
+        if not needed("transform", ticker, upstream):
+            return dag.Output()
+        bars = transform_dollar_bars.process_ticker(ticker)
+        return dag.Output(bars if fits(bars) else None, changed=bars is not None)
+
+    def run_label(ticker, upstream):
+        if not needed("label", ticker, upstream):
+            return dag.Output()
+        labeled_df = labeling.label_ticker(ticker, df=upstream.frame, save=False)
+        if not streamed(labeled_df) and (checkpoint or not fits(labeled_df)):
+            labeling.save_labels(labeled_df, ticker)
+        return dag.Output(labeled_df if fits(labeled_df) else None, changed=True)
+
+    def run_features(ticker, upstream):
+        if not needed("features", ticker, upstream):
+            return dag.Output()
+        with d_lock:
+            if ticker not in d_table:
+                frames = {ticker: upstream.frame} if upstream.frame is not None else None
+                d_table.update(feature_engineering.search_frac_diff_d([ticker], frames))
+        d = d_table.get(ticker, feature_engineering.FRAC_DIFF_D)
+        features_df = feature_engineering.process_ticker(ticker, {ticker: d}, df=upstream.frame, save=False)
+        if features_df is None:
+            return dag.Output()
+        if not streamed(features_df) and (checkpoint or not fits(features_df)):
+            feature_engineering.save_features(features_df, ticker, d)
+        return dag.Output(features_df if fits(features_df) else None, changed=True)
+
+    def run_train(ticker, upstream):
+        if ticker not in train_tickers or not needed("train", ticker, upstream):
+            return dag.Output()
+        train.train_ticker(ticker, df=upstream.frame)
+        return dag.Output(changed=True)
+
+    return [
+        dag.Stage("ingest", run_ingest, restore=restore_ingest),
+        dag.Stage("transform", run_transform),
+        dag.Stage("label", run_label, checkpoint=checkpoint),
+        dag.Stage("features", run_features, checkpoint=checkpoint),
+        dag.Stage("train", run_train),
+    ]
+
+def summarize(report):
+    summary = (
+        report.group_by("stage")
+        .agg(
+            (pl.col("status") == "ok").sum().alias("ok"),
+            pl.col("changed").sum().alias("changed"),
+            (pl.col("status") == "failed").sum().alias("failed"),
+            (pl.col("status") == "resumed").sum().alias("resumed"),
+            pl.col("seconds").sum().alias("seconds"),
         )
-        duration = time.time() - start_time
-        print(f"FINISHED: {step_name} in {duration:.2f} seconds.")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"FAILED: {step_name} failed with exit code {e.returncode}.")
-        return False
-    except Exception as e:
-        print(f"ERROR: Could not run {step_name}: {e}")
-        return False
-
-def main():
-    
+        .with_columns(pl.col("stage").replace_strict({n: i for i, n in enumerate(STAGE_NAMES)}, default=99).alias("order"))
+        .sort("order")
+        .drop("order")
+    )
+    print(summary)
+    for row in report.filter(pl.col("status") == "failed").iter_rows(named=True):
+        print(f"   FAILED {row['stage']} {row['ticker']}: {row['error']}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the per-ticker pipeline in-process.")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--resume", action="store_true", help="skip tasks completed by the last (interrupted) run")
+    parser.add_argument("--no-checkpoint", action="store_true",
+                        help="keep labels and features in memory only (written when too large)")
+    parser.add_argument("--changed-only", action="store_true",
+                        help="run the downstream stages only for tickers that received new bars")
+    parser.add_argument("--pooled", action="store_true", default=train.POOLED,
+                        help="train one pooled model instead of one per ticker")
+    args = parser.parse_args(argv)
+
     total_start = time.time()
-    
-    for name, script in PIPELINE_STEPS:
-        if not os.path.exists(script):
-            print(f"ERROR: Script {script} not found!")
-            sys.exit(1)
-            
-        success = run_step(name, script)
-        if not success:
-            print("\n PIPELINE ABORTED DUE TO ERROR.")
-            sys.exit(1)
-            
+    tickers = ingest.get_sp500_tickers()
+    changes = {}
+    stages = build_stages(
+        tickers, checkpoint=not args.no_checkpoint, changed_only=args.changed_only, changes=changes, pooled=args.pooled,
+    )
+    runner = dag.Runner(stages, workers=args.workers, journal_path=JOURNAL_PATH)
+
+    print(f"Running the pipeline for {len(tickers)} tickers on {args.workers} workers...")
+    report = runner.run(tickers, resume=args.resume)
+    summarize(report)
+    if args.pooled:
+        train.train_pooled(tickers)
+    raw_store.write_changes(changes, ingest.DATA_DIR)
+    print(f"{len(changes)} tickers received new bars.")
+
+    compacted = raw_store.compact_all(ingest.DATA_DIR, tickers=sorted(changes))
+    print(f"Compacted {compacted} month partitions.")
+
     total_time = time.time() - total_start
-    print(f"\n PIPELINE COMPLETED SUCCESSFULLY in {total_time:.2f} seconds. ")
+    print(f"\n PIPELINE COMPLETED in {total_time:.2f} seconds. ")
+    return report
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,130 @@
+import math
+import os
+import shutil
+import polars as pl
+
+# Bounded-memory execution for the per-ticker stages.
+#
+# Each stage has a memory ceiling (PIPELINE_MEMORY_LIMIT, or
+# PIPELINE_MEMORY_LIMIT_<STAGE> for one stage). A ticker whose input fits
+# under it is processed in one frame as before; a larger one is read in
+# chunks of rows sized to the ceiling and its output is written chunk by
+# chunk, then merged into the usual single file with a streaming
+# sink_parquet, so no stage ever holds the whole history.
+#
+# Computations that look back (EWMs, fractional differences, lags) get the
+# last `context` rows of the previous chunk in front of each chunk, and ones
+# that look ahead (label horizons) get the next `lookahead` rows after it;
+# only the chunk's own rows are kept. For the recursive EWMs the context is
+# long enough for the truncated weights to fall below double precision, so
+# chunked output matches a single pass to double precision.
+#
+# The ceiling applies per task: a stage running N workers peaks at about N
+# times the ceiling.
+
+MEMORY_LIMIT_ENV = "PIPELINE_MEMORY_LIMIT"
+MEMORY_LIMIT = "1GB"
+# Working copies of a chunk held at once (input frame, numpy views, output).
+COPIES = 4
+MIN_CHUNK_ROWS = 64
+
+UNITS = {"KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+def parse_size(text) -> int:
+    """
+    Bytes from an int or a string such as "512MB" or "2GB".
+    """
+    if isinstance(text, int):
+        return text
+    text = str(text).strip().upper()
+    for unit, factor in UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(text)
+
+def memory_limit(stage: str) -> int:
+    value = os.environ.get(f"{MEMORY_LIMIT_ENV}_{stage.upper()}") or os.environ.get(MEMORY_LIMIT_ENV, MEMORY_LIMIT)
+    return parse_size(value)
+
+def row_bytes(schema) -> int:
+    return sum(8 if dtype.is_numeric() or dtype.is_temporal() else 16 for dtype in schema.values()) or 1
+
+def chunk_rows(schema, limit: int) -> int:
+    return max(MIN_CHUNK_ROWS, limit // (row_bytes(schema) * COPIES))
+
+def fits(rows: int, schema, limit: int) -> bool:
+    return rows * row_bytes(schema) * COPIES <= limit
+
+def ewm_warmup(span: float) -> int:
+    """
+    Rows after which an EWM of this span no longer depends on earlier rows
+    at double precision.
+    """
+    decay = 1.0 - 2.0 / (span + 1.0)
+    return 2 * math.ceil(math.log(2.0 ** -53) / math.log(decay))
+
+def scan(path: str) -> tuple[pl.LazyFrame, int, pl.Schema]:
+    lf = pl.scan_parquet(path)
+    return lf, lf.select(pl.len()).collect().item(), lf.collect_schema()
+
+def batches(lf: pl.LazyFrame, rows: int, size: int, context: int = 0, lookahead: int = 0):
+    """
+    Yields (frame, offset, start, stop) for consecutive chunks of `size`
+    rows: frame holds up to `context` rows before the chunk and `lookahead`
+    rows after it, frame[start:stop] are the chunk's own rows and offset is
+    the position of frame's first row in the whole input.
+    """
+    for first in range(0, rows, size):
+        offset = max(0, first - context)
+        last = min(rows, first + size + lookahead)
+        frame = lf.slice(offset, last - offset).collect()
+        yield frame, offset, first - offset, min(rows, first + size) - offset
+
+class Sink:
+    """
+    Collects a stage's output chunk by chunk in part files next to `path`
+    and merges them into `path` with a streaming sink_parquet. An optional
+    lazy `prefix` (e.g. the existing rows being appended to) goes first.
+    """
+    def __init__(self, path: str, prefix: pl.LazyFrame | None = None):
+        self.path = path
+        self.prefix = prefix
+        self.directory = f"{path}.parts"
+        self.parts = []
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory)
+
+    def write(self, df: pl.DataFrame):
+        if df.height == 0:
+            return
+        part = f"{self.directory}/part-{len(self.parts):06d}.parquet"
+        df.write_parquet(part)
+        self.parts.append(part)
+
+    def discard(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def finish(self) -> pl.LazyFrame:
+        """
+        Writes `path` and returns a lazy scan of it.
+        """
+        sources = [self.prefix] if self.prefix is not None else []
+        if self.parts:
+            sources.append(pl.scan_parquet(self.parts))
+        tmp_path = f"{self.path}.tmp"
+        pl.concat(sources).sink_parquet(tmp_path, compression="snappy")
+        os.replace(tmp_path, self.path)
+        self.discard()
+        return pl.scan_parquet(self.path)
+
+def describe(lf: pl.LazyFrame, column: str = "timestamp") -> dict:
+    """
+    Row count, last timestamp and time zone of a (written) output, for its
+    manifest entry.
+    """
+    stats = lf.select(pl.len().alias("rows"), pl.col(column).max().alias("last")).collect()
+    return {
+        "rows": stats["rows"].item(),
+        "last_timestamp": stats["last"].item(),
+        "time_zone": lf.collect_schema()[column].time_zone,
+    }
@@ -0,0 +1,30 @@
+import polars as pl
+import numpy as np
+import datetime as dt
+import pytest
+
+def make_raw_bars(n, ticker="AAA", start=dt.datetime(2024, 1, 2, 9), seed=None, close=100.0):
+    """
+    n hourly bars in the raw schema from `start`. Without a seed the close
+    rises by one per bar from `close` on a flat volume; with one both are
+    drawn at random.
+    """
+    if seed is None:
+        closes = close + np.arange(n, dtype=float)
+        volume = np.full(n, 1000.0)
+    else:
+        rng = np.random.default_rng(seed)
+        closes = close * np.exp(np.cumsum(rng.normal(scale=0.01, size=n)))
+        volume = rng.integers(1_000, 50_000, size=n).astype(float)
+    return pl.DataFrame({
+        "date": [start + dt.timedelta(hours=i) for i in range(n)],
+        "open": closes, "high": closes + 1, "low": closes - 1, "close": closes,
+        "volume": volume,
+    }).with_columns(
+        pl.lit(ticker).alias("ticker"),
+        (pl.col("close") * pl.col("volume")).alias("dollar_volume"),
+    )
+
+@pytest.fixture
+def raw_bars():
+    return make_raw_bars
@@ -0,0 +1,54 @@
+import polars as pl
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from backtest import sweep_grid, sweep_universe, RISK_FREE, PERIODS_PER_YEAR
+
+def synthetic_inputs(seed, n):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=n)))
+    return pl.DataFrame({
+        "close": close,
+        "primary_pred": rng.integers(0, 2, size=n),
+        "meta_conf": rng.random(n),
+    }).with_columns((pl.col("close").shift(-1) / pl.col("close") - 1).alias("market_return"))
+
+def reference_metrics(df, threshold):
+    """
+    The frictionless single-variant math of run_backtest.
+    """
+    signal = (df["primary_pred"] == 1) & (df["meta_conf"] > threshold)
+    res = df.with_columns(
+        (pl.col("market_return") * pl.Series(values=signal)).alias("strategy_return")
+    ).drop_nulls()
+    excess = res["strategy_return"] - RISK_FREE
+    cum = (1 + res["strategy_return"]).cum_prod().tail(1).item() - 1
+    return cum, excess.mean() / excess.std() * np.sqrt(PERIODS_PER_YEAR)
+
+def test_sweep_matches_single_backtest():
+    inputs = {"AAA": synthetic_inputs(0, 400), "BBB": synthetic_inputs(1, 250)}
+    grid = sweep_grid(thresholds=[0.5, 0.8], holding=[1, 5], costs=[0.0, 0.001])
+
+    result = sweep_universe(inputs, grid)
+
+    assert result.height == 2 * grid.height
+    assert result.columns[:4] == ["ticker", "threshold", "holding", "cost"]
+
+    for ticker, df in inputs.items():
+        for threshold in [0.5, 0.8]:
+            row = result.filter(
+                (pl.col("ticker") == ticker) & (pl.col("threshold") == threshold)
+                & (pl.col("holding") == 1) & (pl.col("cost") == 0.0)
+            )
+            cum, sharpe = reference_metrics(df, threshold)
+            assert np.isclose(row["cum_return"].item(), cum, rtol=1e-10)
+            assert np.isclose(row["sharpe"].item(), sharpe, rtol=1e-10)
+
+    # Costs only ever take return away; longer holds never trade more often.
+    frictionless = result.filter(pl.col("cost") == 0.0)["cum_return"].to_numpy()
+    with_cost = result.filter(pl.col("cost") == 0.001)["cum_return"].to_numpy()
+    assert np.all(with_cost <= frictionless)
+    assert (result["max_drawdown"] >= 0).all()
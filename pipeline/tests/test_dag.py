@@ -0,0 +1,51 @@
+import polars as pl
+import threading
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import dag
+
+def chain(log, fail=()):
+    lock = threading.Lock()
+
+    def stage(name):
+        def run(ticker, upstream):
+            if (name, ticker) in fail:
+                raise ValueError(f"{name} broke on {ticker}")
+            with lock:
+                log.append((name, ticker, upstream.changed))
+            return dag.Output(frame=pl.DataFrame({"x": [1]}), changed=True)
+        return dag.Stage(name, run)
+
+    return [stage("a"), stage("b"), stage("c")]
+
+def test_tickers_flow_through_before_new_ones_start(tmp_path):
+    log = []
+    runner = dag.Runner(chain(log), workers=1, journal_path=str(tmp_path / "journal.jsonl"))
+    report = runner.run(["T1", "T2", "T3"])
+
+    assert report.height == 9
+    assert (report["status"] == "ok").all()
+    # One worker: each ticker finishes every stage before the next ticker's
+    # first stage is picked up.
+    assert [name for name, _, _ in log[:3]] == ["a", "b", "c"]
+    assert len({ticker for _, ticker, _ in log[:3]}) == 1
+
+def test_failure_skips_downstream_and_resume_reruns_only_the_rest(tmp_path):
+    journal = str(tmp_path / "journal.jsonl")
+    log = []
+    report = dag.Runner(chain(log, fail={("b", "T2")}), workers=2, journal_path=journal).run(["T1", "T2"])
+
+    status = {(r["stage"], r["ticker"]): r["status"] for r in report.iter_rows(named=True)}
+    assert status[("b", "T2")] == "failed"
+    assert status[("c", "T2")] == "skipped"
+    assert status[("c", "T1")] == "ok"
+
+    log.clear()
+    resumed = dag.Runner(chain(log), workers=2, journal_path=journal).run(["T1", "T2"], resume=True)
+    assert sorted((name, ticker) for name, ticker, _ in log) == [("b", "T2"), ("c", "T2")]
+    # The resumed upstream is read from disk but still marked as changed.
+    assert ("b", "T2", True) in log
+    assert (resumed["status"] == "resumed").sum() == 4
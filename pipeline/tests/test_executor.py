@@ -0,0 +1,42 @@
+import functools
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import executor
+
+def record(path, ticker):
+    if ticker == "BAD":
+        raise ValueError("no data")
+    with open(os.path.join(path, ticker), "w") as f:
+        f.write(os.environ.get("POLARS_MAX_THREADS", ""))
+
+def record_batch(path, chunk):
+    if "BAD" in chunk:
+        raise RuntimeError("batch failed")
+    for ticker in chunk:
+        record(path, ticker)
+    return {}
+
+def test_run_stage_reports_in_order_and_falls_back_per_ticker(tmp_path):
+    tickers = ["AAA", "BBB", "BAD", "CCC", "DDD"]
+    report = executor.run_stage(
+        functools.partial(record, str(tmp_path)), tickers,
+        batch_task=functools.partial(record_batch, str(tmp_path)), workers=1, chunk_size=2,
+    )
+
+    assert report["ticker"].to_list() == tickers
+    assert report["status"].to_list() == ["ok", "ok", "failed", "ok", "ok"]
+    assert report.filter(report["ticker"] == "BAD")["error"].item() == "ValueError: no data"
+    assert sorted(os.listdir(tmp_path)) == ["AAA", "BBB", "CCC", "DDD"]
+
+def test_process_pool_splits_the_thread_budget(tmp_path):
+    tickers = [f"T{i}" for i in range(6)] + ["BAD"]
+    report = executor.run_stage(functools.partial(record, str(tmp_path)), tickers, workers=2, chunk_size=2)
+
+    assert report["ticker"].to_list() == tickers
+    assert report["status"].to_list() == ["ok"] * 6 + ["failed"]
+    expected = str(executor.threads_per_worker(2))
+    for ticker in tickers[:-1]:
+        assert (tmp_path / ticker).read_text() == expected
@@ -6,7 +6,11 @@ import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
+import numpy as np
+import quant_engine
+import feature_engineering
 from feature_engineering import calculate_rsi
+from feature_schema import FEATURE_COLS, FRAC_DIFF_GRID, LAGS
 
 def test_rsi_flat_line():
     """
@@ -55,4 +59,143 @@ def test_rsi_downtrend():
     
     # Should be oversold (< 30)
     print(f"Downtrend RSI: {last_rsi}")
-    assert last_rsi < 30.0
\ No newline at end of file
+    assert last_rsi < 30.0
+
+def test_process_universe_matches_per_ticker(tmp_path, monkeypatch):
+    """
+    The batched FFD pass must write the same features as the per-ticker path,
+    including the per-ticker d chosen by the minimum-d search.
+    """
+    labeled = tmp_path / "labeled"
+    features = tmp_path / "features"
+    labeled.mkdir()
+    features.mkdir()
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(labeled))
+    monkeypatch.setattr(feature_engineering, "FEATURES_DIR", str(features))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(tmp_path / "frac_diff_d.parquet"))
+
+    rng = np.random.default_rng(7)
+    for ticker, n in [("AAA", 400), ("BBB", 30), ("CCC", 1200)]:
+        close = 100.0 + np.cumsum(rng.normal(size=n))
+        pl.DataFrame({"close": close}).write_parquet(labeled / f"{ticker}_db.parquet")
+
+    feature_engineering.search_frac_diff_d(["AAA", "CCC"])
+    feature_engineering.process_universe(["AAA", "BBB", "CCC"])
+    batched = {t: pl.read_parquet(features / f"{t}_features.parquet") for t in ["AAA", "BBB", "CCC"]}
+
+    for ticker, expected in batched.items():
+        feature_engineering.process_ticker(ticker)
+        single = pl.read_parquet(features / f"{ticker}_features.parquet")
+        pl_test.assert_frame_equal(single, expected)
+
+def test_min_d_search_picks_smallest_stationary_d(tmp_path, monkeypatch):
+    """
+    White noise passes at the smallest d on the grid; a random walk needs
+    more differencing, and the chosen d is the first grid value that passes
+    the ADF test.
+    """
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(tmp_path / "frac_diff_d.parquet"))
+
+    rng = np.random.default_rng(2)
+    walk = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=2000)))
+    noise = 100.0 + rng.normal(size=2000)
+    pl.DataFrame({"close": walk}).write_parquet(tmp_path / "WALK_db.parquet")
+    pl.DataFrame({"close": noise}).write_parquet(tmp_path / "NOISE_db.parquet")
+
+    found = feature_engineering.search_frac_diff_d(["WALK", "NOISE"])
+    table = pl.read_parquet(tmp_path / "frac_diff_d.parquet")
+    d = feature_engineering.load_frac_diff_d()
+    assert found == d
+
+    assert d["NOISE"] == FRAC_DIFF_GRID[0] > 0.0
+    assert 0.0 < d["WALK"] < 1.0
+    assert table["stationary"].all()
+
+    grid = quant_engine.min_ffd_d([walk], FRAC_DIFF_GRID)
+    passing = grid["adf"][0] < grid["critical"][0]
+    assert d["WALK"] == FRAC_DIFF_GRID[int(np.argmax(passing))]
+
+def test_min_d_table_is_searched_again_when_the_grid_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(tmp_path / "frac_diff_d.parquet"))
+    walk = 100.0 * np.exp(np.cumsum(np.random.default_rng(3).normal(scale=0.01, size=1500)))
+    pl.DataFrame({"close": walk}).write_parquet(tmp_path / "WALK_db.parquet")
+
+    feature_engineering.search_frac_diff_d(["WALK"])
+    assert set(feature_engineering.load_frac_diff_d()) == {"WALK"}
+
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_GRID", [0.5, 1.0])
+    assert feature_engineering.load_frac_diff_d() == {}
+    feature_engineering.search_frac_diff_d(["WALK"])
+    assert feature_engineering.load_frac_diff_d()["WALK"] in (0.5, 1.0)
+    assert pl.read_parquet(tmp_path / "frac_diff_d.parquet").height == 1
+
+
+def test_ewm_rsi_state_matches_polars_rsi():
+    """
+    The streaming RSI state follows the same recursion as calculate_rsi.
+    """
+    rng = np.random.default_rng(11)
+    prices = 100.0 + np.cumsum(rng.normal(size=300))
+    expected = pl.DataFrame({"close": prices}).select(calculate_rsi(pl.col("close"))).to_series().to_numpy()
+
+    state = quant_engine.EwmRsiState(14)
+    streamed = np.concatenate([state.update(prices[:120]), state.update(prices[120:])])
+
+    np.testing.assert_allclose(streamed, expected, rtol=1e-10, equal_nan=True)
+
+
+def test_fused_features_match_polars_reference(tmp_path, monkeypatch):
+    """
+    compute_features must reproduce the Polars/NumPy feature pass column for
+    column, with nulls in the same places.
+    """
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_engineering, "FEATURES_DIR", str(tmp_path))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(tmp_path / "frac_diff_d.parquet"))
+
+    rng = np.random.default_rng(5)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=400)))
+    labeled = pl.DataFrame({"close": close}).with_columns(
+        pl.col("close").pct_change().ewm_std(span=20).fill_null(0.01).alias("volatility")
+    )
+    labeled.write_parquet(tmp_path / "AAA_db.parquet")
+
+    expected = labeled.with_columns([
+        (pl.col("close") / pl.col("close").shift(1)).log().alias("log_return"),
+        calculate_rsi(pl.col("close"), period=14),
+        pl.Series(name="frac_diff_04", values=quant_engine.fractional_diff(close, 0.4, 1e-3))
+    ]).with_columns([
+        pl.col("log_return").shift(lag).alias(f"return_lag_{lag}") for lag in LAGS
+    ])
+
+    feature_engineering.process_ticker("AAA")
+    result = pl.read_parquet(tmp_path / "AAA_features.parquet")
+
+    assert result.columns == expected.columns
+    pl_test.assert_frame_equal(result, expected, check_exact=False)
+    assert result.select(FEATURE_COLS).columns == FEATURE_COLS
+
+def test_chunked_features_match_single_pass(tmp_path, monkeypatch):
+    labeled = tmp_path / "labeled"
+    labeled.mkdir()
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(labeled))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(tmp_path / "frac_diff_d.parquet"))
+    monkeypatch.setattr(feature_engineering.streaming, "MIN_CHUNK_ROWS", 400)
+
+    rng = np.random.default_rng(9)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=3000)))
+    pl.DataFrame({"close": close, "label": rng.integers(-1, 2, size=3000)}).write_parquet(labeled / "AAA_db.parquet")
+
+    results = []
+    for memory_limit in [2 ** 40, 0]:
+        out_dir = tmp_path / f"features_{memory_limit}"
+        out_dir.mkdir()
+        monkeypatch.setattr(feature_engineering, "FEATURES_DIR", str(out_dir))
+        monkeypatch.setattr(feature_engineering, "MEMORY_LIMIT", memory_limit)
+        feature_engineering.process_universe(["AAA"])
+        results.append(pl.read_parquet(out_dir / "AAA_features.parquet"))
+        assert feature_engineering.manifest.load(str(out_dir))["AAA"]["rows"] == 3000
+
+    pl_test.assert_frame_equal(results[1], results[0], check_exact=True)
@@ -0,0 +1,100 @@
+import polars as pl
+import sys
+import os
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import ingest
+import raw_store
+from ingest import DataSource, FixtureSource, ingest_universe
+
+class FlakySource(DataSource):
+    def __init__(self, inner, failures):
+        self.inner = inner
+        self.failures = dict(failures)
+        self.calls = {}
+
+    def fetch(self, ticker, start_date=None):
+        self.calls[ticker] = self.calls.get(ticker, 0) + 1
+        if self.calls[ticker] <= self.failures.get(ticker, 0):
+            raise ConnectionError(f"{ticker} rate limited")
+        return self.inner.fetch(ticker, start_date)
+
+NO_WAIT = {"sleep": lambda seconds: None, "backoff_base": 0.0}
+
+def test_ingest_reports_every_ticker(tmp_path, monkeypatch, raw_bars):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    for ticker in ["AAA", "BBB"]:
+        raw_bars(50, ticker).write_parquet(fixtures / f"{ticker}.parquet")
+    monkeypatch.setattr(ingest, "DATA_DIR", str(tmp_path / "raw"))
+
+    source = FlakySource(FixtureSource(str(fixtures)), {"BBB": 2, "DEAD": 99})
+    report = ingest_universe(
+        ["AAA", "BBB", "DEAD"], source, max_workers=3, requests_per_second=1000, burst=10,
+        max_attempts=3, **NO_WAIT,
+    )
+
+    rows = {row["ticker"]: row for row in report.iter_rows(named=True)}
+    assert rows["AAA"]["status"] == "updated" and rows["AAA"]["attempts"] == 1
+    assert rows["BBB"]["status"] == "updated" and rows["BBB"]["attempts"] == 3
+    assert rows["BBB"]["rows"] == 50
+    assert rows["DEAD"]["status"] == "failed" and rows["DEAD"]["attempts"] == 3
+    assert "ConnectionError" in rows["DEAD"]["error"]
+    assert source.calls["DEAD"] == 3
+    assert raw_store.list_tickers(str(tmp_path / "raw")) == ["AAA", "BBB"]
+
+def test_second_run_only_appends_new_bars(tmp_path, monkeypatch, raw_bars):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    monkeypatch.setattr(ingest, "DATA_DIR", str(tmp_path / "raw"))
+    options = dict(max_workers=2, requests_per_second=1000, burst=10, **NO_WAIT)
+
+    raw_bars(30).write_parquet(fixtures / "AAA.parquet")
+    first = ingest_universe(["AAA"], FixtureSource(str(fixtures)), **options)
+    assert first["rows"].to_list() == [30]
+
+    unchanged = ingest_universe(["AAA"], FixtureSource(str(fixtures)), **options)
+    assert unchanged["status"].to_list() == ["unchanged"]
+
+    raw_bars(40).write_parquet(fixtures / "AAA.parquet")
+    second = ingest_universe(["AAA"], FixtureSource(str(fixtures)), **options)
+    assert second["status"].to_list() == ["updated"]
+    assert second["rows"].to_list() == [10]
+    assert second["start"].to_list() == [datetime(2024, 1, 3, 15).isoformat()]
+    assert second["end"].to_list() == [datetime(2024, 1, 4, 0).isoformat()]
+
+    stored = raw_store.read_ticker("AAA", str(tmp_path / "raw"))
+    assert stored.height == 40
+    assert stored["date"].is_sorted()
+    assert stored["ticker"].unique().to_list() == ["AAA"]
+
+def test_current_tickers_are_not_fetched(tmp_path, monkeypatch, raw_bars):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    monkeypatch.setattr(ingest, "DATA_DIR", str(tmp_path / "raw"))
+    # Friday 2024-01-05, the last bar of the session starts at 15:30 New York time.
+    close = datetime(2024, 1, 5, 15, 30, tzinfo=ingest.MARKET_TZ)
+    raw_bars(8, start=close - timedelta(hours=7)).write_parquet(fixtures / "AAA.parquet")
+    source = FlakySource(FixtureSource(str(fixtures)), {})
+    options = dict(max_workers=1, requests_per_second=1000, burst=10, **NO_WAIT)
+
+    ingest_universe(["AAA"], source, **options)
+    saturday = datetime(2024, 1, 6, 12, tzinfo=ingest.MARKET_TZ)
+    report = ingest_universe(["AAA"], source, now=saturday, **options)
+    assert report["status"].to_list() == ["current"]
+    assert report["attempts"].to_list() == [0]
+    assert source.calls["AAA"] == 1
+
+    monday_open = datetime(2024, 1, 8, 10, tzinfo=ingest.MARKET_TZ)
+    assert ingest_universe(["AAA"], source, now=monday_open, **options)["status"].to_list() == ["unchanged"]
+    assert source.calls["AAA"] == 2
+
+def test_last_session_bar():
+    tz = ingest.MARKET_TZ
+    assert ingest.last_session_bar(datetime(2024, 1, 8, 12, tzinfo=tz)) is None
+    assert ingest.last_session_bar(datetime(2024, 1, 8, 17, tzinfo=tz)) == datetime(2024, 1, 8, 15, 30, tzinfo=tz)
+    assert ingest.last_session_bar(datetime(2024, 1, 8, 8, tzinfo=tz)) == datetime(2024, 1, 5, 15, 30, tzinfo=tz)
+    assert ingest.last_session_bar(datetime(2024, 1, 7, 12, tzinfo=tz)) == datetime(2024, 1, 5, 15, 30, tzinfo=tz)
+    assert not ingest.is_current(None, datetime(2024, 1, 7, 12, tzinfo=tz))
@@ -0,0 +1,116 @@
+import polars as pl
+import polars.testing as pl_test
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import datetime as dt
+import labeling
+import transform_dollar_bars
+import raw_store
+from labeling import triple_barrier_path
+
+def brute_force_first_touch(close, vol, pt, sl, horizon):
+    labels, touches = [], []
+    for i in range(len(close)):
+        label, touch = 0, None
+        for j in range(i + 1, min(i + horizon, len(close) - 1) + 1):
+            ret = close[j] / close[i] - 1
+            if ret > pt * vol[i]:
+                label, touch = 1, j
+                break
+            if ret < -sl * vol[i]:
+                label, touch = -1, j
+                break
+        if label == 0 and i + horizon < len(close):
+            touch = i + horizon
+        labels.append(label)
+        touches.append(touch)
+    return labels, touches
+
+def test_path_labels_match_brute_force():
+    rng = np.random.default_rng(3)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=300)))
+    df = pl.DataFrame({"close": close})
+
+    labeled = triple_barrier_path(df, profit_take=1.0, stop_loss=1.5, horizon=10)
+    labels, touches = brute_force_first_touch(close, labeled["volatility"].to_numpy(), 1.0, 1.5, 10)
+
+    assert labeled["label"].to_list() == labels
+    assert labeled["touch_index"].to_list() == touches
+
+def test_path_detects_touch_inside_window():
+    """
+    A spike that reverts before the vertical barrier is a profit take for the
+    path labeler, even though the return at the horizon is flat.
+    """
+    close = [100.0] * 5 + [110.0] + [100.0] * 20
+    df = pl.DataFrame({"close": close})
+
+    labeled = triple_barrier_path(df, horizon=10)
+
+    assert labeled["label"][0] == 1
+    assert labeled["touch_index"][0] == 5
+    assert abs(labeled["touch_return"][0] - 0.10) < 1e-12
+
+def test_fingerprints_invalidate_only_downstream(tmp_path, monkeypatch):
+    raw_dir, bars_dir, labeled_dir = tmp_path / "raw", tmp_path / "bars", tmp_path / "labeled"
+    bars_dir.mkdir()
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(bars_dir))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 5_000_000)
+    monkeypatch.setattr(labeling, "BARS_DIR", str(bars_dir))
+    monkeypatch.setattr(labeling, "LABELED_DIR", str(labeled_dir))
+
+    rng = np.random.default_rng(0)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=400)))
+    raw = pl.DataFrame({
+        "date": [dt.datetime(2024, 1, 2) + dt.timedelta(hours=i) for i in range(400)],
+        "open": close, "high": close, "low": close, "close": close,
+        "volume": np.full(400, 10_000.0),
+    })
+    raw_store.append(raw, "AAA", str(raw_dir))
+
+    def run():
+        return transform_dollar_bars.main(workers=1).height, labeling.main(workers=1).height
+
+    assert run() == (1, 1)
+    assert run() == (0, 0)
+
+    monkeypatch.setattr(labeling, "HORIZON", 5)
+    assert run() == (0, 1)
+
+    monkeypatch.setattr(labeling, "VOLATILITY_SPAN", 10)
+    assert run() == (0, 1)
+
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 8_000_000)
+    assert run() == (1, 1)
+    assert run() == (0, 0)
+
+def test_chunked_labels_match_single_pass(tmp_path, monkeypatch):
+    rng = np.random.default_rng(11)
+    n = 2500
+    close = 100.0 * np.exp(np.cumsum(rng.normal(scale=0.01, size=n)))
+    bars_dir = tmp_path / "bars"
+    bars_dir.mkdir()
+    pl.DataFrame({
+        "timestamp": [dt.datetime(2024, 1, 2) + dt.timedelta(hours=i) for i in range(n)],
+        "close": close,
+    }).write_parquet(bars_dir / "AAA_db.parquet")
+    monkeypatch.setattr(labeling, "BARS_DIR", str(bars_dir))
+    monkeypatch.setattr(labeling.streaming, "MIN_CHUNK_ROWS", 300)
+
+    for mode in ["horizon", "path"]:
+        results = []
+        for memory_limit in [2 ** 40, 0]:
+            out_dir = tmp_path / f"{mode}_{memory_limit}"
+            monkeypatch.setattr(labeling, "LABELED_DIR", str(out_dir))
+            monkeypatch.setattr(labeling, "MEMORY_LIMIT", memory_limit)
+            out_dir.mkdir()
+            labeling.label_ticker("AAA", mode)
+            results.append(pl.read_parquet(out_dir / "AAA_db.parquet"))
+            assert labeling.manifest.load(str(out_dir))["AAA"]["rows"] == n
+
+        pl_test.assert_frame_equal(results[1], results[0], check_exact=True)
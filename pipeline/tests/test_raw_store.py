@@ -0,0 +1,84 @@
+import polars as pl
+import polars.testing as pl_test
+import datetime as dt
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import raw_store
+
+def test_append_dedupes_overlap_and_compacts(tmp_path, raw_bars):
+    root = str(tmp_path)
+    first = raw_bars(20, start=dt.datetime(2024, 1, 31))
+    # Second delta starts on the last stored bar with a revised close and
+    # crosses into February.
+    second = raw_bars(10, start=first["date"].max(), close=500.0)
+    raw_store.append(first, "AAA", root)
+    raw_store.append(second, "AAA", root)
+
+    assert raw_store.list_months("AAA", root) == ["2024-01", "2024-02"]
+    # The rewritten bar is counted once and its month waits for compaction.
+    entry = raw_store.entries(root)["AAA"]
+    assert entry["rows"] == 29 and entry["overlaps"] == ["2024-01"]
+    assert raw_store.rebuild_manifest(root)["AAA"]["overlaps"] == ["2024-01"]
+    assert raw_store.latest_timestamp("AAA", root) == second["date"].max()
+
+    expected = raw_store.read_ticker("AAA", root)
+    assert expected.height == 29
+    assert expected["date"].is_sorted()
+    assert expected.filter(pl.col("date") == first["date"].max())["close"].item() == 500.0
+
+    # Only January holds two fragments; February has one and is left alone.
+    february = raw_store.fragments(raw_store.month_dir("AAA", "2024-02", root))
+    assert raw_store.compact("AAA", root) == 1
+    assert raw_store.fragments(raw_store.month_dir("AAA", "2024-02", root)) == february
+    assert len(raw_store.fragments(raw_store.month_dir("AAA", "2024-01", root))) == 1
+    assert raw_store.entries(root)["AAA"]["overlaps"] == [] and raw_store.entries(root)["AAA"]["rows"] == 29
+    assert raw_store.compact("AAA", root) == 0
+    pl_test.assert_frame_equal(raw_store.read_ticker("AAA", root), expected)
+
+def test_scan_prunes_by_ticker(tmp_path, raw_bars):
+    root = str(tmp_path)
+    raw_store.append(raw_bars(5, start=dt.datetime(2024, 3, 1)), "AAA", root)
+    raw_store.append(raw_bars(7, "BBB", start=dt.datetime(2024, 3, 1)), "BBB", root)
+
+    plan = raw_store.scan(root).filter(pl.col("ticker") == "BBB").explain()
+    assert "ticker=AAA" not in plan
+    assert raw_store.read_tickers(["BBB"], root).height == 7
+
+def test_migrate_flat_files(tmp_path, raw_bars):
+    root = str(tmp_path)
+    legacy = raw_bars(30, start=dt.datetime(2024, 1, 1))
+    legacy.write_parquet(tmp_path / "AAA.parquet")
+
+    assert raw_store.migrate_flat_files(root) == 1
+    assert not (tmp_path / "AAA.parquet").exists()
+    pl_test.assert_frame_equal(raw_store.read_ticker("AAA", root).select(legacy.columns), legacy)
+
+def test_manifest_tracks_appends_without_reading_data(tmp_path, raw_bars):
+    root = str(tmp_path)
+    first = raw_bars(10, start=dt.datetime(2024, 1, 2)).with_columns(pl.col("date").dt.replace_time_zone("America/New_York"))
+    raw_store.append(first, "AAA", root)
+    entry = raw_store.entries(root)["AAA"]
+    assert entry["rows"] == 10
+    assert raw_store.latest_timestamp("AAA", root) == first["date"].max()
+
+    second = first.with_columns(pl.col("date") + dt.timedelta(hours=10))
+    raw_store.append(second, "AAA", root)
+    after = raw_store.entries(root)["AAA"]
+    assert after["rows"] == 20 and after["hash"] != entry["hash"]
+    # The manifest timestamp compares directly against the stored column.
+    assert raw_store.read_ticker("AAA", root).filter(
+        pl.col("date") > raw_store.latest_timestamp("AAA", root)
+    ).height == 0
+
+    # Adjacent appends do not overlap, so there is nothing to compact.
+    assert raw_store.compact("AAA", root) == 0
+    assert len(raw_store.fragments(raw_store.month_dir("AAA", "2024-01", root))) == 2
+    compacted = raw_store.entries(root)["AAA"]
+    assert compacted["hash"] == after["hash"] and compacted["rows"] == 20
+
+    rebuilt = raw_store.rebuild_manifest(root)["AAA"]
+    assert rebuilt["rows"] == 20 and rebuilt["bytes"] == compacted["bytes"]
+    assert rebuilt["last_timestamp"] == compacted["last_timestamp"]
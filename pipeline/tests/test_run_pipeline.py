@@ -0,0 +1,130 @@
+import polars as pl
+import polars.testing as pl_test
+import datetime as dt
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import run_pipeline
+import dag
+import ingest
+import transform_dollar_bars
+import labeling
+import feature_engineering
+import train
+import streaming
+from ingest import FixtureSource
+
+def use_directories(data, monkeypatch):
+    monkeypatch.setattr(ingest, "DATA_DIR", str(data / "raw"))
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(data / "raw"))
+    monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(data / "bars"))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 2_000_000)
+    monkeypatch.setattr(labeling, "BARS_DIR", str(data / "bars"))
+    monkeypatch.setattr(labeling, "LABELED_DIR", str(data / "labeled"))
+    monkeypatch.setattr(feature_engineering, "LABELED_DIR", str(data / "labeled"))
+    monkeypatch.setattr(feature_engineering, "FEATURES_DIR", str(data / "features"))
+    monkeypatch.setattr(feature_engineering, "FRAC_DIFF_TABLE", str(data / "frac_diff_d.parquet"))
+    monkeypatch.setattr(train, "FEATURES_DIR", str(data / "features"))
+    monkeypatch.setattr(train, "MODEL_DIR", str(data / "models"))
+    monkeypatch.setattr(train, "select_tickers", lambda tickers: [])
+    monkeypatch.setattr(ingest, "REQUESTS_PER_SECOND", 1000.0)
+    (data / "bars").mkdir(parents=True)
+    (data / "features").mkdir()
+
+def test_pipeline_runs_in_process_and_noop_rerun(tmp_path, monkeypatch, raw_bars):
+    data = tmp_path / "data"
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    for seed, ticker in enumerate(["AAA", "BBB"]):
+        raw_bars(600, ticker, seed=seed).write_parquet(fixtures / f"{ticker}.parquet")
+
+    use_directories(data, monkeypatch)
+
+    def run():
+        stages = run_pipeline.build_stages(["AAA", "BBB"], source=FixtureSource(str(fixtures)))
+        runner = dag.Runner(stages, workers=2, journal_path=str(data / "journal.jsonl"))
+        report = runner.run(["AAA", "BBB"])
+        assert (report["status"] == "ok").all()
+        return {s: report.filter(pl.col("stage") == s)["changed"].sum() for s in run_pipeline.STAGE_NAMES}
+
+    assert run() == {"ingest": 2, "transform": 2, "label": 2, "features": 2, "train": 0}
+    features = pl.read_parquet(data / "features" / "AAA_features.parquet")
+    assert features.height == pl.read_parquet(data / "bars" / "AAA_db.parquet").height
+
+    assert run() == {"ingest": 0, "transform": 0, "label": 0, "features": 0, "train": 0}
+
+def test_changed_only_touches_only_updated_tickers(tmp_path, monkeypatch, raw_bars):
+    data = tmp_path / "data"
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    for seed, ticker in enumerate(["AAA", "BBB"]):
+        raw_bars(600, ticker, seed=seed).write_parquet(fixtures / f"{ticker}.parquet")
+
+    use_directories(data, monkeypatch)
+
+    def run(changed_only):
+        changes = {}
+        stages = run_pipeline.build_stages(
+            ["AAA", "BBB"], source=FixtureSource(str(fixtures)), changed_only=changed_only, changes=changes,
+        )
+        report = dag.Runner(stages, workers=2).run(["AAA", "BBB"])
+        assert (report["status"] == "ok").all()
+        return changes, report.filter(pl.col("changed")).select("stage", "ticker").rows()
+
+    run(changed_only=False)
+    bbb_features = os.path.getmtime(data / "features" / "BBB_features.parquet")
+
+    raw_bars(650, seed=0).write_parquet(fixtures / "AAA.parquet")
+    changes, changed = run(changed_only=True)
+    assert list(changes) == ["AAA"] and changes["AAA"]["rows"] == 50
+    assert changes["AAA"]["end"] == (dt.datetime(2024, 1, 2, 9) + dt.timedelta(hours=649)).isoformat()
+    assert sorted(changed) == [("features", "AAA"), ("ingest", "AAA"), ("label", "AAA"), ("transform", "AAA")]
+    assert os.path.getmtime(data / "features" / "BBB_features.parquet") == bbb_features
+
+    assert run(changed_only=True) == ({}, [])
+
+def test_resumed_ingest_tasks_keep_their_changes(tmp_path, monkeypatch, raw_bars):
+    data = tmp_path / "data"
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    raw_bars(600, seed=0).write_parquet(fixtures / "AAA.parquet")
+    use_directories(data, monkeypatch)
+    journal = str(data / "journal.jsonl")
+
+    def run(resume):
+        changes = {}
+        stages = run_pipeline.build_stages(["AAA"], source=FixtureSource(str(fixtures)), changes=changes)
+        report = dag.Runner(stages, workers=1, journal_path=journal).run(["AAA"], resume=resume)
+        return changes, report
+
+    first, _ = run(resume=False)
+    resumed, report = run(resume=True)
+    assert (report["status"] == "resumed").all()
+    assert resumed == first and first["AAA"]["rows"] == 600
+
+def test_streamed_run_matches_in_memory_run(tmp_path, monkeypatch, raw_bars):
+    fixtures = tmp_path / "fixtures"
+    fixtures.mkdir()
+    raw_bars(1500, seed=0).write_parquet(fixtures / "AAA.parquet")
+    monkeypatch.setattr(streaming, "MIN_CHUNK_ROWS", 200)
+
+    outputs = []
+    for memory_limit in [2 ** 40, 0]:
+        data = tmp_path / f"data_{memory_limit}"
+        use_directories(data, monkeypatch)
+        for module in [transform_dollar_bars, labeling, feature_engineering, train]:
+            monkeypatch.setattr(module, "MEMORY_LIMIT", memory_limit)
+
+        stages = run_pipeline.build_stages(["AAA"], source=FixtureSource(str(fixtures)))
+        report = dag.Runner(stages, workers=1).run(["AAA"])
+        assert (report["status"] == "ok").all()
+        outputs.append([
+            pl.read_parquet(data / "bars" / "AAA_db.parquet"),
+            pl.read_parquet(data / "labeled" / "AAA_db.parquet"),
+            pl.read_parquet(data / "features" / "AAA_features.parquet"),
+        ])
+
+    for in_memory, streamed in zip(*outputs):
+        pl_test.assert_frame_equal(streamed, in_memory)
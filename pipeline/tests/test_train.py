@@ -0,0 +1,158 @@
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import numpy as np
+import polars as pl
+import xgboost as xgb
+
+import manifest
+import pooled_model
+import train
+
+def test_largest_tickers_train_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(train, "FEATURES_DIR", str(tmp_path))
+    for ticker, rows in [("AAA", 10), ("BBB", 5000), ("CCC", 300)]:
+        manifest.update(str(tmp_path), ticker, lambda _: {"rows": rows})
+
+    assert train.largest_first(["AAA", "BBB", "CCC", "NEW"]) == ["BBB", "CCC", "AAA", "NEW"]
+
+def test_cores_are_split_between_the_workers_that_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(train, "FEATURES_DIR", str(tmp_path / "features"))
+    monkeypatch.setattr(train, "MODEL_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(train, "get_available_tickers", lambda: ["AAA", "BBB", "CCC"])
+    for ticker in ["AAA", "BBB", "CCC"]:
+        manifest.update(train.FEATURES_DIR, ticker, lambda _: {"rows": 100, "hash": ticker})
+    monkeypatch.setattr(train.executor.os, "cpu_count", lambda: 16)
+    calls = {}
+
+    def run_stage(task, tickers, workers, **kwargs):
+        calls.update(threads=task.keywords["nthread"], workers=workers)
+        return pl.DataFrame(schema=train.executor.REPORT_SCHEMA)
+
+    monkeypatch.setattr(train.executor, "run_stage", run_stage)
+    train.main(workers=16)
+    assert calls == {"threads": 5, "workers": 3}
+
+def test_thread_count_does_not_change_fingerprint():
+    before = manifest.fingerprint("hash", train.train_params(), train.STAGE_VERSION)
+    assert train.booster_params(8)["nthread"] == 8
+    assert train.booster_params()["nthread"] == train.XGB_PARAMS["nthread"]
+    assert manifest.fingerprint("hash", train.train_params(), train.STAGE_VERSION) == before
+
+def test_select_tickers_defaults_to_everything(monkeypatch):
+    tickers = [f"T{i}" for i in range(20)]
+    assert train.select_tickers(tickers) == tickers
+    monkeypatch.setattr(train, "TRAIN_TICKERS", ["T3", "T7"])
+    assert train.select_tickers(tickers) == ["T3", "T7"]
+
+def write_features(directory, ticker, rows, seed):
+    rng = np.random.default_rng(seed)
+    features = {col: rng.normal(size=rows) for col in train.FEATURE_COLS}
+    label = np.where(features[train.FEATURE_COLS[0]] + rng.normal(scale=0.5, size=rows) > 0, 1, -1)
+    pl.DataFrame({**features, "label": label}).write_parquet(f"{directory}/{ticker}_features.parquet")
+    manifest.update(directory, ticker, lambda _: {"rows": rows, "hash": f"{ticker}-{seed}"})
+
+def test_pooled_model_scores_a_batch_in_one_artifact(tmp_path, monkeypatch):
+    features_dir, model_dir = tmp_path / "features", tmp_path / "models"
+    features_dir.mkdir()
+    monkeypatch.setattr(train, "FEATURES_DIR", str(features_dir))
+    monkeypatch.setattr(train, "MODEL_DIR", str(model_dir))
+    monkeypatch.setattr(train.universe, "get_sectors", lambda: {"AAA": "Energy", "BBB": "Utilities"})
+    monkeypatch.setattr(train, "log_run", lambda *args: None)
+    for seed, ticker in enumerate(["AAA", "BBB", "CCC"]):
+        write_features(str(features_dir), ticker, 400, seed)
+
+    precision = train.train_pooled(nthread=1)
+    assert 0.0 < precision <= 1.0
+    assert os.listdir(model_dir) == [pooled_model.ARTIFACT_NAME]
+    assert train.train_pooled(nthread=1) is None  # unchanged features
+
+    model = pooled_model.PooledModel.load(train.pooled_path())
+    assert model.tickers == {"AAA": 0, "BBB": 1, "CCC": 2}
+    assert model.sectors["CCC"] == pooled_model.UNKNOWN_SECTOR
+    X = pl.read_parquet(f"{features_dir}/BBB_features.parquet").select(train.FEATURE_COLS).head(4).to_numpy()
+    primary, meta = model.predict(["AAA", "BBB", "CCC", "NEW"], X)
+    assert primary.shape == meta.shape == (4,)
+    assert np.all((meta >= 0) & (meta <= 1))
+
+    write_features(str(features_dir), "CCC", 450, 7)
+    assert train.train_pooled(nthread=1) is not None
+
+def test_folds_are_purged_and_embargoed():
+    bars = np.arange(120)
+    ends = bars + 10
+    folds = train.cv_folds(bars, ends, n_folds=3, embargo=5)
+    assert len(folds) == 3
+    for rows, valid in folds:
+        first, last = bars[valid[0]], bars[valid[-1]]
+        assert rows.max() < first                                  # walk-forward
+        assert np.all(ends[rows] < first)                          # purged
+        assert last - first + 1 == len(valid)
+
+    # The embargo only follows the block: with one-bar labels nothing before
+    # it is dropped.
+    for rows, valid in train.cv_folds(bars, bars, n_folds=3, embargo=5):
+        assert rows.max() == valid[0] - 1
+
+    rows, valid = train.cv_folds(bars, ends, n_folds=3, embargo=5, walk_forward=False)[1]
+    before = ends[rows] < valid[0]
+    after = bars[rows] > max(ends[valid].max(), valid[-1] + 5)
+    assert np.all(before | after)
+    assert rows.max() > valid[-1]
+
+def test_train_ticker_stops_early_and_stores_the_round_count(tmp_path, monkeypatch):
+    monkeypatch.setattr(train, "FEATURES_DIR", str(tmp_path))
+    monkeypatch.setattr(train, "MODEL_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(train, "log_run", lambda *args: None)
+    write_features(str(tmp_path), "AAA", 600, 0)
+
+    precision = train.train_ticker("AAA", nthread=2)
+    assert 0.0 < precision <= 1.0
+    best = manifest.load(train.MODEL_DIR)["AAA"]["best_iteration"]
+    assert 0 <= best["primary"] < train.NUM_BOOST_ROUND - 1
+
+    booster = xgb.Booster()
+    booster.load_model(f"{train.MODEL_DIR}/AAA_primary.json")
+    assert booster.best_iteration == best["primary"]
+    assert booster.num_boosted_rounds() == best["primary"] + 1
+
+def test_streamed_training_is_cross_validated_too(tmp_path, monkeypatch):
+    monkeypatch.setattr(train, "FEATURES_DIR", str(tmp_path))
+    monkeypatch.setattr(train, "MODEL_DIR", str(tmp_path / "models"))
+    monkeypatch.setattr(train, "MEMORY_LIMIT", 0)
+    logged = {}
+    monkeypatch.setattr(train, "log_run", lambda ticker, cols, metrics: logged.update(metrics))
+    write_features(str(tmp_path), "AAA", 600, 0)
+
+    precision = train.train_ticker("AAA", nthread=2)
+    assert 0.0 < precision <= 1.0
+    assert logged["folds"] == train.CV_FOLDS
+    best = manifest.load(train.MODEL_DIR)["AAA"]["best_iteration"]
+    assert 0 <= best["primary"] < train.NUM_BOOST_ROUND - 1
+
+def test_stacked_folds_cut_each_group_on_its_own():
+    bars = np.r_[np.arange(60), np.arange(30)]
+    groups = np.r_[np.zeros(60), np.ones(30)]
+    folds = train.stacked_folds(bars, bars + 2, groups)
+    assert len(folds) == train.CV_FOLDS
+    for rows, valid in folds:
+        for group in (0, 1):
+            group_rows, group_valid = rows[groups[rows] == group], valid[groups[valid] == group]
+            assert len(group_valid) and group_rows.max() < group_valid.min()
+
+def test_concurrent_runs_log_to_their_own_experiment(tmp_path, monkeypatch):
+    import mlflow
+    from concurrent.futures import ThreadPoolExecutor
+
+    monkeypatch.setenv("MLFLOW_TRACKING_URI", f"sqlite:///{tmp_path}/mlflow.db")
+    tickers = ["AAA", "BBB", "CCC", "DDD"]
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda t: train.log_run(t, train.FEATURE_COLS, {"signals": ord(t[0])}), tickers * 2))
+
+    for ticker in tickers:
+        experiment = mlflow.get_experiment_by_name(f"Alpha_{ticker}")
+        runs = mlflow.search_runs([experiment.experiment_id])
+        assert len(runs) == 2
+        assert (runs["metrics.signals"] == ord(ticker[0])).all()
@@ -0,0 +1,142 @@
+import polars as pl
+import polars.testing as pl_test
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import transform_dollar_bars
+import raw_store
+
+def test_bars_close_on_threshold_row(monkeypatch, raw_bars):
+    """
+    Each bar closes on the first row that takes it to the threshold, so no
+    closed bar is short and no row straddles two bars.
+    """
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+    raw = raw_bars(500, seed=0)
+
+    bars, state = transform_dollar_bars.build_bars(raw)
+    threshold = transform_dollar_bars.THRESHOLD
+
+    assert bars.height > 0
+    assert (bars["dollar_volume"] >= threshold).all()
+    assert bars["volume"].sum() + state["volume"] == raw["volume"].sum()
+    assert bars["timestamp"].dtype == raw["date"].dtype
+    assert (bars["high"] >= bars["low"]).all()
+
+def test_resume_from_state_matches_single_pass(monkeypatch, raw_bars):
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+    raw = raw_bars(500, seed=0)
+
+    full, full_state = transform_dollar_bars.build_bars(raw)
+    first, state = transform_dollar_bars.build_bars(raw.slice(0, 173))
+    second, final_state = transform_dollar_bars.build_bars(raw.slice(173), state=state)
+
+    pl_test.assert_frame_equal(pl.concat([first, second]), full)
+    assert final_state == full_state
+
+def test_process_universe_matches_per_ticker(tmp_path, monkeypatch, raw_bars):
+    raw_dir = tmp_path / "raw"
+    out_dir = tmp_path / "bars"
+    out_dir.mkdir()
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(out_dir))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+
+    tickers = ["AAA", "BBB", "CCC"]
+    for seed, ticker in enumerate(tickers):
+        raw_store.append(raw_bars(100 + 150 * seed, ticker, seed=seed), ticker, str(raw_dir))
+
+    transform_dollar_bars.process_universe(tickers)
+    batched = {t: pl.read_parquet(out_dir / f"{t}_db.parquet") for t in tickers}
+
+    for ticker, expected in batched.items():
+        transform_dollar_bars.process_ticker(ticker)
+        single = pl.read_parquet(out_dir / f"{ticker}_db.parquet")
+        pl_test.assert_frame_equal(single, expected)
+
+def test_main_rebuilds_only_changed_tickers(tmp_path, monkeypatch, raw_bars):
+    raw_dir = tmp_path / "raw"
+    out_dir = tmp_path / "bars"
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(out_dir))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+
+    raw_store.append(raw_bars(200, seed=0), "AAA", str(raw_dir))
+    raw_store.append(raw_bars(200, "BBB", seed=1), "BBB", str(raw_dir))
+    transform_dollar_bars.main()
+    built = {t: os.path.getmtime(out_dir / f"{t}_db.parquet") for t in ["AAA", "BBB"]}
+
+    more = raw_bars(300, "BBB", seed=1).slice(200)
+    raw_store.append(more, "BBB", str(raw_dir))
+    processed = []
+    monkeypatch.setattr(transform_dollar_bars, "process_universe", lambda batch, incremental=True: processed.extend(batch))
+    transform_dollar_bars.main()
+
+    assert processed == ["BBB"]
+    assert os.path.getmtime(out_dir / "AAA_db.parquet") == built["AAA"]
+
+def test_incremental_runs_match_full_rebuild_bytes(tmp_path, monkeypatch, raw_bars):
+    raw_dir = tmp_path / "raw"
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+    raw = raw_bars(600, seed=4)
+
+    def build(out_dir, incremental, batched):
+        out_dir.mkdir(exist_ok=True)
+        monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(out_dir))
+        if batched:
+            transform_dollar_bars.process_universe(["AAA"], incremental)
+        else:
+            transform_dollar_bars.process_ticker("AAA", incremental)
+        return (out_dir / "AAA_db.parquet").read_bytes()
+
+    # Each ingest re-fetches the last stored row; the second one revises it.
+    cuts = [0, 250, 251, 400, 600]
+    for run, (lo, hi) in enumerate(zip(cuts, cuts[1:])):
+        delta = raw.slice(max(lo - 1, 0), hi - max(lo - 1, 0))
+        if run == 1:
+            delta = delta.with_columns(pl.col("volume") * 3)
+        raw_store.append(delta, "AAA", str(raw_dir))
+
+        full = build(tmp_path / f"full_{run}", incremental=False, batched=True)
+        assert build(tmp_path / "batched", incremental=True, batched=True) == full
+        assert build(tmp_path / "single", incremental=True, batched=False) == full
+
+    entry = transform_dollar_bars.manifest.load(str(tmp_path / "batched"))["AAA"]
+    assert entry["state"] is not None and entry["provisional"] >= 0
+
+def test_streamed_bars_match_in_memory(tmp_path, monkeypatch, raw_bars):
+    raw_dir = tmp_path / "raw"
+    monkeypatch.setattr(transform_dollar_bars, "RAW_DIR", str(raw_dir))
+    monkeypatch.setattr(transform_dollar_bars, "THRESHOLD", 20_000_000)
+    raw = raw_bars(1500, seed=5)  # spans three month partitions
+
+    def build(out_dir, memory_limit):
+        out_dir.mkdir(exist_ok=True)
+        monkeypatch.setattr(transform_dollar_bars, "PROCESSED_DIR", str(out_dir))
+        monkeypatch.setattr(transform_dollar_bars, "MEMORY_LIMIT", memory_limit)
+        transform_dollar_bars.process_ticker("AAA")
+        entry = transform_dollar_bars.manifest.load(str(out_dir))["AAA"]
+        return pl.read_parquet(out_dir / "AAA_db.parquet"), entry
+
+    raw_store.append(raw.slice(0, 900), "AAA", str(raw_dir))
+    streamed, streamed_entry = build(tmp_path / "streamed", memory_limit=0)
+    assert not (tmp_path / "streamed" / "AAA_db.parquet.parts").exists()
+
+    # The next runs resume from the streamed run's state, streamed again or
+    # in one frame.
+    raw_store.append(raw.slice(899), "AAA", str(raw_dir))
+    full, full_entry = build(tmp_path / "full", memory_limit=2 ** 40)
+    for memory_limit in [0, 2 ** 40]:
+        out_dir = tmp_path / f"resumed_{memory_limit}"
+        out_dir.mkdir()
+        for name in ["AAA_db.parquet", "_manifest.json"]:
+            (out_dir / name).write_bytes((tmp_path / "streamed" / name).read_bytes())
+        resumed, resumed_entry = build(out_dir, memory_limit)
+
+        pl_test.assert_frame_equal(resumed, full)
+        for key in ["rows", "last_timestamp", "state", "raw_timestamp", "provisional", "fingerprint"]:
+            assert resumed_entry[key] == full_entry[key]
+    assert streamed_entry["rows"] < full_entry["rows"]
@@ -0,0 +1,71 @@
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import universe
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_cache_is_reused_until_ttl(tmp_path, monkeypatch):
+    monkeypatch.delenv(universe.UNIVERSE_FILE_ENV, raising=False)
+    cache = str(tmp_path / "universe.json")
+    clock = Clock()
+    calls = []
+    def fetch():
+        calls.append(clock.now)
+        return ["AAPL", "BRK-B"]
+
+    options = dict(cache_path=cache, ttl=3600, fetch=fetch, raw_dir=str(tmp_path / "raw"), clock=clock)
+    assert universe.get_universe(**options) == ["AAPL", "BRK-B"]
+    clock.now += 600
+    assert universe.get_universe(**options) == ["AAPL", "BRK-B"]
+    assert len(calls) == 1
+
+    clock.now += 3600
+    universe.get_universe(**options)
+    assert len(calls) == 2
+
+def test_failed_refresh_falls_back(tmp_path, monkeypatch):
+    monkeypatch.delenv(universe.UNIVERSE_FILE_ENV, raising=False)
+    cache = str(tmp_path / "universe.json")
+    def offline():
+        raise ConnectionError("no network")
+
+    options = dict(cache_path=cache, fetch=offline, raw_dir=str(tmp_path / "raw"))
+    assert universe.get_universe(**options) == universe.FALLBACK_TICKERS
+
+    universe.write_cache(["MSFT"], cache, clock=lambda: 0.0)
+    assert universe.get_universe(**options) == ["MSFT"]
+
+def test_fixed_universe_file(tmp_path, monkeypatch):
+    listing = tmp_path / "tickers.txt"
+    listing.write_text("# offline universe\nAAPL\nBRK.B\n\n")
+    monkeypatch.setenv(universe.UNIVERSE_FILE_ENV, str(listing))
+
+    def fetch():
+        pytest.fail("a fixed universe must not touch the network")
+
+    assert universe.get_universe(fetch=fetch) == ["AAPL", "BRK-B"]
+
+    constituents = tmp_path / "constituents.csv"
+    constituents.write_text("Symbol,Security\nMMM,3M\nBF.B,Brown-Forman\n")
+    assert universe.get_universe(path=str(constituents), fetch=fetch) == ["MMM", "BF-B"]
+
+def test_sectors_are_cached_with_the_constituents(tmp_path, monkeypatch):
+    monkeypatch.delenv(universe.UNIVERSE_FILE_ENV, raising=False)
+    cache = str(tmp_path / "universe.json")
+    def fetch():
+        return {"AAPL": "Information Technology", "XOM": "Energy"}
+
+    assert universe.get_universe(cache_path=cache, fetch=fetch) == ["AAPL", "XOM"]
+    assert universe.get_sectors(cache) == {"AAPL": "Information Technology", "XOM": "Energy"}
+
+    universe.write_cache(["MSFT"], cache)
+    assert universe.get_sectors(cache) == {}
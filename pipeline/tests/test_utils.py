@@ -5,7 +5,7 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
-from utils import retry
+from utils import retry, TokenBucket, backoff_delay
 
 def test_retry_success():
     """Test that it runs once if successful."""
@@ -43,6 +43,16 @@ def test_retry_failure():
         
     assert mock_func.call_count == 3
 
+def test_retry_waits_the_delay_of_each_failed_attempt():
+    mock_func = MagicMock(side_effect=[ValueError("Fail 1"), ValueError("Fail 2"), "Success"])
+    mock_func.__name__ = "mock_task"
+    waits = []
+
+    decorated = retry(retries=3, delay=lambda attempt: attempt * 10, sleep=waits.append)(mock_func)
+
+    assert decorated() == "Success"
+    assert waits == [10, 20]
+
 def test_time_execution():
     with patch('utils.time.time') as mock_time:
         mock_time.side_effect = [1000.0, 1005.5, 1006.0]
@@ -69,4 +79,26 @@ def test_time_execution_failure():
         with pytest.raises(ValueError):
             decorated()
             
-        assert mock_time.call_count == 3
\ No newline at end of file
+        assert mock_time.call_count == 3
+
+def test_token_bucket_paces_after_burst():
+    """Test that a burst is served immediately and the rest at `rate`."""
+    now = [0.0]
+    waits = []
+    def sleep(seconds):
+        waits.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=3, clock=lambda: now[0], sleep=sleep)
+    for _ in range(5):
+        bucket.acquire()
+
+    assert waits == [0.5, 0.5]
+    assert now[0] == pytest.approx(1.0)
+
+def test_backoff_delay_is_capped_full_jitter():
+    class Upper:
+        def uniform(self, low, high):
+            return high
+
+    assert [backoff_delay(a, base=1.0, cap=5.0, rng=Upper()) for a in range(1, 6)] == [1, 2, 4, 5, 5]
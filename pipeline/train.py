@@ -1,152 +1,555 @@
+import argparse
 import polars as pl
 import xgboost as xgb
-from sklearn.metrics import precision_score
 import numpy as np
 import os
-from tqdm import tqdm
+import time
+import tempfile
+import functools
+from concurrent.futures import ThreadPoolExecutor
 import mlflow
+from mlflow.tracking import MlflowClient
+from feature_schema import FEATURE_COLS
+import executor
+import labeling
+import manifest
+import streaming
+import universe
+from pooled_model import PooledModel, CODE_COLS, UNKNOWN_SECTOR, ARTIFACT_NAME, encodings, read_fingerprint
 
 FEATURES_DIR = "./data/processed/features"
 MODEL_DIR = "./data/models"
 
+XGB_PARAMS = {
+    "objective": "binary:logistic",
+    "max_depth": 3,
+    "eta": 0.1,
+    "eval_metric": "logloss",
+    "nthread": 1
+}
+# Upper bound on boosting rounds; the boosters stop earlier when the
+# validation folds stop improving (see fit_boosters).
+NUM_BOOST_ROUND = 100
+EARLY_STOPPING_ROUNDS = 10
+# Purged walk-forward CV: CV_FOLDS validation blocks, each trained on the
+# rows before it, minus rows whose label window reaches into the block and
+# rows within EMBARGO_BARS of it. WALK_FORWARD = False trains on the blocks
+# after it as well (purged K-fold).
+CV_FOLDS = 5
+EMBARGO_BARS = labeling.HORIZON
+WALK_FORWARD = True
+# None trains every ticker with features; a list restricts training to it.
+TRAIN_TICKERS = None
+# Train the single pooled model instead of per-ticker ones (see train_pooled).
+# The API reads the same variable to decide which models to serve.
+POOLED = os.environ.get("USE_POOLED_MODEL", "").lower() in ("1", "true", "yes")
+STAGE_VERSION = 1
+# Feature files larger than this are trained on chunk by chunk (see Chunks).
+MEMORY_LIMIT = streaming.memory_limit("train")
+
+def train_params():
+    return {
+        "xgb": XGB_PARAMS, "rounds": NUM_BOOST_ROUND, "features": FEATURE_COLS,
+        "cv": {
+            "folds": CV_FOLDS, "early_stopping": EARLY_STOPPING_ROUNDS, "embargo": EMBARGO_BARS,
+            "walk_forward": WALK_FORWARD, "horizon": labeling.HORIZON,
+        },
+    }
+
+def record_models(ticker, precision, **stats):
+    """
+    Records both boosters, with the features hash and training parameters
+    they came from and any extra `stats`, in the models manifest.
+    """
+    paths = [f"{MODEL_DIR}/{ticker}_primary.json", f"{MODEL_DIR}/{ticker}_meta.json"]
+    source_hash = manifest.load(FEATURES_DIR).get(ticker, {}).get("hash")
+
+    def record(_):
+        digest = None
+        for path in paths:
+            digest = manifest.chain_hash(digest, manifest.file_hash(path))
+        return {
+            "bytes": sum(os.path.getsize(p) for p in paths),
+            "hash": digest,
+            "precision": float(precision),
+            "source_hash": source_hash,
+            "fingerprint": manifest.fingerprint(source_hash, train_params(), STAGE_VERSION),
+            **stats,
+        }
+
+    manifest.update(MODEL_DIR, ticker, record)
+
+def booster_params(nthread=None):
+    """
+    XGB_PARAMS with the booster's thread count. Threads do not change the
+    model, so they are not part of train_params() or the fingerprint.
+    """
+    return {**XGB_PARAMS, "nthread": nthread or XGB_PARAMS["nthread"]}
+
 def get_available_tickers():
     if not os.path.exists(FEATURES_DIR):
         return []
     files = [f for f in os.listdir(FEATURES_DIR) if f.endswith("_features.parquet")]
     return [f.replace("_features.parquet", "") for f in files]
 
-def train_meta_model(df_clean, primary_model, feature_cols):
+def clean(df):
     """
-    Trains using Core XGBoost API.
+    Rows with a directional label and no nulls, with a 0/1 target. Works on
+    frames and lazy frames alike.
     """
-    X = df_clean.select(feature_cols).to_numpy()
-    y_true = df_clean.select("target").to_numpy().ravel()
-    
-    dmatrix = xgb.DMatrix(X)
-    primary_probs = primary_model.predict(dmatrix)
-    
-    primary_preds = (primary_probs > 0.5).astype(int)
-    meta_target = (primary_preds == y_true).astype(int)
-    
-    primary_conf = primary_probs.reshape(-1, 1)
-    X_meta = np.hstack([X, primary_conf])
-    
-    dmeta = xgb.DMatrix(X_meta, label=meta_target)
-    params = {
-        "objective": "binary:logistic",
-        "max_depth": 3,
-        "eta": 0.1,
-        "eval_metric": "logloss",
-        "nthread": 1
-    }
-    meta_model = xgb.train(params, dmeta, num_boost_round=100)
-    
-    return meta_model
+    return (
+        df.filter(pl.col("label") != 0)
+          .drop_nulls()
+          .with_columns(
+              pl.when(pl.col("label") == -1).then(0)
+              .otherwise(1).alias("target")
+          )
+    )
 
-def train_ticker(ticker, save=True):
-    path = f"{FEATURES_DIR}/{ticker}_features.parquet"
-    mlflow.set_experiment(f"Alpha_{ticker}")
-    
+def experiment_id(name):
+    """
+    Id of the MLflow experiment `name`, created if missing. Runs name their
+    experiment explicitly because mlflow.set_experiment is process-global
+    and tickers train concurrently on the pipeline's threads.
+    """
+    client = MlflowClient()
+    experiment = client.get_experiment_by_name(name)
+    if experiment is not None:
+        return experiment.experiment_id
     try:
-        df = pl.read_parquet(path)
-
-        required_cols = ["volatility", "rsi", "label"]
-        for col in required_cols:
-            if col not in df.columns: return None
-
-        lags = [1, 2, 3, 5, 10]
-        feature_cols = ["volatility", "rsi", "frac_diff_04"]
-        for lag in lags:
-            if f"return_lag_{lag}" in df.columns: feature_cols.append(f"return_lag_{lag}")
-        
-        df_clean = (
-            df.filter(pl.col("label") != 0)
-              .drop_nulls()
-              .with_columns(
-                  pl.when(pl.col("label") == -1).then(0)
-                  .otherwise(1).alias("target")
-              )
+        return client.create_experiment(name)
+    except mlflow.exceptions.MlflowException:
+        # Created by another thread in the meantime.
+        return client.get_experiment_by_name(name).experiment_id
+
+def log_run(ticker, feature_cols, metrics):
+    """
+    One MLflow run per ticker, logged once training is done: params and
+    metrics go out as one batch each instead of a request per value.
+    """
+    with mlflow.start_run(experiment_id=experiment_id(f"Alpha_{ticker}")):
+        mlflow.log_params({
+            "model_type": "XGBoost",
+            "n_estimators": NUM_BOOST_ROUND,
+            "max_depth": XGB_PARAMS["max_depth"],
+            "features": feature_cols,
+        })
+        mlflow.log_metrics({name: float(value) for name, value in metrics.items()})
+
+def save_models(ticker, primary_model, meta_model):
+    if not os.path.exists(MODEL_DIR): os.makedirs(MODEL_DIR)
+    primary_model.save_model(f"{MODEL_DIR}/{ticker}_primary.json")
+    meta_model.save_model(f"{MODEL_DIR}/{ticker}_meta.json")
+
+class Chunks(xgb.DataIter):
+    """
+    Feeds XGBoost the row `ranges` [(start, stop), ...] of a frame one chunk
+    of at most `size` rows at a time, so a QuantileDMatrix is built without
+    gathering the rows into one float matrix. prepare(frame) -> (data, label)
+    turns a chunk into model inputs.
+    """
+    def __init__(self, lf, ranges, size, prepare, feature_types=None):
+        self.lf = lf
+        self.pieces = [
+            (offset, min(size, stop - offset)) for start, stop in ranges for offset in range(start, stop, size)
+        ]
+        self.prepare = prepare
+        self.feature_types = feature_types
+        self.position = 0
+        super().__init__()
+
+    def next(self, input_data):
+        if self.position >= len(self.pieces):
+            return False
+        offset, length = self.pieces[self.position]
+        self.position += 1
+        data, label = self.prepare(self.lf.slice(offset, length).collect())
+        input_data(data=data, label=label, feature_types=self.feature_types)
+        return True
+
+    def reset(self):
+        self.position = 0
+
+def row_runs(rows):
+    """
+    (start, stop) of each run of consecutive indices in sorted `rows`.
+    """
+    if len(rows) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = np.concatenate([rows[:1], rows[breaks]])
+    stops = np.concatenate([rows[breaks - 1], rows[-1:]]) + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+def early_stopped(params, dtrain, dvalid):
+    """
+    Booster trained on `dtrain` until `dvalid` stops improving, cut back to
+    its best round, and the number of rounds it kept.
+    """
+    booster = xgb.train(
+        params, dtrain, num_boost_round=NUM_BOOST_ROUND, evals=[(dvalid, "valid")],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False,
+    )
+    rounds = booster.best_iteration + 1
+    return booster[:rounds], rounds
+
+def fit_boosters(data, rows, folds, size, feature_cols, nthread=None, feature_types=None, parallel=False):
+    """
+    Cross-validates and fits the primary and meta boosters on the lazy
+    cleaned `data` (`rows` rows with feature_cols and target, in time
+    order), read `size` rows at a time.
+
+    One QuantileDMatrix of all rows is built first. Each fold's training and
+    validation matrices are fed from its row ranges and binned with its cuts
+    (the validation matrix through the training one, as XGBoost requires),
+    and the meta model's input is each chunk plus the primary's
+    probability column, so no fold gathers its rows into a new array. Every
+    fold's boosters stop early on its validation rows; the final boosters
+    are fit on all rows for the median best round counts, which are stored
+    as their best_iteration. With `parallel` the folds run at once,
+    splitting `nthread` between them.
+
+    Returns (primary, meta, stats), where stats holds the precision of the
+    combined signal over all validation rows and the round counts.
+    """
+    nthread = nthread or XGB_PARAMS["nthread"]
+    categorical = feature_types is not None and "c" in feature_types
+    meta_types = None if feature_types is None else feature_types + ["q"]
+
+    def features_and_target(frame):
+        return frame.select(feature_cols), frame["target"].to_numpy()
+
+    def meta_inputs(primary):
+        def prepare(frame):
+            X, y = features_and_target(frame)
+            primary_probs = primary.inplace_predict(X)
+            meta_target = ((primary_probs > 0.5).astype(int) == y).astype(int)
+            return X.with_columns(pl.Series("primary_prob", primary_probs)), meta_target
+        return prepare
+
+    def matrix(ranges, prepare, types, ref=None, threads=nthread):
+        dmatrix = xgb.QuantileDMatrix(
+            Chunks(data, ranges, size, prepare, types), ref=ref, nthread=threads, enable_categorical=categorical,
         )
-        
-        if df_clean.height < 50: return None
-
-
-        split_idx = int(df_clean.height * 0.80)
-        train = df_clean.slice(0, split_idx)
-        test = df_clean.slice(split_idx, df_clean.height - split_idx)
-        
-        X_train = train.select(feature_cols).to_numpy()
-        y_train = train.select("target").to_numpy().ravel()
-        X_test = test.select(feature_cols).to_numpy()
-        y_test = test.select("target").to_numpy().ravel()
-        
-        dtrain = xgb.DMatrix(X_train, label=y_train)
-        params = {
-            "objective": "binary:logistic",
-            "max_depth": 3,
-            "eta": 0.1,
-            "eval_metric": "logloss",
-            "nthread": 1
-        }
+        # The API scores plain arrays, so the boosters must not expect column names.
+        dmatrix.feature_names = None
+        return dmatrix
+
+    dall = matrix([(0, rows)], features_and_target, feature_types)
+    targets = data.select("target").collect()["target"].to_numpy()
+    workers = max(1, min(len(folds), nthread)) if parallel else 1
+    threads = max(1, nthread // workers)
+    params = booster_params(threads)
 
-        with mlflow.start_run(nested=True):
-            mlflow.log_param("model_type", "XGBoost")
-            mlflow.log_param("n_estimators", 100)
-            mlflow.log_param("max_depth", 3)
-            mlflow.log_param("features", feature_cols)
+    def run_fold(fold):
+        train, valid = (row_runs(rows) for rows in fold)
+        dtrain = matrix(train, features_and_target, feature_types, dall, threads)
+        dvalid = matrix(valid, features_and_target, feature_types, dtrain, threads)
+        primary, primary_rounds = early_stopped(params, dtrain, dvalid)
+        primary_probs = primary.predict(dvalid)
+        del dtrain, dvalid
 
-        primary_model = xgb.train(params, dtrain, num_boost_round=100)
+        dmeta_train = matrix(train, meta_inputs(primary), meta_types, threads=threads)
+        dmeta_valid = matrix(valid, meta_inputs(primary), meta_types, dmeta_train, threads)
+        meta, meta_rounds = early_stopped(params, dmeta_train, dmeta_valid)
+        final_signal = (primary_probs > 0.5) & (meta.predict(dmeta_valid) > 0.5)
+        return primary_rounds, meta_rounds, int(np.sum(final_signal & (targets[fold[1]] == 1))), int(np.sum(final_signal))
 
-        meta_model = train_meta_model(train, primary_model, feature_cols)
-        
-        if save:
-            if not os.path.exists(MODEL_DIR): os.makedirs(MODEL_DIR)
-            primary_model.save_model(f"{MODEL_DIR}/{ticker}_primary.json")
-            meta_model.save_model(f"{MODEL_DIR}/{ticker}_meta.json")
+    primary_rounds, meta_rounds, precision, signals = NUM_BOOST_ROUND, NUM_BOOST_ROUND, 0.0, 0
+    if folds:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_fold, folds))
+        rounds, meta_counts, true_positives, fold_signals = (np.array(column) for column in zip(*results))
+        primary_rounds, meta_rounds = int(np.median(rounds)), int(np.median(meta_counts))
+        signals = int(fold_signals.sum())
+        precision = float(true_positives.sum() / signals) if signals else 0.0
 
-        dtest = xgb.DMatrix(X_test)
-        primary_test_probs = primary_model.predict(dtest)
-        
-        test_conf = primary_test_probs.reshape(-1, 1)
-        X_test_meta = np.hstack([X_test, test_conf])
-        
-        dmeta_test = xgb.DMatrix(X_test_meta)
-        meta_probs = meta_model.predict(dmeta_test)
+    primary_model = xgb.train(booster_params(nthread), dall, num_boost_round=primary_rounds)
+    del dall
+    dmeta = matrix([(0, rows)], meta_inputs(primary_model), meta_types)
+    meta_model = xgb.train(booster_params(nthread), dmeta, num_boost_round=meta_rounds)
+    primary_model.set_attr(best_iteration=str(primary_rounds - 1))
+    meta_model.set_attr(best_iteration=str(meta_rounds - 1))
 
-        primary_preds = (primary_test_probs > 0.5).astype(int)
-        meta_preds = (meta_probs > 0.5).astype(int)
-        
-        final_signal = (primary_preds == 1) & (meta_preds == 1)
+    return primary_model, meta_model, {
+        "precision": precision, "signals": signals, "primary_rounds": primary_rounds,
+        "meta_rounds": meta_rounds, "folds": len(folds),
+    }
+
+def publish(ticker, primary_model, meta_model, stats, train_rows, save=True):
+    """
+    Saves and records a ticker's boosters with their best round counts, logs
+    the run and returns the cross-validated precision.
+    """
+    if save:
+        save_models(ticker, primary_model, meta_model)
+        record_models(ticker, stats["precision"], best_iteration={
+            "primary": stats["primary_rounds"] - 1, "meta": stats["meta_rounds"] - 1,
+        })
+    log_run(ticker, FEATURE_COLS, {**stats, "train_rows": train_rows})
+    return stats["precision"]
+
+def stream_train(ticker, lf, schema, save=True, nthread=None):
+    """
+    train_ticker for feature files over MEMORY_LIMIT. The cleaned rows are
+    spilled once with a streaming sink and cross-validated and fit on chunk
+    by chunk, one fold at a time.
+    """
+    feature_cols = FEATURE_COLS
+    size = streaming.chunk_rows(schema, MEMORY_LIMIT)
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+
+    with tempfile.TemporaryDirectory(dir=FEATURES_DIR) as spill_dir:
+        spill_path = f"{spill_dir}/{ticker}_clean.parquet"
+        clean(with_label_spans(lf, schema.names())).select(feature_cols + ["target", "bar", "end"]).sink_parquet(spill_path)
+        spilled, rows, _ = streaming.scan(spill_path)
+        if rows < 50: return None
+
+        spans = spilled.select("bar", "end").collect()
+        folds = cv_folds(spans["bar"].to_numpy(), spans["end"].to_numpy())
+        primary_model, meta_model, stats = fit_boosters(spilled, rows, folds, size, feature_cols, nthread)
+
+    return publish(ticker, primary_model, meta_model, stats, rows, save)
+
+def with_label_spans(df, columns):
+    """
+    Adds each row's `bar` index and, as `end`, the last bar its label
+    depends on: the barrier touch when the labeler recorded one, otherwise
+    the whole horizon. Applied before clean() drops rows. Works on frames
+    and lazy frames alike.
+    """
+    df = df.with_row_index("bar").with_columns(pl.col("bar").cast(pl.Int64))
+    end = pl.col("bar") + labeling.HORIZON
+    if "touch_index" in columns:
+        end = pl.col("touch_index").cast(pl.Int64).fill_null(end)
+    return df.with_columns(end.alias("end"))
+
+def cv_folds(bars, ends, n_folds=CV_FOLDS, embargo=EMBARGO_BARS, walk_forward=WALK_FORWARD, drop_empty=True):
+    """
+    (train rows, validation rows) per fold over rows in time order. The rows
+    are cut into contiguous validation blocks; a training row is purged if
+    its label window [bar, end] overlaps the block's, and embargoed if it
+    starts within `embargo` bars after the block. Folds left without
+    training or validation rows are dropped unless `drop_empty` is False.
+    """
+    n = len(bars)
+    blocks = np.array_split(np.arange(n), n_folds + 1 if walk_forward else n_folds)
+    folds = []
+    for valid in (blocks[1:] if walk_forward else blocks):
+        if len(valid) == 0:
+            folds.append((np.empty(0, dtype=np.int64), valid))
+            continue
+        first, last, last_end = bars[valid[0]], bars[valid[-1]], ends[valid].max()
+        keep = np.ones(n, dtype=bool)
+        keep[valid[0]:valid[-1] + 1] = False
+        if walk_forward:
+            keep[valid[0]:] = False
+        keep &= ~((bars <= last_end) & (ends >= first))
+        keep &= ~((bars > last) & (bars <= last + embargo))
+        folds.append((np.flatnonzero(keep), valid))
+    if drop_empty:
+        folds = [(train, valid) for train, valid in folds if len(train) and len(valid)]
+    return folds
+
+def stacked_folds(bars, ends, groups):
+    """
+    cv_folds over groups of rows stacked one after another, such as the
+    pool's tickers: each group is cut into blocks on its own time axis, and
+    fold k trains and validates on every group's k-th fold.
+    """
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]])
+    stops = np.r_[starts[1:], len(groups)]
+    trains, valids = [], []
+    for start, stop in zip(starts, stops):
+        folds = cv_folds(bars[start:stop], ends[start:stop], drop_empty=False)
+        trains.append([train + start for train, _ in folds])
+        valids.append([valid + start for _, valid in folds])
+    folds = [(np.concatenate(train), np.concatenate(valid)) for train, valid in zip(zip(*trains), zip(*valids))]
+    return [(train, valid) for train, valid in folds if len(train) and len(valid)]
+
+def train_ticker(ticker, save=True, df=None, nthread=None):
+    """
+    Trains the primary and meta boosters of one ticker with `nthread`
+    threads and returns the cross-validated precision (None when the ticker
+    has too little labeled data). The round counts found by fit_boosters
+    are stored with the models.
+    """
+    path = f"{FEATURES_DIR}/{ticker}_features.parquet"
+
+    if df is None:
+        lf, rows, schema = streaming.scan(path)
+        if any(col not in schema for col in FEATURE_COLS + ["label"]): return None
+        if not streaming.fits(rows, schema, MEMORY_LIMIT):
+            return stream_train(ticker, lf, schema, save, nthread)
+        df = lf.collect()
 
-        precision = precision_score(y_test, final_signal, pos_label=1, zero_division=0)
+    required_cols = FEATURE_COLS + ["label"]
+    for col in required_cols:
+        if col not in df.columns: return None
 
-        if np.sum(final_signal) == 0: return 0.0
+    feature_cols = FEATURE_COLS
+    
+    df_clean = clean(with_label_spans(df, df.columns))
+    
+    if df_clean.height < 50: return None
+
+    folds = cv_folds(df_clean["bar"].to_numpy(), df_clean["end"].to_numpy())
+    primary_model, meta_model, stats = fit_boosters(
+        df_clean.lazy(), df_clean.height, folds, df_clean.height, feature_cols, nthread, parallel=True,
+    )
+    return publish(ticker, primary_model, meta_model, stats, df_clean.height, save)
+
+def select_tickers(tickers):
+    if TRAIN_TICKERS is None:
+        return list(tickers)
+    return [t for t in tickers if t in TRAIN_TICKERS]
+
+def largest_first(tickers):
+    """
+    Orders tickers by feature rows, descending, so the longest fits start
+    first and short ones fill in at the end instead of a long one straggling.
+    """
+    entries = manifest.load(FEATURES_DIR)
+    return sorted(tickers, key=lambda t: entries.get(t, {}).get("rows", 0), reverse=True)
+
+def pooled_path():
+    return f"{MODEL_DIR}/{ARTIFACT_NAME}"
+
+def pooled_fingerprint(tickers, sectors):
+    """
+    Changes when any ticker's features, the ticker set, the sector map or
+    the training parameters change.
+    """
+    entries = manifest.load(FEATURES_DIR)
+    source_hash = None
+    for ticker in sorted(tickers):
+        source_hash = manifest.chain_hash(source_hash, f"{ticker}:{entries.get(ticker, {}).get('hash')}")
+    return manifest.fingerprint(source_hash, {**train_params(), "sectors": sectors}, STAGE_VERSION)
 
-        mlflow.log_metric("precision", float(precision))
+def pooled_rows(ticker, ticker_code, sector_code):
+    """
+    A ticker's cleaned rows with its codes and label spans, so the pool's
+    folds can cut each ticker in time on its own (see stacked_folds) and no
+    ticker's validation period leaks into the training rows.
+    """
+    lf = pl.scan_parquet(f"{FEATURES_DIR}/{ticker}_features.parquet")
+    return clean(with_label_spans(lf, lf.collect_schema().names())).select(
+        *[pl.col(c).cast(pl.Float64) for c in FEATURE_COLS],
+        pl.lit(ticker_code, pl.Float64).alias("ticker_code"),
+        pl.lit(sector_code, pl.Float64).alias("sector_code"),
+        pl.col("target"), pl.col("bar"), pl.col("end"),
+    )
 
-        return precision
-        
+def train_pooled(tickers=None, nthread=None, force=False):
+    """
+    Trains one primary and one meta booster on every ticker's features
+    stacked together, with ticker and sector codes as categorical inputs,
+    and writes them as a single artifact (see pooled_model.py). The stacked
+    rows are spilled to disk and cross-validated and fit on chunk by chunk
+    like stream_train, so the pool is never held in memory. The boosters
+    use every core unless `nthread` is given. Returns the cross-validated
+    precision over all tickers, or None when there is nothing to train or
+    the artifact is current.
+    """
+    nthread = nthread or os.cpu_count()
+    run_list = select_tickers(get_available_tickers())
+    if tickers is not None:
+        run_list = [t for t in run_list if t in set(tickers)]
+    required_cols = FEATURE_COLS + ["label"]
+    run_list = sorted(
+        t for t in run_list
+        if all(c in pl.scan_parquet(f"{FEATURES_DIR}/{t}_features.parquet").collect_schema() for c in required_cols)
+    )
+    if not run_list:
+        return None
 
-    except Exception as e:
-        print(f"Error training {ticker}: {str(e)}")
+    known = universe.get_sectors()
+    sectors = {t: known.get(t) or UNKNOWN_SECTOR for t in run_list}
+    fingerprint = pooled_fingerprint(run_list, sectors)
+    if not force and read_fingerprint(pooled_path()) == fingerprint:
+        print("Pooled model already trained on the current features.")
         return None
 
-def main():
-    tickers = get_available_tickers()
+    ticker_codes, sector_codes = encodings(run_list, sectors)
+    feature_cols = FEATURE_COLS + CODE_COLS
+    stacked = pl.concat([pooled_rows(t, ticker_codes[t], sector_codes[sectors[t]]) for t in run_list])
+
+    print(f"--- TRAINING THE POOLED MODEL ON {len(run_list)} TICKERS ({len(sector_codes)} sectors) ---")
+    with tempfile.TemporaryDirectory(dir=FEATURES_DIR) as spill_dir:
+        spill_path = f"{spill_dir}/pooled.parquet"
+        stacked.sink_parquet(spill_path)
+        spilled, rows, schema = streaming.scan(spill_path)
+        if rows < 50: return None
+
+        spans = spilled.select("ticker_code", "bar", "end").collect()
+        folds = stacked_folds(spans["bar"].to_numpy(), spans["end"].to_numpy(), spans["ticker_code"].to_numpy())
+        primary_model, meta_model, stats = fit_boosters(
+            spilled, rows, folds, streaming.chunk_rows(schema, MEMORY_LIMIT), feature_cols, nthread,
+            feature_types=PooledModel.feature_types(FEATURE_COLS),
+        )
+
+    PooledModel(
+        primary_model, meta_model, FEATURE_COLS, ticker_codes, sectors, sector_codes, fingerprint,
+    ).save(pooled_path())
+    log_run("pooled", feature_cols, {**stats, "train_rows": rows, "tickers": len(run_list)})
+    print(f"\nPOOLED PRECISION: {stats['precision']:.2%} over {stats['signals']} signals")
+    return stats["precision"]
+
+def main(tickers=None, workers=executor.WORKERS, threads=None):
+    """
+    Trains every stale ticker on a process pool and returns the run_stage
+    report. `workers` boosters train at once with `threads` threads each
+    (default: the cores split evenly), so workers=cores gives many
+    single-threaded boosters and a small pool fewer multi-threaded ones.
+    The pooled model is trained by train_pooled instead.
+    """
+    run_list = select_tickers(get_available_tickers())
+    if tickers is not None:
+        run_list = [t for t in run_list if t in set(tickers)]
+
+    # Skip tickers whose features and training parameters are unchanged.
+    stale = manifest.changed(
+        manifest.load(FEATURES_DIR), manifest.load(MODEL_DIR), tickers=run_list,
+        params=train_params(), version=STAGE_VERSION,
+    )
+    if len(stale) < len(run_list):
+        print(f"{len(run_list) - len(stale)} tickers already trained on their current features.")
+    run_list = largest_first(stale)
 
-    target_tickers = ["AAPL", "MSFT", "GOOGL", "AMZN", "NVDA"]
-    run_list = [t for t in tickers if t in target_tickers]
-    if not run_list: run_list = tickers[:5]
+    # run_stage starts no more workers than there are tickers, and the cores
+    # are split between the workers that actually run.
+    workers = max(1, min(workers, len(run_list)))
+    threads = threads or executor.threads_per_worker(workers)
+    print(f"--- TRAINING ON {len(run_list)} TICKERS ({workers} workers x {threads} threads) ---")
+    start = time.perf_counter()
+    report = executor.run_stage(
+        functools.partial(train_ticker, nthread=threads), run_list,
+        workers=workers, chunk_size=1, desc="Training",
+    )
+    minutes = (time.perf_counter() - start) / 60
+    executor.print_failures(report, "Training")
 
-    print(f"--- TRAINING ON {len(run_list)} TICKERS ---")
-    scores = []
-    for ticker in tqdm(run_list):
-        score = train_ticker(ticker)
-        if score is not None:
-            scores.append(score)
-            
+    # Tickers with too little labeled data finish "ok" without a model.
+    models = manifest.load(MODEL_DIR)
+    still_stale = set(manifest.changed(
+        manifest.load(FEATURES_DIR), models, tickers=run_list, params=train_params(), version=STAGE_VERSION,
+    ))
+    trained = [t for t in run_list if t not in still_stale]
+    scores = [models[t]["precision"] for t in trained]
+    if minutes > 0:
+        print(f"Throughput: {len(trained) / minutes:.1f} tickers/min")
     if scores:
         print(f"\nAVERAGE PRECISION: {sum(scores)/len(scores):.2%}")
+    return report
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the per-ticker models on a process pool.")
+    parser.add_argument("--workers", type=int, default=executor.WORKERS, help="boosters trained at once")
+    parser.add_argument("--threads", type=int, default=None, help="threads per booster (default: cores / workers)")
+    parser.add_argument("--pooled", action="store_true", default=POOLED,
+                        help="train one model on all tickers instead of one per ticker (default: $USE_POOLED_MODEL)")
+    args = parser.parse_args()
+    if args.pooled:
+        train_pooled(nthread=args.threads)
+    else:
+        main(workers=args.workers, threads=args.threads)
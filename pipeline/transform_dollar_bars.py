@@ -1,56 +1,303 @@
 import polars as pl
+import numpy as np
 import os
-from tqdm import tqdm
+import functools
+import quant_engine
+import raw_store
+import manifest
+import executor
+import streaming
 
 RAW_DIR = "./data/raw"
 PROCESSED_DIR = "./data/processed/dollar_bars"
 THRESHOLD = 5_000_000_000
+BAR_KIND = "dollar"
+STAGE_VERSION = 1
+BATCH_SIZE = 50
+# Full rebuilds of histories larger than this are sampled month by month.
+MEMORY_LIMIT = streaming.memory_limit("transform")
+
+RAW_COLUMNS = ["date", "open", "high", "low", "close", "volume"]
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
 
 def ensure_dir():
     if not os.path.exists(PROCESSED_DIR):
         os.makedirs(PROCESSED_DIR)
 
-def process_ticker(ticker_file):
-    q = pl.scan_parquet(ticker_file)
-    
-    df = q.collect()
-    
-    if df.height == 0:
-        return
-    
-    df = df.with_columns(
-        (pl.col("dollar_volume").cum_sum() / THRESHOLD).floor().alias("bar_id")
+def engine_inputs(df):
+    """
+    Int64 timestamps plus float64 OHLCV columns for quant_engine.build_bars.
+    """
+    timestamp = df["date"].cast(pl.Int64).to_numpy()
+    columns = [df[c].cast(pl.Float64).to_numpy() for c in PRICE_COLUMNS]
+    return timestamp, columns
+
+def bars_to_frame(bars, date_dtype, volume_dtype):
+    return pl.DataFrame({
+        "timestamp": pl.Series(bars["timestamp"]).cast(date_dtype),
+        "open": bars["open"],
+        "high": bars["high"],
+        "low": bars["low"],
+        "close": bars["close"],
+        "volume": pl.Series(bars["volume"]).cast(volume_dtype),
+        "dollar_volume": bars["dollar_volume"],
+    })
+
+def build_bars(df, state=None):
+    """
+    Streams raw rows through the native sampler. A bar closes on the row that
+    takes it over THRESHOLD; the open remainder comes back as `state`.
+    """
+    timestamp, columns = engine_inputs(df)
+    bars = quant_engine.build_bars(timestamp, *columns, THRESHOLD, kind=BAR_KIND, state=state)
+    return bars_to_frame(bars, df.schema["date"], df.schema["volume"]), bars["state"]
+
+# Incremental mode: each ticker's manifest entry carries the sampler state
+# after the last *settled* raw row and that row's timestamp (the raw
+# watermark). A run samples only raw rows past the watermark and appends the
+# bars they close. The newest raw row is re-fetched, and possibly revised, by
+# the next ingest as its overlap bar, so it is sampled provisionally: the
+# bars it closes are written but not folded into the saved state, and the
+# next run drops them and samples that row again. The file therefore always
+# equals a full rebuild over the current raw data.
+
+def bar_params():
+    return {"threshold": THRESHOLD, "kind": BAR_KIND}
+
+def resume_point(ticker, entry):
+    """
+    The manifest entry to resume from, or None when the ticker's bars must be
+    rebuilt (no saved state, the bar parameters changed or the file is gone).
+    """
+    if not entry or entry.get("state") is None or entry.get("bar_params") != bar_params():
+        return None
+    if not os.path.exists(f"{PROCESSED_DIR}/{ticker}_db.parquet"):
+        return None
+    return entry
+
+def watermark(entry):
+    if entry is None:
+        return None
+    return manifest.decode_timestamp(entry["raw_timestamp"], entry.get("raw_time_zone"))
+
+def split_pending(df):
+    """
+    Settled raw rows and the newest row, which is sampled provisionally.
+    """
+    return df.slice(0, df.height - 1), df.slice(df.height - 1)
+
+def save_bars(new_bars, ticker, source_hash=None, resume=None, state=None, settled=None, provisional=0):
+    """
+    Appends new bars to the ticker's file (dropping the provisional tail of
+    the previous run) and records the file, the raw hash it was built from
+    and the carried-over state in the processed manifest. Returns the bars
+    now in the file.
+    """
+    save_path = f"{PROCESSED_DIR}/{ticker}_db.parquet"
+    if resume is None:
+        dollar_bars = new_bars
+        raw_timestamp, raw_time_zone = None, None
+    else:
+        old = pl.read_parquet(save_path)
+        dollar_bars = pl.concat([old.slice(0, old.height - resume["provisional"]), new_bars]).rechunk()
+        raw_timestamp, raw_time_zone = resume["raw_timestamp"], resume.get("raw_time_zone")
+
+    if settled is not None and settled.height > 0:
+        raw_timestamp = manifest.encode_timestamp(settled["date"].max())
+        raw_time_zone = settled.schema["date"].time_zone
+
+    dollar_bars.write_parquet(save_path, compression="snappy")
+    stats = {
+        "rows": dollar_bars.height,
+        "last_timestamp": dollar_bars["timestamp"].max(),
+        "time_zone": dollar_bars.schema["timestamp"].time_zone,
+    }
+    record_bars(ticker, stats, source_hash, state, raw_timestamp, raw_time_zone, provisional)
+    return dollar_bars
+
+def record_bars(ticker, stats, source_hash, state, raw_timestamp, raw_time_zone, provisional):
+    save_path = f"{PROCESSED_DIR}/{ticker}_db.parquet"
+
+    def record(_):
+        entry = manifest.file_entry(
+            save_path,
+            source_hash=source_hash,
+            params=bar_params(),
+            version=STAGE_VERSION,
+            **stats,
+        )
+        entry.update({
+            "bar_params": bar_params(),
+            "state": state if raw_timestamp is not None else None,
+            "raw_timestamp": raw_timestamp,
+            "raw_time_zone": raw_time_zone,
+            "provisional": provisional,
+        })
+        return entry
+
+    manifest.update(PROCESSED_DIR, ticker, record)
+
+def stream_ticker(ticker, resume=None):
+    """
+    process_ticker with bounded memory: raw months are read and sampled one
+    at a time, carrying the sampler state and holding back the newest row
+    as the provisional one, and the bars go through a streaming sink.
+    Returns a lazy scan of the bars.
+    """
+    save_path = f"{PROCESSED_DIR}/{ticker}_db.parquet"
+    since = watermark(resume)
+    prefix = None
+    if resume is not None:
+        old = pl.scan_parquet(save_path)
+        prefix = old.slice(0, old.select(pl.len()).collect().item() - resume["provisional"])
+
+    months = raw_store.list_months(ticker, RAW_DIR)
+    if since is not None:
+        months = [m for m in months if m >= since.strftime("%Y-%m")]
+
+    sink = streaming.Sink(save_path, prefix)
+    state = resume["state"] if resume else None
+    held, last_settled = None, None
+    for month in months:
+        df = raw_store.read_month(ticker, month, since, RAW_DIR)
+        if df.height == 0:
+            continue
+        df = df.select(RAW_COLUMNS)
+        settled, held = split_pending(df if held is None else pl.concat([held, df]))
+        if settled.height > 0:
+            bars, state = build_bars(settled, state=state)
+            sink.write(bars)
+            last_settled = settled
+
+    if held is None:
+        sink.discard()
+        return None
+
+    pending_bars, _ = build_bars(held, state=state)
+    sink.write(pending_bars)
+    dollar_bars = sink.finish()
+
+    raw_timestamp, raw_time_zone = (resume["raw_timestamp"], resume.get("raw_time_zone")) if resume else (None, None)
+    if last_settled is not None:
+        raw_timestamp = manifest.encode_timestamp(last_settled["date"].max())
+        raw_time_zone = last_settled.schema["date"].time_zone
+    record_bars(
+        ticker, streaming.describe(dollar_bars), raw_store.entries(RAW_DIR).get(ticker, {}).get("hash"),
+        state, raw_timestamp, raw_time_zone, pending_bars.height,
     )
-    
-    dollar_bars = (
-        df.group_by("bar_id")
-        .agg([
-            pl.col("date").first().alias("timestamp"),
-            pl.col("open").first().alias("open"),
-            pl.col("high").max().alias("high"),
-            pl.col("low").min().alias("low"),
-            pl.col("close").last().alias("close"),
-            pl.col("volume").sum().alias("volume"),
-            pl.col("dollar_volume").sum().alias("dollar_volume")
-        ])
-        .sort("timestamp")
+    return dollar_bars
+
+def streams(ticker, resume):
+    """
+    Whether a ticker's raw input past its watermark is too large to sample
+    in one frame. A full rebuild is sized from the manifest; a resumed one
+    from the row counts in the footers of the months past the watermark.
+    """
+    since = watermark(resume)
+    if since is None:
+        rows = raw_store.entries(RAW_DIR).get(ticker, {}).get("rows", 0)
+    else:
+        months = [m for m in raw_store.list_months(ticker, RAW_DIR) if m >= since.strftime("%Y-%m")]
+        files = [f for m in months for f in raw_store.fragments(raw_store.month_dir(ticker, m, RAW_DIR))]
+        rows = pl.scan_parquet(files).select(pl.len()).collect().item() if files else 0
+    return not streaming.fits(rows, dict.fromkeys(RAW_COLUMNS, pl.Float64), MEMORY_LIMIT)
+
+def process_ticker(ticker, incremental=True):
+    """
+    Builds or extends a ticker's bars; returns them, as a lazy scan when the
+    ticker was streamed.
+    """
+    resume = resume_point(ticker, manifest.load(PROCESSED_DIR).get(ticker)) if incremental else None
+    if streams(ticker, resume):
+        return stream_ticker(ticker, resume)
+    df = raw_store.read_since({ticker: watermark(resume)}, RAW_DIR)
+
+    if df.height == 0:
+        return None
+
+    settled, pending = split_pending(df.select(RAW_COLUMNS))
+    settled_bars, state = build_bars(settled, state=resume["state"] if resume else None)
+    pending_bars, _ = build_bars(pending, state=state)
+
+    return save_bars(
+        pl.concat([settled_bars, pending_bars]), ticker,
+        source_hash=raw_store.entries(RAW_DIR).get(ticker, {}).get("hash"),
+        resume=resume, state=state, settled=settled, provisional=pending_bars.height,
     )
-    
-    ticker_name = os.path.basename(ticker_file).replace(".parquet", "")
-    save_path = f"{PROCESSED_DIR}/{ticker_name}_db.parquet"
-    dollar_bars.write_parquet(save_path, compression="snappy")
 
-def main():
+def sample_batch(frames, states):
+    """
+    One native call over several raw frames; returns a bar frame and the
+    final state per frame.
+    """
+    combined = pl.concat(frames, how="vertical_relaxed")
+    offsets = np.concatenate([[0], np.cumsum([df.height for df in frames])])
+    timestamp, columns = engine_inputs(combined)
+
+    bars = quant_engine.batch_build_bars(timestamp, *columns, offsets, THRESHOLD, kind=BAR_KIND, states=states)
+    all_bars = bars_to_frame(bars, combined.schema["date"], combined.schema["volume"])
+
+    bar_offsets = bars["offsets"]
+    per_frame = [all_bars.slice(bar_offsets[i], bar_offsets[i + 1] - bar_offsets[i]) for i in range(len(frames))]
+    return per_frame, bars["states"]
+
+def process_universe(tickers, incremental=True):
+    """
+    Builds bars for many tickers per native call: the batch's raw deltas are
+    read with one partition-pruned scan of the raw lake, concatenated with
+    offsets and sampled in parallel across tickers, resuming each ticker
+    from its carried-over state.
+    """
+    entries = manifest.load(PROCESSED_DIR)
+    resume = {t: resume_point(t, entries.get(t)) if incremental else None for t in tickers}
+    for ticker in [t for t in tickers if streams(t, resume[t])]:
+        stream_ticker(ticker, resume.pop(ticker))
+    tickers = [t for t in tickers if t in resume]
+    raw = raw_store.read_since({t: watermark(resume[t]) for t in tickers}, RAW_DIR)
+    if raw.height == 0:
+        return
+
+    by_ticker = raw.partition_by("ticker", as_dict=True)
+    frames = []
+    for ticker in tickers:
+        df = by_ticker.get((ticker,))
+        if df is not None and df.height > 0:
+            frames.append((ticker, split_pending(df.select(RAW_COLUMNS))))
+
+    if not frames:
+        return
+
+    start_states = [resume[t]["state"] if resume[t] else None for t, _ in frames]
+    settled_bars, states = sample_batch([settled for _, (settled, _) in frames], start_states)
+    pending_bars, _ = sample_batch([pending for _, (_, pending) in frames], states)
+
+    raw_entries = raw_store.entries(RAW_DIR)
+    for i, (ticker, (settled, _)) in enumerate(frames):
+        save_bars(
+            pl.concat([settled_bars[i], pending_bars[i]]), ticker,
+            source_hash=raw_entries.get(ticker, {}).get("hash"),
+            resume=resume[ticker], state=states[i], settled=settled, provisional=pending_bars[i].height,
+        )
+
+def main(incremental=True, workers=executor.WORKERS, tickers=None):
     ensure_dir()
-    files = [os.path.join(RAW_DIR, f) for f in os.listdir(RAW_DIR) if f.endswith(".parquet")]
-    
-    print(f"Transforming {len(files)} tickers into Dollar Bars (Threshold: ${THRESHOLD:,.0f})...")
-    
-    for f in tqdm(files):
-        try:
-            process_ticker(f)
-        except Exception as e:
-            print(f"Error processing {f}: {e}")
+    raw_store.ensure_manifest(RAW_DIR)
+    raw_entries = raw_store.entries(RAW_DIR)
+    # Only tickers whose raw data or bar parameters changed since their bars
+    # were built, optionally restricted to a given set (e.g. the last ingest's changes).
+    tickers = manifest.changed(
+        raw_entries, manifest.load(PROCESSED_DIR), tickers=tickers, params=bar_params(), version=STAGE_VERSION,
+    )
+
+    print(f"Transforming {len(tickers)} of {len(raw_entries)} tickers into Dollar Bars (Threshold: ${THRESHOLD:,.0f})...")
+
+    report = executor.run_stage(
+        functools.partial(process_ticker, incremental=incremental), tickers,
+        batch_task=functools.partial(process_universe, incremental=incremental),
+        workers=workers, chunk_size=BATCH_SIZE, desc="Dollar Bars",
+    )
+    executor.print_failures(report, "Transform")
+    return report
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
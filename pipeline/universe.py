@@ -0,0 +1,117 @@
+import json
+import os
+import time
+import raw_store
+
+# Ticker universe, resolved on first use instead of at import time.
+#
+# Resolution order:
+#   1. a fixed universe file (UNIVERSE_FILE env var or `path`), for offline
+#      and reproducible runs: one ticker per line, or a CSV with a Symbol column
+#   2. the on-disk cache of the S&P 500 constituents, while younger than the TTL
+#   3. the constituents CSV, which refreshes the cache
+#   4. a stale cache, then the tickers already in the raw store, then a
+#      fixed list of liquid names
+#
+# The cache also keeps each constituent's GICS sector, which the pooled
+# model uses as a categorical input (see get_sectors).
+
+CONSTITUENTS_URL = "https://raw.githubusercontent.com/datasets/s-and-p-500-companies/master/data/constituents.csv"
+CACHE_PATH = "./data/universe.json"
+CACHE_VERSION = 1
+CACHE_TTL = 7 * 24 * 3600
+UNIVERSE_FILE_ENV = "UNIVERSE_FILE"
+
+FALLBACK_TICKERS = [
+    "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "TSLA", "META",
+    "AMD", "INTC", "QCOM", "CSCO", "NFLX", "ADBE", "TXN",
+    "AVGO", "CRM", "PYPL", "IBM", "ORCL", "MU"
+]
+
+def normalize(tickers) -> list[str]:
+    """
+    Yahoo spells share classes with a dash (BRK.B -> BRK-B).
+    """
+    return [t.strip().replace('.', '-') for t in tickers if t and t.strip()]
+
+def load_file(path: str) -> list[str]:
+    with open(path) as f:
+        lines = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    if path.endswith(".csv"):
+        header = lines[0].split(",")
+        column = header.index("Symbol")
+        lines = [line.split(",")[column] for line in lines[1:]]
+    return normalize(lines)
+
+def fetch_constituents(url: str = CONSTITUENTS_URL) -> dict[str, str]:
+    """
+    Constituents in listing order, mapped to their GICS sector.
+    """
+    import pandas as pd  # only needed on a cache miss
+
+    df = pd.read_csv(url)
+    sectors = df["GICS Sector"].tolist() if "GICS Sector" in df.columns else [None] * len(df)
+    listing = {}
+    for symbol, sector in zip(df["Symbol"].tolist(), sectors):
+        for ticker in normalize([symbol]):
+            listing[ticker] = sector
+    return listing
+
+def read_cache(path: str = CACHE_PATH) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("version") != CACHE_VERSION or not cache.get("tickers"):
+        return None
+    return cache
+
+def write_cache(tickers: list[str], path: str = CACHE_PATH, clock=time.time, sectors: dict | None = None):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": CACHE_VERSION, "fetched_at": clock(), "tickers": tickers, "sectors": sectors or {}}, f)
+    os.replace(tmp_path, path)
+
+def get_sectors(cache_path: str = CACHE_PATH) -> dict:
+    """
+    {ticker: GICS sector} from the cached constituents; empty when the
+    universe came from elsewhere.
+    """
+    cache = read_cache(cache_path)
+    return (cache or {}).get("sectors") or {}
+
+def get_universe(path: str | None = None, refresh: bool = False, cache_path: str = CACHE_PATH,
+                 ttl: float = CACHE_TTL, fetch=fetch_constituents, raw_dir: str = raw_store.RAW_DIR,
+                 clock=time.time) -> list[str]:
+    path = path or os.environ.get(UNIVERSE_FILE_ENV)
+    if path:
+        return load_file(path)
+
+    cache = read_cache(cache_path)
+    if cache and not refresh and clock() - cache["fetched_at"] < ttl:
+        return cache["tickers"]
+
+    try:
+        listing = fetch()
+        tickers = list(listing)
+        write_cache(tickers, cache_path, clock, listing if isinstance(listing, dict) else None)
+        print(f"Found {len(tickers)} tickers.")
+        return tickers
+    except Exception as e:
+        print(f"Scraping failed: {e}")
+
+    if cache:
+        print(f"Using cached universe of {len(cache['tickers'])} tickers.")
+        return cache["tickers"]
+
+    stored = sorted(raw_store.entries(raw_dir))
+    if stored:
+        print(f"Loaded {len(stored)} tickers from local storage.")
+        return stored
+
+    print("Activating fallback method: Using Top 20 Liquid Tech Stocks.")
+    return list(FALLBACK_TICKERS)
@@ -1,6 +1,8 @@
 import time
 import functools
 import logging
+import random
+import threading
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -26,9 +28,11 @@ def time_execution(func):
             
     return wrapper
 
-def retry(retries=3, delay=1):
+def retry(retries=3, delay=1, sleep=time.sleep):
     """
-    Decorator Factory: Retries a function if it crashes.
+    Decorator Factory: Retries a function if it crashes. `delay` is the
+    pause in seconds, or a function of the failed attempt's number such as
+    backoff_delay.
     """
     def decorator(func):
         @functools.wraps(func)
@@ -42,7 +46,7 @@ def retry(retries=3, delay=1):
                     last_exception = e
                     logger.warning(f"[RETRY] {func.__name__} failed (Attempt {i}/{retries}). Error: {e}")
                     if i < retries:
-                        time.sleep(delay)
+                        sleep(delay(i) if callable(delay) else delay)
             
             logger.error(f"[DEAD] {func.__name__} failed after {retries} attempts.")
             
@@ -50,4 +54,38 @@ def retry(retries=3, delay=1):
                 raise last_exception
             
         return wrapper
-    return decorator
\ No newline at end of file
+    return decorator
+
+class TokenBucket:
+    """
+    Thread-safe token-bucket rate limiter: `rate` tokens per second, bursts of
+    up to `capacity`. acquire() blocks until a token is available.
+    """
+    def __init__(self, rate, capacity=1, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate must be > 0 and capacity >= 1")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+def backoff_delay(attempt, base=1.0, cap=60.0, rng=random):
+    """
+    Exponential backoff with full jitter: uniform in [0, min(cap, base * 2^(attempt-1))].
+    """
+    return rng.uniform(0, min(cap, base * 2 ** (attempt - 1)))
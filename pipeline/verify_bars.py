@@ -1,11 +1,11 @@
 import polars as pl
+import raw_store
 
 # Paths
-raw_path = "./data/raw/AAPL.parquet"
 processed_path = "./data/processed/dollar_bars/AAPL_db.parquet"
 
 # Load
-df_raw = pl.read_parquet(raw_path)
+df_raw = raw_store.read_ticker("AAPL")
 df_dollar = pl.read_parquet(processed_path)
 
 print(f"--- AAPL ANALYSIS ---")